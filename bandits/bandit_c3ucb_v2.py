@@ -4,6 +4,7 @@ from abc import abstractmethod
 import numpy
 
 import constants
+from shared import timing
 
 
 class C3UCBBaseBandit:
@@ -42,23 +43,25 @@ class C3UCB(C3UCBBaseBandit):
         :param current_round: current round number
         :return: selected set of arms
         """
-        v_inverse = numpy.linalg.inv(self.v)
-        weight_vector = v_inverse @ self.b
-        logging.info(f"================================\n{weight_vector.transpose().tolist()[0]}")
-        self.context_vectors = context_vectors
-
-        # find the upper bound for every arm
-        for i in range(len(self.arms)):
-            creation_cost = weight_vector[1] * self.context_vectors[i][1]
-            average_reward = float(weight_vector.transpose() @ self.context_vectors[i]) - creation_cost
-            temp_upper_bound = average_reward + self.hyper_alpha * numpy.sqrt(
-                float(self.context_vectors[i].transpose() @ v_inverse @ self.context_vectors[i]))
-            temp_upper_bound = temp_upper_bound + (creation_cost/constants.CREATION_COST_REDUCTION_FACTOR)
-            self.upper_bounds.append(temp_upper_bound)
+        with timing.phase(constants.MEASURE_PHASE_UCB_SCORING):
+            v_inverse = numpy.linalg.inv(self.v)
+            weight_vector = v_inverse @ self.b
+            logging.info(f"================================\n{weight_vector.transpose().tolist()[0]}")
+            self.context_vectors = context_vectors
+
+            # find the upper bound for every arm
+            for i in range(len(self.arms)):
+                creation_cost = weight_vector[1] * self.context_vectors[i][1]
+                average_reward = float(weight_vector.transpose() @ self.context_vectors[i]) - creation_cost
+                temp_upper_bound = average_reward + self.hyper_alpha * numpy.sqrt(
+                    float(self.context_vectors[i].transpose() @ v_inverse @ self.context_vectors[i]))
+                temp_upper_bound = temp_upper_bound + (creation_cost/constants.CREATION_COST_REDUCTION_FACTOR)
+                self.upper_bounds.append(temp_upper_bound)
 
         logging.debug(self.upper_bounds)
         self.hyper_alpha = self.hyper_alpha / constants.ALPHA_REDUCTION_RATE
-        return self.oracle.get_super_arm(self.upper_bounds, self.context_vectors, self.arms)
+        with timing.phase(constants.MEASURE_PHASE_ORACLE):
+            return self.oracle.get_super_arm(self.upper_bounds, self.context_vectors, self.arms)
 
     def update(self, played_arms, reward, index_use):
         pass
@@ -91,6 +94,33 @@ class C3UCB(C3UCBBaseBandit):
         self.context_vectors = []
         self.upper_bounds = []
 
+    def update_v5(self, played_arms, arm_rewards):
+        """
+        Same update as update_v4, with the rewards as an array and the played arms folded into V and b in one step
+
+        :param played_arms: list of played arms (super arm)
+        :param arm_rewards: array of shape (number of arms, 2), (gain, creation cost) of each arm id
+        """
+        if len(played_arms) > 0:
+            played_arms = numpy.asarray(played_arms)
+            rewards = arm_rewards[played_arms]
+            # rows as lists, formatting numpy rows for the log costs more than the update
+            for i, arm_reward in zip(played_arms.tolist(), rewards.tolist()):
+                logging.info(f"reward for {self.arms[i].index_name}, {self.arms[i].query_ids_backup} is {arm_reward}")
+                self.arms[i].index_usage_last_batch = (self.arms[i].index_usage_last_batch + arm_reward[0]) / 2
+
+            # rows are the played context vectors, the creation cost feature is learnt from the creation cost only
+            contexts = numpy.hstack([self.context_vectors[i] for i in played_arms]).T
+            creation_features = contexts[:, 1].copy()
+            contexts[:, 1] = 0
+            self.v = self.v + contexts.T @ contexts
+            self.v[1, 1] += creation_features @ creation_features
+            self.b = self.b + contexts.T @ rewards[:, :1]
+            self.b[1, 0] += creation_features @ rewards[:, 1]
+
+        self.context_vectors = []
+        self.upper_bounds = []
+
     def set_arms(self, bandit_arms):
         """
         This can be used to initially set the bandit arms in the algorithm
@@ -7,6 +7,19 @@ import database.sql_helper as sql_helper
 from bandits.bandit_arm import BanditArm
 
 bandit_arm_store = {}
+# (table name, index columns) -> estimated index size, filled ahead of the arm generation by the round prefetch
+index_size_cache = {}
+
+
+def get_estimated_index_size(connection, table_name, col_names):
+    """
+    :return: estimated size of an index on the given columns, from index_size_cache when it was estimated before
+    """
+    key = (table_name, tuple(col_names))
+    if key not in index_size_cache:
+        index_size_cache[key] = sql_helper.get_estimated_size_of_index_v1(connection, constants.SCHEMA_NAME,
+                                                                          table_name, col_names)
+    return index_size_cache[key]
 
 
 def gen_arms_from_predicates_v2(connection, query_obj):
@@ -50,8 +63,7 @@ def gen_arms_from_predicates_v2(connection, query_obj):
                 else:
                     bandit_arm.arm_value[query_id] = arm_value
             else:
-                size = sql_helper.get_estimated_size_of_index_v1(connection, constants.SCHEMA_NAME,
-                                                                 table_name, col_permutation)
+                size = get_estimated_index_size(connection, table_name, col_permutation)
                 bandit_arm = BanditArm(col_permutation, table_name, size, table_row_count)
                 bandit_arm.query_id = query_id
                 if len(col_permutation) == len(table_predicates):
@@ -81,8 +93,7 @@ def gen_arms_from_predicates_v2(connection, query_obj):
                 else:
                     bandit_arm.arm_value[query_id] = arm_value
             else:
-                size = sql_helper.get_estimated_size_of_index_v1(connection, constants.SCHEMA_NAME,
-                                                                 table_name, col_permutation)
+                size = get_estimated_index_size(connection, table_name, col_permutation)
                 bandit_arm = BanditArm(col_permutation, table_name, size, table_row_count)
                 bandit_arm.query_id = query_id
                 bandit_arm.cluster = table_name + '_' + str(query_id) + '_all'
@@ -107,11 +118,8 @@ def gen_arms_from_predicates_v2(connection, query_obj):
                     table_row_count = table.table_row_count
                     arm_value = (1 - query_obj.selectivity[table_name]) * table_row_count
                     if arm_id_with_include not in bandit_arm_store:
-                        size_with_includes = sql_helper.get_estimated_size_of_index_v1(connection,
-                                                                                       constants.SCHEMA_NAME,
-                                                                                       table_name,
-                                                                                       col_permutation + tuple(
-                                                                                           includes))
+                        size_with_includes = get_estimated_index_size(connection, table_name,
+                                                                      col_permutation + tuple(includes))
                         bandit_arm = BanditArm(col_permutation, table_name, size_with_includes, table_row_count,
                                                includes)
                         bandit_arm.is_include = 1
@@ -130,6 +138,39 @@ def gen_arms_from_predicates_v2(connection, query_obj):
     return bandit_arms
 
 
+def prefetch_index_sizes(connection, predicates, payloads, selectivity):
+    """
+    Estimates the sizes of the arms gen_arms_from_predicates_v2 would create for a query and that are not in the arm
+    store yet, so the arm generation finds them in index_size_cache
+
+    :param connection: SQL connection
+    :param predicates: predicates of the query
+    :param payloads: payloads of the query
+    :param selectivity: selectivity of the query
+    """
+    tables = sql_helper.get_tables(connection)
+    for table_name, table_predicates in predicates.items():
+        table = tables[table_name]
+        if table.table_row_count < constants.SMALL_TABLE_IGNORE:
+            continue
+        includes = sorted(set(payloads.get(table_name, ())) - set(table_predicates))
+        if not (selectivity[table_name] > constants.TABLE_MIN_SELECTIVITY and len(includes) > 0):
+            table_predicates_prefix = table_predicates[0:6]
+            for j in range(1, (len(table_predicates_prefix) + 1)):
+                for col_permutation in itertools.permutations(table_predicates_prefix, j):
+                    if BanditArm.get_arm_id(col_permutation, table_name) not in bandit_arm_store:
+                        get_estimated_index_size(connection, table_name, col_permutation)
+        if constants.INDEX_INCLUDES and includes:
+            for col_permutation in itertools.permutations(table_predicates, len(table_predicates)):
+                if BanditArm.get_arm_id(col_permutation, table_name, includes) not in bandit_arm_store:
+                    get_estimated_index_size(connection, table_name, col_permutation + tuple(includes))
+
+    for table_name, table_payloads in payloads.items():
+        if table_name not in predicates and tables[table_name].table_row_count >= constants.SMALL_TABLE_IGNORE:
+            if BanditArm.get_arm_id(table_payloads, table_name) not in bandit_arm_store:
+                get_estimated_index_size(connection, table_name, table_payloads)
+
+
 def gen_arms_from_predicates_single(connection, query_obj):
     """
     This method take predicates (a dictionary of lists) as input and creates the generate arms for all possible
@@ -315,3 +356,34 @@ def get_query_context_v1(query_object, all_columns, context_size):
                 i += 1
         query_object.context = context_vector
     return context_vector
+
+
+def get_query_contexts_v2(query_objects, all_columns, context_size):
+    """
+    Builds the context vectors of several queries as the rows of one matrix, same vectors as get_query_context_v1.
+    The context of each query is set to a column view of its row.
+
+    :param query_objects: query objects without context
+    :param all_columns: columns in database
+    :param context_size: size of the context
+    :return: matrix of shape (number of queries, context size)
+    """
+    column_positions = {}
+    i = 0
+    for table_name in all_columns:
+        for column_name in all_columns[table_name]:
+            column_positions.setdefault((table_name, column_name), []).append(i)
+            i += 1
+    rows = []
+    positions = []
+    for row, query_object in enumerate(query_objects):
+        for table_name, table_predicates in query_object.predicates.items():
+            for column_name in set(table_predicates):
+                for position in column_positions.get((table_name, column_name), ()):
+                    rows.append(row)
+                    positions.append(position)
+    contexts = numpy.zeros((len(query_objects), context_size), dtype=float)
+    contexts[rows, positions] = 1
+    for row, query_object in enumerate(query_objects):
+        query_object.context = contexts[row].reshape(-1, 1)
+    return contexts
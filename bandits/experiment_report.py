@@ -1,22 +1,65 @@
+import os
+
 import pandas as pd
 from pandas import DataFrame
 
+import constants
+from shared import results_sink
+
 
 class ExpReport:
-    def __init__(self, exp_id, component_id, reps, batches_per_rep):
+    def __init__(self, exp_id, component_id, reps, batches_per_rep, results_path=None):
         """
 
         :param exp_id: id of the experiment
         :param component_id: what component are we testing
         :param reps: number of repetitions that we will repeat
         :param batches_per_rep: number of batches in a single test
+        :param results_path: folder of the results sink parts of this report (see open_sink), None to keep the
+            data in memory only
         """
         self.exp_id = exp_id
         self.component_id = component_id
         self.reps = reps
         self.batches_per_rep = batches_per_rep
-        self.data = DataFrame()      # A data frame
+        self.results_path = results_path
         self.total_workload_time = 0
+        self._frames = []           # data frames added in memory
+        self._data = None           # cached concatenation of the sink parts and the frames
+
+    @property
+    def data(self):
+        """
+        All the measurements of the report, read from the results sink on first use
+        """
+        if self._data is None:
+            frames = list(self._frames)
+            if self.results_path and os.path.isdir(self.results_path):
+                frames.insert(0, results_sink.read_results(self.results_path))
+            frames = [frame for frame in frames if not frame.empty]
+            self._data = pd.concat(frames, ignore_index=True) if frames else DataFrame()
+        return self._data
+
+    def open_sink(self, rep):
+        """
+        Opens the results sink of a repetition, the rows appended to it become part of the report data
+
+        :param rep: repetition number
+        :return: ResultsSink
+        """
+        self._data = None
+        return results_sink.ResultsSink(self.results_path, 'rep_' + str(rep), rep)
+
+    def get_completed_reps(self):
+        """
+        :return: set of the repetitions whose results sink part holds the total workload time, written when the
+            repetition ends
+        """
+        if not self.results_path or not os.path.isdir(self.results_path):
+            return set()
+        data = results_sink.read_results(self.results_path)
+        totals = data[data[constants.DF_COL_MEASURE_NAME] == constants.MEASURE_TOTAL_WORKLOAD_TIME]
+        return set(totals[constants.DF_COL_REP].astype(int))
 
     def add_data_tuple(self, data_tuple):
         """
@@ -25,7 +68,7 @@ class ExpReport:
 
         :param data_tuple: data collected from a batch
         """
-        self.data.append(data_tuple)
+        self.add_data_list(DataFrame([data_tuple]))
 
     def add_data_list(self, data_list):
         """
@@ -34,4 +77,20 @@ class ExpReport:
 
         :param data_list: data collected from a repetition
         """
-        self.data = pd.concat([self.data, data_list])
+        self._frames.append(data_list)
+        self._data = None
+
+    def __getstate__(self):
+        # the sink parts stay on disk, only the data added in memory is pickled
+        state = self.__dict__.copy()
+        state['_data'] = None
+        return state
+
+    def __setstate__(self, state):
+        if 'data' in state:
+            # reports pickled before the results sink kept the data frame in the data attribute
+            state['_frames'] = [state.pop('data')]
+        state.setdefault('results_path', None)
+        state.setdefault('_frames', [])
+        state['_data'] = None
+        self.__dict__.update(state)
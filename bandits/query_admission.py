@@ -0,0 +1,110 @@
+"""
+Admission of the queries of a round into the query store.
+
+The queries seen for the first time in a round are admitted together: their selectivities are estimated concurrently,
+each worker thread planning on its own connection, and their contexts are built as one matrix. This keeps round 0 and
+the rounds after a workload shift, where most queries are new, from planning the queries one by one.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bandits.bandit_helper_v2 as bandit_helper
+import constants
+import database.sql_connection as sql_connection
+import database.sql_helper as sql_helper
+from bandits.query_v5 import Query, QueryVariant
+from database import sql_trace
+
+
+def estimate_selectivities(connection, queries, workers=constants.ADMISSION_WORKERS):
+    """
+    :param connection: sql connection, used when the selectivities are estimated sequentially
+    :param queries: list of query dictionaries (query_string, predicates)
+    :param workers: number of threads, each opens its own connection
+    :return: list of selectivity dictionaries, aligned with queries
+    """
+    def estimate(query, query_connection):
+        return sql_helper.get_selectivity_v3(query_connection, query['query_string'], query['predicates'])
+
+    # the trace of a recorded run is written sequentially
+    if workers <= 1 or len(queries) < 2 or not sql_helper.CONCURRENT_PLANNING or sql_trace.is_recording():
+        return [estimate(query, connection) for query in queries]
+
+    local = threading.local()
+    connections = []
+    connections_lock = threading.Lock()
+
+    def estimate_on_thread_connection(query):
+        if not hasattr(local, 'connection'):
+            local.connection = sql_connection.get_sql_connection()
+            with connections_lock:
+                connections.append(local.connection)
+        return estimate(query, local.connection)
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(workers, len(queries))) as executor:
+            return list(executor.map(estimate_on_thread_connection, queries))
+    finally:
+        for worker_connection in connections:
+            sql_connection.close_sql_connection(worker_connection)
+
+
+def admit_queries(connection, query_store, queries, t, all_columns, context_size, selectivities=None):
+    """
+    Records the queries of a round in the query store, the new queries are created in bulk
+
+    :param connection: sql connection
+    :param query_store: QueryStore of the simulator
+    :param queries: query dictionaries of the round
+    :param t: current round
+    :param all_columns: columns in database, for the query contexts
+    :param context_size: size of the query contexts
+    :param selectivities: optional dictionary of query id -> selectivity estimated ahead (see RoundPrefetcher)
+    :return: query objects of the round, in the order of queries. With template sharing the variants of a template
+        query are QueryVariant objects
+    """
+    query_objects = [None] * len(queries)
+    new_positions = {}      # id of a new query -> positions of the query in the round
+    template_ids = [query_store.template_id(query) for query in queries]
+    for n, (query, query_id) in enumerate(zip(queries, template_ids)):
+        if query_id in new_positions:
+            new_positions[query_id].append(n)
+        else:
+            query_objects[n] = query_store.see(query_id, query['query_string'], t)
+            if query_objects[n] is None:
+                new_positions[query_id] = [n]
+    if new_positions:
+        _add_new_queries(connection, query_store, queries, new_positions, query_objects, t, all_columns, context_size,
+                         selectivities)
+    for n, (query, query_id) in enumerate(zip(queries, template_ids)):
+        if query['id'] != query_id:
+            query_objects[n] = QueryVariant(query_objects[n], query['id'], query['query_string'])
+    return query_objects
+
+
+def _add_new_queries(connection, query_store, queries, new_positions, query_objects, t, all_columns, context_size,
+                     selectivities):
+    """
+    Creates the query objects of the queries seen for the first time and adds them to the query store
+
+    :param new_positions: dictionary of store id of a new query -> positions of the query in the round
+    """
+    first_queries = {query_id: queries[positions[0]] for query_id, positions in new_positions.items()}
+    selectivities = dict(selectivities or {})
+    missing_ids = [query_id for query_id in first_queries if query_id not in selectivities]
+    missing_selectivities = estimate_selectivities(connection, [first_queries[query_id] for query_id in missing_ids])
+    selectivities.update(zip(missing_ids, missing_selectivities))
+    new_query_objects = []
+    for query_id, query in first_queries.items():
+        new_query_objects.append(Query(connection, query_id, query['query_string'], query['predicates'],
+                                       query['payload'], t, selectivity=selectivities[query_id]))
+    bandit_helper.get_query_contexts_v2(new_query_objects, all_columns, context_size)
+    for query_object, positions in zip(new_query_objects, new_positions.values()):
+        query_store.add(query_object)
+        for n in positions:
+            query_objects[n] = query_object
+        # repeated in the round, as when a known query is seen again
+        query_object.frequency += len(positions) - 1
+        query_object.query_string = queries[positions[-1]]['query_string']
+    logging.debug(f"Admitted {len(new_query_objects)} new queries in round {t}")
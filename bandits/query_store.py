@@ -0,0 +1,218 @@
+"""
+Store of the query objects seen by a simulator, indexed by the round they were last seen.
+
+A query is in the window while it was seen in the last QUERY_MEMORY rounds. The queries of the window are kept in
+buckets by last seen round, so expiring the queries of a round only touches the buckets that leave the window. The
+past queries of the window are kept in the order they were first added in, the queries that enter the window in a
+round are sorted and merged into them in the next round: classifying a round costs O(W + k log k) for a window of W
+queries of which k enter it, instead of sorting the whole window. Expired queries can optionally be evicted: they are
+pickled to a spill file (shelve) with their scan histories and loaded back when seen again. Each query has one spill
+entry, overwritten when it is evicted again, unless the last checkpoint still references the entry (see
+checkpoint_saved).
+
+With template sharing the queries are stored by template: a query whose text differs from a known query only in its
+literals (same fingerprint, shared/fingerprint.py) is stored as the query of that template, whose id is the id of the
+first variant seen.
+"""
+import glob
+import heapq
+import logging
+import os
+import shelve
+
+import constants
+from shared import fingerprint
+
+
+class QueryStore:
+
+    def __init__(self, query_memory=constants.QUERY_MEMORY, spill_path=None, share_templates=False):
+        """
+        :param query_memory: number of rounds a query stays in the window after it was last seen
+        :param spill_path: shelve file the expired queries are evicted to, None to keep them in memory
+        :param share_templates: store the literal variants of a template as one query
+        """
+        self.query_memory = query_memory
+        self.spill_path = spill_path
+        self.share_templates = share_templates
+        self._template_ids = {}     # query id -> id of its template query
+        self._templates = {}        # template fingerprint -> id of the template query
+        self._queries = {}          # query id -> query object, in memory
+        self._sequence = {}         # query id -> order the query was first added in, the order of the window lists
+        self._spilled = {}          # query id -> spill key of an evicted query
+        self._window = {}           # query id -> query object seen in the last query_memory rounds
+        self._past = {}             # query id -> window query first seen before _new_round, in _sequence order
+        self._new = {}              # query id -> window query first seen in _new_round
+        self._new_round = None
+        self._buckets = {}          # last seen round -> ids of the window queries last seen in that round
+        self._bucket_rounds = []    # heap of the rounds of the buckets
+        self._spill_keys = {}       # query id -> spill key of the last eviction of the query
+        self._spill_versions = {}   # query id -> number of spill keys the query had
+        self._checkpoint_keys = set()   # spill keys the last checkpoint references
+        self._replaced_keys = set()     # spill keys only the last checkpoint references, removed at the next one
+        self._spill = None          # spill file, opened on first use
+
+    @classmethod
+    def from_configs(cls, configs, folder_path, file_prefix):
+        """
+        :param configs: shared.configs_v2 module, evict_expired_queries selects the spill file and
+            share_query_templates the template sharing
+        :param folder_path: folder of the spill file (the experiment folder)
+        :param file_prefix: prefix of the spill file, e.g. the simulator name
+        """
+        spill_path = os.path.join(folder_path, f"{file_prefix}_query_store") if configs.evict_expired_queries else None
+        return cls(constants.QUERY_MEMORY, spill_path, configs.share_query_templates)
+
+    def __len__(self):
+        return len(self._queries) + len(self._spilled)
+
+    def __contains__(self, query_id):
+        return query_id in self._queries or query_id in self._spilled
+
+    def template_id(self, query):
+        """
+        :param query: query dictionary of the workload (id, query_string)
+        :return: id the query is stored under, the id of its template query with template sharing
+        """
+        if not self.share_templates:
+            return query['id']
+        template_id = self._template_ids.get(query['id'])
+        if template_id is None:
+            template_id = self._templates.setdefault(fingerprint.fingerprint(query['query_string']), query['id'])
+            self._template_ids[query['id']] = template_id
+        return template_id
+
+    def _bucket_add(self, query):
+        if query.last_seen not in self._buckets:
+            self._buckets[query.last_seen] = set()
+            heapq.heappush(self._bucket_rounds, query.last_seen)
+        self._buckets[query.last_seen].add(query.id)
+
+    def _merge_new(self, t):
+        """
+        Moves the queries that entered the window before round t to the past queries
+        """
+        if self._new_round == t:
+            return
+        if self._new:
+            entered = sorted(self._new.values(), key=lambda query_obj: self._sequence[query_obj.id])
+            merged = heapq.merge(self._past.values(), entered, key=lambda query_obj: self._sequence[query_obj.id])
+            self._past = {query.id: query for query in merged}
+            self._new = {}
+        self._new_round = t
+
+    def _enter(self, query):
+        self._merge_new(query.first_seen)
+        self._new[query.id] = query
+
+    def add(self, query):
+        """
+        :param query: query object seen for the first time, its last_seen and first_seen are the current round
+        """
+        self._sequence[query.id] = len(self._sequence)
+        self._queries[query.id] = query
+        self._window[query.id] = query
+        self._bucket_add(query)
+        self._enter(query)
+
+    def see(self, query_id, query_string, t):
+        """
+        Records that a known query was seen again in round t
+
+        :param query_id: id of the query
+        :param query_string: query text of this round
+        :param t: current round
+        :return: query object, None if the query is not in the store (use add)
+        """
+        query = self._queries.get(query_id)
+        if query is None:
+            if query_id not in self._spilled:
+                return None
+            query = self._get_spill()[self._spilled.pop(query_id)]
+            self._queries[query_id] = query
+        query.frequency += 1
+        query.query_string = query_string
+        if query_id in self._window:
+            self._buckets[query.last_seen].discard(query_id)
+        else:
+            self._window[query_id] = query
+        query.last_seen = t
+        self._bucket_add(query)
+        if query.first_seen == -1:
+            query.first_seen = t
+            self._enter(query)
+        return query
+
+    def classify(self, t):
+        """
+        Expires the queries that were not seen in the last query_memory rounds and splits the window
+
+        :param t: current round
+        :return: (past queries, queries seen for the first time in round t), in the order they were added
+        """
+        self._merge_new(t)
+        evicted = 0
+        while self._bucket_rounds and t - self._bucket_rounds[0] > self.query_memory:
+            for query_id in self._buckets.pop(heapq.heappop(self._bucket_rounds)):
+                query = self._window.pop(query_id)
+                del self._past[query_id]
+                query.first_seen = -1
+                if self.spill_path:
+                    spill_key = self._get_spill_key(query_id)
+                    self._get_spill()[spill_key] = query
+                    self._spilled[query_id] = spill_key
+                    del self._queries[query_id]
+                    evicted += 1
+        if evicted:
+            self._spill.sync()
+            logging.debug(f"Evicted {evicted} expired queries to {self.spill_path}")
+        return list(self._past.values()), sorted(self._new.values(), key=lambda query_obj: self._sequence[query_obj.id])
+
+    def _get_spill_key(self, query_id):
+        """
+        :return: spill key to evict the query to, its last key unless the last checkpoint references that entry
+        """
+        spill_key = self._spill_keys.get(query_id)
+        if spill_key is None or spill_key in self._checkpoint_keys:
+            if spill_key is not None:
+                self._replaced_keys.add(spill_key)
+            version = self._spill_versions.get(query_id, 0)
+            self._spill_versions[query_id] = version + 1
+            spill_key = f"{query_id}:{version}"
+            self._spill_keys[query_id] = spill_key
+        return spill_key
+
+    def checkpoint_saved(self):
+        """
+        Called once a checkpoint of the store is written: the spill entries only the previous checkpoint referenced are
+        removed, and the entries of this one are kept until the next
+        """
+        if self._replaced_keys:
+            spill = self._get_spill()
+            for spill_key in self._replaced_keys:
+                del spill[spill_key]
+            spill.sync()
+        self._replaced_keys = set()
+        self._checkpoint_keys = set(self._spilled.values())
+
+    def _get_spill(self):
+        if self._spill is None:
+            self._spill = shelve.open(self.spill_path, flag='c')
+        return self._spill
+
+    def close(self):
+        """Closes and removes the spill file, at the end of a complete run"""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        if self.spill_path:
+            for path in glob.glob(glob.escape(self.spill_path) + '*'):
+                os.remove(path)
+
+    def __getstate__(self):
+        # the spill file stays on disk, the entries a checkpoint references are not overwritten until the next one, so
+        # the store resumed from it keeps them as well
+        state = self.__dict__.copy()
+        state['_spill'] = None
+        state['_checkpoint_keys'] = set(self._spilled.values())
+        return state
@@ -2,13 +2,15 @@ import database.sql_helper as sql_helper
 
 
 class Query:
-    def __init__(self, connection, query_id, query_string, predicates, payloads, time_stamp=0):
+    def __init__(self, connection, query_id, query_string, predicates, payloads, time_stamp=0, selectivity=None):
         self.id = query_id
         self.predicates = predicates
         self.payload = payloads
         self.group_by = {}
         self.order_by = {}
-        self.selectivity = sql_helper.get_selectivity_v3(connection, query_string, self.predicates)
+        if selectivity is None:
+            selectivity = sql_helper.get_selectivity_v3(connection, query_string, self.predicates)
+        self.selectivity = selectivity
         self.query_string = query_string
         self.frequency = 1
         self.last_seen = time_stamp
@@ -24,3 +26,25 @@ class Query:
 
     def get_id(self):
         return self.id
+
+
+class QueryVariant:
+    """
+    A literal variant of a template query (share_query_templates in exp.conf): it is executed with its own id and
+    query text, everything else (predicates, selectivity, scan times, context) is the template's
+    """
+    __slots__ = ('template', 'id', 'query_string')
+
+    def __init__(self, template, query_id, query_string):
+        self.template = template
+        self.id = query_id
+        self.query_string = query_string
+
+    def __getattr__(self, name):
+        return getattr(object.__getattribute__(self, 'template'), name)
+
+    def __hash__(self):
+        return self.id
+
+    def get_id(self):
+        return self.id
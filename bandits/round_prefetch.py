@@ -0,0 +1,76 @@
+"""
+Preparation of the next round while the queries of the current round execute (prefetch_next_round in exp.conf).
+
+The window of the next round is known from the workload shifts, so while create_query_drop_v3 runs the prefetch
+thread estimates, on its own connection, the selectivities of the next window's queries that are not in the query
+store yet and the sizes of the arms the arm generation will create for the queries of both rounds. The next round
+only waits for the thread; the bandit update, the arm generation, UCB scoring and the oracle stay on the simulator
+thread. The prefetch reads the arm store and the query store but never modifies them.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import bandits.bandit_helper_v2 as bandit_helper
+import bandits.query_admission as query_admission
+import database.sql_connection as sql_connection
+
+
+class RoundPrefetcher:
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='round_prefetch')
+        self.connection = None      # opened by the prefetch thread
+        self.future = None
+
+    def submit(self, query_store, next_queries, query_objects):
+        """
+        Starts preparing the next round
+
+        :param query_store: QueryStore of the simulator, queries it knows are not estimated again
+        :param next_queries: query dictionaries of the next round
+        :param query_objects: query objects of the current round
+        """
+        new_queries = {}
+        for query in next_queries:
+            query_id = query_store.template_id(query)
+            if query_id not in query_store and query_id not in new_queries:
+                new_queries[query_id] = query
+        self.future = self.executor.submit(self._prefetch, new_queries, list(query_objects))
+
+    def _prefetch(self, new_queries, query_objects):
+        if self.connection is None:
+            self.connection = sql_connection.get_sql_connection()
+        selectivities = dict(zip(new_queries.keys(),
+                                 query_admission.estimate_selectivities(self.connection, list(new_queries.values()))))
+        for query_object in query_objects:
+            bandit_helper.prefetch_index_sizes(self.connection, query_object.predicates, query_object.payload,
+                                               query_object.selectivity)
+        for query_id, query in new_queries.items():
+            bandit_helper.prefetch_index_sizes(self.connection, query['predicates'], query['payload'],
+                                               selectivities[query_id])
+        return selectivities
+
+    def take(self):
+        """
+        Waits for the preparation of the round
+
+        :return: dictionary of query id (in the query store) -> selectivity of the new queries, empty if nothing was
+            prefetched
+        """
+        if self.future is None:
+            return {}
+        future, self.future = self.future, None
+        try:
+            return future.result()
+        except Exception:
+            # the round is prepared on the simulator thread instead
+            logging.exception("Round prefetch failed")
+            return {}
+
+    def close(self):
+        if self.future is not None:
+            self.take()
+        self.executor.shutdown()
+        if self.connection is not None:
+            sql_connection.close_sql_connection(self.connection)
+            self.connection = None
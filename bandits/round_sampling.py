@@ -0,0 +1,147 @@
+"""
+Sampling of the queries a round executes (sample_queries in exp.conf).
+
+The queries of a round are stratified by the tables they touch. Every stratum gets a share of the round's expected
+sample size proportional to its estimated cost, and at least one query, and within a stratum a query is sampled with a
+probability that mixes a uniform share and the share of its template's cost (the last execution time of the template,
+so literal variants of a template share it). Queries of a template that was never executed are always executed. The
+sampled queries are drawn independently (Poisson sampling) and weighted by the inverse of their inclusion
+probability, so the batch time and the gain of every arm are unbiased (Horvitz-Thompson) estimates of the whole batch.
+Their variances give the 95% confidence intervals and the sample fraction of the next round: the smallest fraction
+whose relative standard error meets the target, so the executed queries stop growing with the batch size once the
+estimates are precise enough.
+"""
+import logging
+import math
+
+import numpy
+
+import database.sql_helper as sql_helper
+
+Z_95 = 1.96
+
+
+def _template_id(query):
+    # the template of a QueryVariant, the query itself otherwise
+    return getattr(query, 'template', query).id
+
+
+def _stratum(query):
+    return frozenset(query.predicates) | frozenset(query.payload)
+
+
+class RoundSampler:
+
+    def __init__(self, target_error=0.05, min_fraction=0.1, seed=0):
+        """
+        :param target_error: relative standard error of the batch time and arm gain estimates to plan the sample for
+        :param min_fraction: smallest fraction of the queries with a known cost a round samples
+        :param seed: seed of the sampling
+        """
+        self.target_error = target_error
+        self.min_fraction = min_fraction
+        self.fraction = 1.0
+        self.rng = numpy.random.default_rng(seed)
+        self.template_costs = {}        # template id -> execution time of its last execution
+        # statistics of the last round
+        self.sampled_queries = 0
+        self.executed_time = 0.0
+        self.execution_cost_interval = 0.0
+        self.reward_intervals = {}      # index name -> half width of the 95% interval of its gain
+
+    @classmethod
+    def from_configs(cls, configs):
+        """
+        :param configs: shared.configs_v2 module
+        :return: RoundSampler, None when sample_queries is off
+        """
+        if not configs.sample_queries:
+            return None
+        return cls(configs.sample_target_error, configs.sample_min_fraction, configs.sample_seed)
+
+    def get_inclusion_probabilities(self, queries):
+        """
+        :param queries: query objects of the round
+        :return: array of the probability of each query to be executed
+        """
+        probabilities = numpy.ones(len(queries))
+        costs = numpy.array([self.template_costs.get(_template_id(query), numpy.nan) for query in queries])
+        known = numpy.flatnonzero(~numpy.isnan(costs))
+        if len(known) == 0 or self.fraction >= 1:
+            return probabilities
+        strata = {}
+        for n in known:
+            strata.setdefault(_stratum(queries[n]), []).append(n)
+        sample_size = self.fraction * len(known)
+        total_cost = costs[known].sum()
+        for positions in strata.values():
+            stratum_costs = costs[positions]
+            stratum_cost = stratum_costs.sum()
+            if total_cost > 0:
+                stratum_size = sample_size * stratum_cost / total_cost
+            else:
+                stratum_size = sample_size * len(positions) / len(known)
+            stratum_size = min(len(positions), max(1.0, stratum_size))
+            cost_shares = stratum_costs / stratum_cost if stratum_cost > 0 else 1 / len(positions)
+            probabilities[positions] = numpy.minimum(1.0, stratum_size * (0.5 / len(positions) + 0.5 * cost_shares))
+        return probabilities
+
+    def create_query_drop(self, connection, schema_name, bandit_arm_list, arm_list_to_add, arm_list_to_delete,
+                          queries):
+        """
+        create_query_drop_v3 of the sql helper for a sample of the queries
+
+        :return: estimated execution cost of all the queries, index creation costs, estimated arm rewards
+            (index name -> [gain, creation cost])
+        """
+        probabilities = self.get_inclusion_probabilities(queries)
+        sampled = numpy.flatnonzero(self.rng.random(len(queries)) < probabilities)
+        # the index changes first, then the sampled queries one by one for their individual times and gains
+        _, creation_cost, arm_rewards = sql_helper.create_query_drop_v3(connection, schema_name, bandit_arm_list,
+                                                                       arm_list_to_add, arm_list_to_delete, [])
+        times = numpy.zeros(len(sampled))
+        gains = {}      # index name -> gains of the sampled queries
+        for k, n in enumerate(sampled):
+            times[k], _, query_rewards = sql_helper.create_query_drop_v3(connection, schema_name, bandit_arm_list, {},
+                                                                         {}, [queries[n]])
+            self.template_costs[_template_id(queries[n])] = times[k]
+            for index_name, (gain, _) in query_rewards.items():
+                gains.setdefault(index_name, numpy.zeros(len(sampled)))[k] = gain
+
+        inclusion = probabilities[sampled]
+        weights = 1 / inclusion
+        # Horvitz-Thompson variance estimate of a Poisson sample, sum over the sample of (1 - p) y^2 / p^2
+        variance_factors = (1 - inclusion) * weights ** 2
+        execute_cost = float(times @ weights)
+        execute_cost_variance = float(times ** 2 @ variance_factors)
+        self.reward_intervals = {}
+        total_gain = 0.0
+        gain_variance = 0.0
+        for index_name, index_gains in gains.items():
+            gain = float(index_gains @ weights)
+            variance = float(index_gains ** 2 @ variance_factors)
+            arm_rewards.setdefault(index_name, [0, 0])[0] += gain
+            self.reward_intervals[index_name] = Z_95 * math.sqrt(variance)
+            total_gain += abs(gain)
+            gain_variance += variance
+
+        self.sampled_queries = len(sampled)
+        self.executed_time = float(times.sum())
+        self.execution_cost_interval = Z_95 * math.sqrt(execute_cost_variance)
+        self.fraction = self._plan_fraction(times, weights, execute_cost, gains, total_gain)
+        logging.info(f"Sampled {self.sampled_queries} of {len(queries)} queries, estimated execution cost "
+                     f"{execute_cost:.3f} +- {self.execution_cost_interval:.3f}, next sample fraction "
+                     f"{self.fraction:.3f}")
+        return execute_cost, creation_cost, arm_rewards
+
+    def _plan_fraction(self, times, weights, execute_cost, gains, total_gain):
+        """
+        :return: sample fraction of the next round. With a uniform fraction f the variance of an estimated total is
+            (1 / f - 1) times the sum of the squared values, which is estimated from this round's sample
+        """
+        fractions = [self.min_fraction]
+        for total, squares in ((execute_cost, float(times ** 2 @ weights)),
+                               (total_gain, sum(float(index_gains ** 2 @ weights) for index_gains in gains.values()))):
+            if squares > 0:
+                fractions.append(1 / (1 + (self.target_error * total) ** 2 / squares))
+        return min(1.0, max(fractions))
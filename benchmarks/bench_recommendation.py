@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the index recommendation hot path of the C3UCB simulator (what "Index Recommendation Cost"
+measures): arm generation, the name encoded and derived context vectors, C3UCB.select_arm_v2, OracleV7.get_super_arm
+and the bandit update as the simulator calls it, C3UCB.update_v5 on the rewards converted by
+reward_helper.get_reward_array (the conversion is part of the timing). Runs from before update_v5 timed C3UCB.update_v4,
+--compare compares the two updates.
+
+The benchmark builds a synthetic schema in a temporary SQLite database (see database/sql_helper_sqlite.py), a synthetic
+workload over it, and plays the bandit for a number of rounds. Each function is timed per call, then the rounds are
+replayed under tracemalloc to get the peak memory of each function.
+
+    python benchmarks/bench_recommendation.py --tables 10 --columns 20 --queries 50 --rounds 25 --output new.json
+    python benchmarks/bench_recommendation.py --compare old.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+FUNCTIONS = ('gen_arms_from_predicates_v2', 'get_name_encode_context_vectors_v2', 'get_derived_value_context_vectors_v3',
+             'select_arm_v2', 'get_super_arm', 'update_v5')
+# function names of the earlier runs, for --compare
+PREVIOUS_NAMES = {'update_v5': 'update_v4'}
+
+
+def build_schema(database_file, tables, columns, rows, seed):
+    """
+    Creates tables t0..tN with an integer primary key and columns c0..cM of random integers
+
+    :return: dictionary of table name -> list of column names
+    """
+    rng = random.Random(seed)
+    connection = sqlite3.connect(database_file)
+    schema = {}
+    for t in range(tables):
+        table_name = 't%d' % t
+        column_names = ['c%d' % c for c in range(columns)]
+        connection.execute('CREATE TABLE %s (id INTEGER PRIMARY KEY, %s)' % (
+            table_name, ', '.join('%s INTEGER' % column for column in column_names)))
+        # column c has about 10 * (c + 1) distinct values, so the predicates have varied selectivities
+        connection.executemany('INSERT INTO %s VALUES (%s)' % (table_name, ', '.join('?' * (columns + 1))),
+                               ([row_id] + [rng.randrange(10 * (c + 1)) for c in range(columns)]
+                                for row_id in range(rows)))
+        schema[table_name] = ['id'] + column_names
+    connection.commit()
+    connection.execute('ANALYZE')
+    connection.close()
+    return schema
+
+
+def build_workload(schema, queries, seed):
+    """
+    :return: list of (query id, query string, predicates, payload). Each query reads 1 to 3 tables with 1 to 4
+        predicates and 1 to 3 payload columns per table
+    """
+    rng = random.Random(seed)
+    table_names = sorted(schema)
+    workload = []
+    for query_id in range(queries):
+        predicates = {}
+        payload = {}
+        conditions = []
+        for table_name in rng.sample(table_names, rng.randint(1, min(3, len(table_names)))):
+            columns = schema[table_name][1:]
+            predicates[table_name] = rng.sample(columns, rng.randint(1, min(4, len(columns))))
+            payload[table_name] = rng.sample(columns, rng.randint(1, min(3, len(columns))))
+            conditions += ['%s.%s = %d' % (table_name, column, rng.randrange(10)) for column in predicates[table_name]]
+        select_list = ', '.join('%s.%s' % (table_name, column) for table_name in payload
+                                for column in payload[table_name])
+        query_string = 'SELECT %s FROM %s WHERE %s;' % (select_list, ', '.join(predicates), ' AND '.join(conditions))
+        workload.append((query_id, query_string, predicates, payload))
+    return workload
+
+
+def run_rounds(modules, connection, query_objects, all_columns, number_of_columns, context_size, rounds, max_memory,
+               timings=None, peaks=None):
+    """
+    Plays the bandit like sim_c3ucb_vR: all queries are in every batch, rewards are random
+
+    :param timings: if given, per call durations in ns are appended to timings[function]
+    :param peaks: if given, the largest tracemalloc peak of each function is kept in peaks[function]
+    """
+    bandit_helper, bandits, oracle_v2, reward_helper, constants, numpy = modules
+    rng = random.Random(0)
+    oracle = oracle_v2.OracleV7(max_memory)
+    c3ucb_bandit = bandits.C3UCB(context_size, 1.0, 0.5, oracle)
+    chosen_arms_last_round = {}
+
+    def update(chosen_arm_ids, arm_rewards, index_arm_list):
+        c3ucb_bandit.update_v5(chosen_arm_ids, reward_helper.get_reward_array(arm_rewards, index_arm_list))
+
+    def measure(name, function, *args):
+        if peaks is not None:
+            tracemalloc.reset_peak()
+            start_size = tracemalloc.get_traced_memory()[0]
+            result = function(*args)
+            peaks[name] = max(peaks.get(name, 0), tracemalloc.get_traced_memory()[1] - start_size)
+            return result
+        start = time.perf_counter_ns()
+        result = function(*args)
+        timings[name].append(time.perf_counter_ns() - start)
+        return result
+
+    for t in range(rounds):
+        index_arms = {}
+        for query_object in query_objects:
+            bandit_arms = measure('gen_arms_from_predicates_v2', bandit_helper.gen_arms_from_predicates_v2,
+                                  connection, query_object)
+            for key, index_arm in bandit_arms.items():
+                if key not in index_arms:
+                    index_arm.query_ids = set()
+                    index_arm.query_ids_backup = set()
+                    index_arms[key] = index_arm
+                index_arms[key].query_ids.add(index_arm.query_id)
+                index_arms[key].query_ids_backup.add(index_arm.query_id)
+        index_arm_list = list(index_arms.values())
+        c3ucb_bandit.set_arms(index_arm_list)
+
+        context_vectors_v1 = measure('get_name_encode_context_vectors_v2',
+                                     bandit_helper.get_name_encode_context_vectors_v2, index_arms, all_columns,
+                                     number_of_columns, constants.CONTEXT_UNIQUENESS, constants.CONTEXT_INCLUDES)
+        context_vectors_v2 = measure('get_derived_value_context_vectors_v3',
+                                     bandit_helper.get_derived_value_context_vectors_v3, connection, index_arms,
+                                     query_objects, chosen_arms_last_round, not constants.CONTEXT_INCLUDES)
+        context_vectors = [numpy.array(list(context_vectors_v2[i]) + list(context_vectors_v1[i]), ndmin=2)
+                           for i in range(len(context_vectors_v1))]
+
+        chosen_arm_ids = measure('select_arm_v2', c3ucb_bandit.select_arm_v2, context_vectors, t)
+        # The oracle alone, on the upper bounds select_arm_v2 just computed
+        measure('get_super_arm', oracle.get_super_arm, c3ucb_bandit.upper_bounds, context_vectors, index_arm_list)
+
+        chosen_arms_last_round = {index_arm_list[arm].index_name: index_arm_list[arm] for arm in chosen_arm_ids}
+        arm_rewards = {index_name: [rng.uniform(-1, 10), -rng.uniform(0, 1)] for index_name in chosen_arms_last_round}
+        measure('update_v5', update, chosen_arm_ids, arm_rewards, index_arm_list)
+
+
+def run_benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix='dba_bench_')
+    database_file = os.path.join(work_dir, 'synthetic.db')
+    schema = build_schema(database_file, args.tables, args.columns, args.rows, args.seed)
+    workload = build_workload(schema, args.queries, args.seed)
+
+    # Point the helpers at the synthetic database before they are imported
+    os.environ['DBA_BANDIT_DB_CONFIG_OVERRIDES'] = json.dumps({
+        'SYSTEM': {'db_type': 'SQLITE', 'record_trace': ''},
+        'SQLITE': {'database': database_file, 'schema': 'main', 'dataset': 'SYNTHETIC'}})
+    import numpy
+    import constants
+    import bandits.bandit_c3ucb_v2 as bandits
+    import bandits.bandit_helper_v2 as bandit_helper
+    import bandits.oracle_v2 as oracle_v2
+    import database.reward_helper as reward_helper
+    import database.sql_connection as sql_connection
+    import database.sql_helper as sql_helper
+    from bandits.query_v5 import Query
+    modules = (bandit_helper, bandits, oracle_v2, reward_helper, constants, numpy)
+
+    connection = sql_connection.get_sql_connection()
+    all_columns, number_of_columns = sql_helper.get_all_columns(connection)
+    context_size = number_of_columns * (
+            1 + constants.CONTEXT_UNIQUENESS + constants.CONTEXT_INCLUDES) + constants.STATIC_CONTEXT_SIZE
+
+    def fresh_queries():
+        bandit_helper.bandit_arm_store.clear()
+        query_objects = []
+        for query_id, query_string, predicates, payload in workload:
+            query_object = Query(connection, query_id, query_string, predicates, payload)
+            query_object.context = bandit_helper.get_query_context_v1(query_object, all_columns, number_of_columns)
+            query_objects.append(query_object)
+        return query_objects
+
+    timings = defaultdict(list)
+    for _ in range(args.repeat):
+        run_rounds(modules, connection, fresh_queries(), all_columns, number_of_columns, context_size, args.rounds,
+                   args.max_memory, timings=timings)
+
+    peaks = {}
+    tracemalloc.start()
+    run_rounds(modules, connection, fresh_queries(), all_columns, number_of_columns, context_size, args.rounds,
+               args.max_memory, peaks=peaks)
+    tracemalloc.stop()
+    connection.close()
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {}
+    for name in FUNCTIONS:
+        durations = sorted(timings[name])
+        results[name] = {
+            'calls': len(durations),
+            'mean_us': statistics.fmean(durations) / 1000 if durations else 0,
+            'median_us': statistics.median(durations) / 1000 if durations else 0,
+            'p95_us': durations[int(0.95 * (len(durations) - 1))] / 1000 if durations else 0,
+            'total_ms': sum(durations) / 1e6,
+            'peak_kib': peaks.get(name, 0) / 1024,
+        }
+    return {'meta': {'commit': git_commit(), 'python': platform.python_version(), 'numpy': numpy.__version__,
+                     'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                     'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}},
+            'results': results}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(report):
+    print('commit %s, params %s' % (report['meta']['commit'], report['meta']['params']))
+    print('%-40s %8s %12s %12s %12s %12s' % ('function', 'calls', 'median us', 'p95 us', 'total ms', 'peak KiB'))
+    for name, result in report['results'].items():
+        print('%-40s %8d %12.1f %12.1f %12.1f %12.1f' % (name, result['calls'], result['median_us'],
+                                                          result['p95_us'], result['total_ms'], result['peak_kib']))
+
+
+def compare(baseline_file, current_file, threshold):
+    """
+    Prints the median latency and peak memory ratios (current / baseline) of each function
+
+    :return: True if no function got slower or bigger than the threshold ratio
+    """
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    with open(current_file) as f:
+        current = json.load(f)
+    if baseline['meta']['params'] != current['meta']['params']:
+        print('warning: the runs used different parameters')
+    print('%s -> %s' % (baseline['meta']['commit'], current['meta']['commit']))
+    print('%-40s %12s %12s %8s %12s %12s %8s' % ('function', 'median us', 'median us', 'ratio', 'peak KiB',
+                                                 'peak KiB', 'ratio'))
+    within_threshold = True
+    for name, result in current['results'].items():
+        base_name = name if name in baseline['results'] else PREVIOUS_NAMES.get(name)
+        if base_name not in baseline['results']:
+            continue
+        base = baseline['results'][base_name]
+        time_ratio = result['median_us'] / base['median_us'] if base['median_us'] else float('inf')
+        memory_ratio = result['peak_kib'] / base['peak_kib'] if base['peak_kib'] else 1.0
+        flag = ''
+        if time_ratio > threshold or memory_ratio > threshold:
+            within_threshold = False
+            flag = '  <-- regression'
+        if base_name != name:
+            name = '%s (was %s)' % (name, base_name)
+        print('%-40s %12.1f %12.1f %8.2f %12.1f %12.1f %8.2f%s' % (name, base['median_us'], result['median_us'],
+                                                                   time_ratio, base['peak_kib'], result['peak_kib'],
+                                                                   memory_ratio, flag))
+    return within_threshold
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', type=int, default=10)
+    parser.add_argument('--columns', type=int, default=20, help='columns per table')
+    parser.add_argument('--rows', type=int, default=20000, help='rows per table (above SMALL_TABLE_IGNORE)')
+    parser.add_argument('--queries', type=int, default=50, help='queries in every batch, controls the arm count')
+    parser.add_argument('--rounds', type=int, default=25)
+    parser.add_argument('--repeat', type=int, default=3, help='timed repetitions of all the rounds')
+    parser.add_argument('--max-memory', type=int, default=25000, help='oracle memory budget in MB')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='compare two result files instead of running the benchmark')
+    parser.add_argument('--threshold', type=float, default=1.2, help='ratio reported as a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare(args.compare[0], args.compare[1], args.threshold) else 1)
+
+    report = run_benchmark(args)
+    print_results(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Scalability benchmark of the C3UCB simulator: runs the full Simulator loop on synthetic workloads of increasing size
+against the in-process synthetic database backend, and charts the per-round recommendation cost and memory versus
+the number of queries.
+
+Each scale runs in a fresh process. Memory is sampled at every round boundary: the resident set size and, with
+--tracemalloc, the peak Python heap of the round (tracemalloc slows the run down, so the recommendation costs of such
+a run are inflated).
+
+    python benchmarks/bench_scalability.py --scales 10000 30000 100000 --output-dir experiments/scalability
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks import synthetic_workload
+
+
+def _current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        # no procfs, fall back to the peak resident set size (KiB on Linux, bytes on macOS)
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+
+class _RoundMemoryHandler(logging.Handler):
+    """Samples the memory when the simulator logs the start of a round"""
+
+    def __init__(self, use_tracemalloc):
+        super().__init__(logging.INFO)
+        self.use_tracemalloc = use_tracemalloc
+        self.samples = []
+
+    def sample(self):
+        heap_peak_mb = None
+        if self.use_tracemalloc:
+            heap_peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.reset_peak()
+        self.samples.append((_current_rss_mb(), heap_peak_mb))
+
+    def emit(self, record):
+        if isinstance(record.msg, str) and record.msg.startswith('round: '):
+            self.sample()
+
+
+def run_scale(experiment_id, schema_path, experiment_path, log_path, use_tracemalloc):
+    """
+    Runs one simulation on a synthetic dataset. Meant to run in a fresh process.
+
+    :return: simulator results, memory per round [(rss MB, heap peak MB)], wall clock seconds
+    """
+    with open(experiment_path) as f:
+        experiment = json.load(f)
+    os.environ['DBA_BANDIT_EXPERIMENT'] = experiment_id
+    os.environ['DBA_BANDIT_EXPERIMENT_OVERRIDES'] = json.dumps(experiment)
+    os.environ['DBA_BANDIT_DB_CONFIG_OVERRIDES'] = json.dumps({
+        'SYSTEM': {'db_type': 'SYNTHETIC', 'record_trace': ''},
+        'SYNTHETIC': {'schema_file': schema_path, 'schema': 'synthetic', 'dataset': 'SYNTHETIC'}})
+
+    memory_handler = _RoundMemoryHandler(use_tracemalloc)
+    file_handler = logging.FileHandler(log_path, mode='w')
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logging.getLogger().addHandler(file_handler)
+    logging.getLogger().addHandler(memory_handler)
+    logging.getLogger().setLevel(logging.INFO)
+
+    from simulation.sim_c3ucb_vR import Simulator
+    if use_tracemalloc:
+        tracemalloc.start()
+    start = time.perf_counter()
+    simulator = Simulator()
+    results, _ = simulator.run()
+    elapsed = time.perf_counter() - start
+    # closes the last round
+    memory_handler.sample()
+    if use_tracemalloc:
+        tracemalloc.stop()
+    # the first sample is taken before round 0 starts
+    return results, memory_handler.samples[1:], elapsed
+
+
+def plot(rows, output_dir):
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print('matplotlib is not installed, skipping the charts')
+        return None
+
+    scales = sorted({row['queries'] for row in rows})
+    fig, axes = plt.subplots(1, 3, figsize=(18, 5))
+    for scale in scales:
+        scale_rows = [row for row in rows if row['queries'] == scale]
+        axes[0].plot([row['round'] for row in scale_rows], [row['recommendation_cost'] for row in scale_rows],
+                     label='%d queries' % scale)
+        axes[1].plot([row['round'] for row in scale_rows], [row['rss_mb'] for row in scale_rows],
+                     label='%d queries' % scale)
+    axes[0].set_xlabel('Round')
+    axes[0].set_ylabel('Index recommendation cost (s)')
+    axes[0].legend()
+    axes[1].set_xlabel('Round')
+    axes[1].set_ylabel('Resident memory (MB)')
+    axes[1].legend()
+
+    mean_costs = [sum(row['recommendation_cost'] for row in rows if row['queries'] == scale) /
+                  max(1, sum(1 for row in rows if row['queries'] == scale)) for scale in scales]
+    peak_memory = [max(row['rss_mb'] for row in rows if row['queries'] == scale) for scale in scales]
+    axes[2].plot(scales, mean_costs, marker='o', color='tab:blue')
+    axes[2].set_xlabel('Queries in the stream')
+    axes[2].set_ylabel('Mean recommendation cost per round (s)', color='tab:blue')
+    memory_axis = axes[2].twinx()
+    memory_axis.plot(scales, peak_memory, marker='s', color='tab:red')
+    memory_axis.set_ylabel('Peak resident memory (MB)', color='tab:red')
+    fig.tight_layout()
+    chart_path = os.path.join(output_dir, 'scalability.png')
+    fig.savefig(chart_path)
+    plt.close(fig)
+    return chart_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[10000, 30000, 100000],
+                        help='number of queries in the stream')
+    parser.add_argument('--experiment', default='job_benchmark_mab',
+                        help='exp.conf section the remaining settings (max_memory, alpha, lambda) are taken from')
+    parser.add_argument('--output-dir', default=os.path.join(ROOT_DIR, 'experiments', 'scalability'))
+    parser.add_argument('--tracemalloc', action='store_true', help='also record the peak Python heap per round')
+    synthetic_workload.add_arguments(parser)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    schema = synthetic_workload.generate_schema(args.tables, args.min_columns, args.max_columns, args.seed)
+    rows = []
+    mp_context = multiprocessing.get_context('spawn')
+    for scale in args.scales:
+        scale_dir = os.path.join(args.output_dir, 'queries_%d' % scale)
+        workload, experiment = synthetic_workload.generate_workload(
+            schema, scale, args.rounds, args.repetition, args.tables_per_query, args.predicate_width,
+            args.shift_every, args.shift_fraction, args.seed)
+        schema_path, _, experiment_path = synthetic_workload.write_dataset(scale_dir, schema, workload, experiment)
+        print('Running %d queries (%d templates)' % (scale, len({query['id'] for query in workload})))
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp_context) as executor:
+            results, memory, elapsed = executor.submit(
+                run_scale, args.experiment, schema_path, experiment_path, os.path.join(scale_dir, 'simulation.log'),
+                args.tracemalloc).result()
+
+        measures = {}
+        for round_number, measure_name, value in results:
+            measures.setdefault(round_number, {})[measure_name] = value
+        for round_number in sorted(measures):
+            rss_mb, heap_peak_mb = memory[round_number] if round_number < len(memory) else (None, None)
+            rows.append({'queries': scale, 'round': round_number,
+                         'recommendation_cost': measures[round_number].get('Index Recommendation Cost'),
+                         'query_execution_cost': measures[round_number].get('Query Execution Cost'),
+                         'index_creation_cost': measures[round_number].get('Index Creation Time'),
+                         'rss_mb': rss_mb, 'heap_peak_mb': heap_peak_mb})
+        print('  %.1fs wall clock, %.3fs recommendation cost' % (
+            elapsed, sum(row['recommendation_cost'] for row in rows if row['queries'] == scale)))
+
+    results_path = os.path.join(args.output_dir, 'scalability.json')
+    with open(results_path, 'w') as f:
+        json.dump({'params': vars(args), 'rounds': rows}, f, indent=2)
+    print('Results: %s' % results_path)
+    chart_path = plot(rows, args.output_dir)
+    if chart_path:
+        print('Chart: %s' % chart_path)
+
+
+if __name__ == '__main__':
+    main()
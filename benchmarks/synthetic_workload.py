@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Generator of synthetic schemas and query streams for scalability runs of the simulators.
+
+The schema is written as JSON for the synthetic database backend (database/sql_helper_synthetic.py), the queries in
+the workload format of resources/workloads (one JSON object per line). Queries are instances of templates: all the
+instances of a template share its id and query string, like the repeated queries of the shipped workloads. Each round
+draws its queries from a pool of active templates, and every few rounds part of the pool is replaced by new templates
+to simulate a workload shift.
+
+    python benchmarks/synthetic_workload.py --queries 10000 --rounds 25 --repetition 100 --output-dir /tmp/synthetic
+"""
+import argparse
+import json
+import math
+import os
+import random
+
+SCHEMA_FILE = 'schema.json'
+WORKLOAD_FILE = 'workload.json'
+EXPERIMENT_FILE = 'experiment.json'
+
+
+def generate_schema(tables, min_columns, max_columns, seed, min_rows=10 ** 4, max_rows=10 ** 7):
+    """
+    :param tables: number of tables
+    :param min_columns: minimum number of columns per table (besides the primary key)
+    :param max_columns: maximum number of columns per table
+    :param seed: random seed
+    :param min_rows: smallest table size, table sizes are log-uniform between min_rows and max_rows
+    :param max_rows: largest table size
+    :return: schema dictionary {'tables': {table: {'rows', 'pk', 'columns': {column: {'type', 'size', 'selectivity'}}}}}
+    """
+    rng = random.Random(seed)
+    schema = {}
+    for t in range(tables):
+        rows = int(math.exp(rng.uniform(math.log(min_rows), math.log(max_rows))))
+        columns = {'id': {'type': 'integer', 'size': 4, 'selectivity': 1.0 / rows}}
+        for c in range(rng.randint(min_columns, max_columns)):
+            if rng.random() < 0.6:
+                column_type, size = 'integer', rng.choice((4, 8))
+            else:
+                column_type, size = 'varchar', rng.randint(8, 64)
+            # Fraction of the rows an equality predicate on the column keeps
+            selectivity = math.exp(rng.uniform(math.log(1e-4), math.log(0.5)))
+            columns['c%d' % c] = {'type': column_type, 'size': size, 'selectivity': selectivity}
+        schema['t%d' % t] = {'rows': rows, 'pk': ['id'], 'columns': columns}
+    return {'tables': schema}
+
+
+def generate_template(rng, schema, template_id, tables_per_query, predicate_width):
+    """
+    :return: query in the workload format, with the template id as query id
+    """
+    tables = schema['tables']
+    predicates = {}
+    payload = {}
+    for table_name in rng.sample(sorted(tables), rng.randint(1, min(tables_per_query, len(tables)))):
+        columns = [column for column in tables[table_name]['columns'] if column != 'id']
+        predicates[table_name] = rng.sample(columns, rng.randint(1, min(predicate_width, len(columns))))
+        payload[table_name] = rng.sample(columns, rng.randint(1, min(3, len(columns))))
+    select_list = ', '.join('%s.%s' % (table_name, column) for table_name in payload for column in payload[table_name])
+    conditions = ' AND '.join('%s.%s = %d' % (table_name, column, rng.randrange(1000))
+                              for table_name in predicates for column in predicates[table_name])
+    query_string = 'SELECT %s FROM %s WHERE %s; -- template %d' % (select_list, ', '.join(predicates), conditions,
+                                                                  template_id)
+    return {'id': template_id, 'query_string': query_string, 'predicates': predicates, 'payload': payload,
+            'group_by': {}, 'order_by': {}}
+
+
+def generate_workload(schema, queries, rounds, repetition, tables_per_query, predicate_width, shift_every,
+                      shift_fraction, seed):
+    """
+    :param schema: output of generate_schema
+    :param queries: total number of queries in the stream
+    :param rounds: number of rounds (batches) the stream is split into
+    :param repetition: average number of instances of a template, the active pool has queries / repetition templates
+    :param tables_per_query: maximum number of tables a template reads
+    :param predicate_width: maximum number of predicate columns per table
+    :param shift_every: rounds between workload shifts (0 for a static workload)
+    :param shift_fraction: share of the active templates replaced at each shift
+    :param seed: random seed
+    :return: list of queries, experiment settings for shared/configs_v2.py (rounds, workload shifts and query ranges)
+    """
+    rng = random.Random(seed)
+    pool_size = max(1, queries // max(repetition, 1))
+    next_template_id = 0
+    active_templates = []
+    for _ in range(pool_size):
+        active_templates.append(generate_template(rng, schema, next_template_id, tables_per_query, predicate_width))
+        next_template_id += 1
+
+    workload = []
+    queries_start = []
+    queries_end = []
+    queries_per_round = max(1, queries // rounds)
+    for r in range(rounds):
+        if shift_every and r > 0 and r % shift_every == 0:
+            for position in rng.sample(range(pool_size), int(pool_size * shift_fraction)):
+                active_templates[position] = generate_template(rng, schema, next_template_id, tables_per_query,
+                                                               predicate_width)
+                next_template_id += 1
+        queries_start.append(len(workload))
+        for _ in range(queries_per_round):
+            workload.append(rng.choice(active_templates))
+        queries_end.append(len(workload))
+
+    experiment = {'rounds': rounds, 'hyp_rounds': 0, 'reps': 1, 'workload_shifts': list(range(rounds)),
+                  'queries_start': queries_start, 'queries_end': queries_end}
+    return workload, experiment
+
+
+def write_dataset(output_dir, schema, workload, experiment):
+    """
+    Writes schema.json, workload.json and experiment.json (the experiment overrides, including workload_file)
+
+    :return: paths of the schema, workload and experiment files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    schema_path = os.path.join(output_dir, SCHEMA_FILE)
+    workload_path = os.path.join(output_dir, WORKLOAD_FILE)
+    experiment_path = os.path.join(output_dir, EXPERIMENT_FILE)
+    with open(schema_path, 'w') as f:
+        json.dump(schema, f)
+    with open(workload_path, 'w') as f:
+        for query in workload:
+            f.write(json.dumps(query) + '\n')
+    with open(experiment_path, 'w') as f:
+        json.dump(dict(experiment, workload_file=workload_path), f)
+    return schema_path, workload_path, experiment_path
+
+
+def add_arguments(parser):
+    parser.add_argument('--tables', type=int, default=20)
+    parser.add_argument('--min-columns', type=int, default=5)
+    parser.add_argument('--max-columns', type=int, default=15)
+    parser.add_argument('--rounds', type=int, default=25)
+    parser.add_argument('--repetition', type=int, default=100, help='average instances per template')
+    parser.add_argument('--tables-per-query', type=int, default=3)
+    parser.add_argument('--predicate-width', type=int, default=3, help='maximum predicate columns per table')
+    parser.add_argument('--shift-every', type=int, default=5, help='rounds between workload shifts, 0 for none')
+    parser.add_argument('--shift-fraction', type=float, default=0.2, help='share of templates replaced per shift')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=10000)
+    parser.add_argument('--output-dir', required=True)
+    add_arguments(parser)
+    args = parser.parse_args()
+    schema = generate_schema(args.tables, args.min_columns, args.max_columns, args.seed)
+    workload, experiment = generate_workload(schema, args.queries, args.rounds, args.repetition,
+                                             args.tables_per_query, args.predicate_width, args.shift_every,
+                                             args.shift_fraction, args.seed)
+    paths = write_dataset(args.output_dir, schema, workload, experiment)
+    print('Wrote %s' % ', '.join(paths))
+
+
+if __name__ == '__main__':
+    main()
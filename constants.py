@@ -1,4 +1,5 @@
 import configparser
+import json
 import logging
 import os
 
@@ -11,16 +12,40 @@ EXPERIMENT_FOLDER = os.path.join(ROOT_DIR, 'experiments')
 WORKLOADS_FOLDER = os.path.join(ROOT_DIR, 'resources', 'workloads')
 LOGGING_LEVEL = logging.INFO
 
+# Environment variables used to configure a run without editing the config files (see simulation/sim_run_sweep.py)
+ENV_EXPERIMENT_ID = 'DBA_BANDIT_EXPERIMENT'
+ENV_EXPERIMENT_OVERRIDES = 'DBA_BANDIT_EXPERIMENT_OVERRIDES'
+ENV_DB_CONFIG_OVERRIDES = 'DBA_BANDIT_DB_CONFIG_OVERRIDES'
+
+
+def read_db_config():
+    """
+    Reads db.conf and applies the overrides given as JSON ({section: {key: value}}) in ENV_DB_CONFIG_OVERRIDES
+
+    :return: ConfigParser with the database configurations
+    """
+    db_config = configparser.ConfigParser()
+    if os.path.exists(DB_CONFIG):
+        db_config.read(DB_CONFIG)
+    overrides = os.environ.get(ENV_DB_CONFIG_OVERRIDES)
+    if overrides:
+        db_config.read_dict({section: {key: str(value) for key, value in options.items()}
+                             for section, options in json.loads(overrides).items()})
+    return db_config
+
+
 TABLE_SCAN_TIME_LENGTH = 1000
 
 # ===============================  Database / Workload  ===============================
 SCHEMA_NAME = 'dbo'
 DATASET_NAME = ''
+# application_name of the PostgreSQL connections (application_name in db.conf), their statements are left out of a
+# workload stream (shared/workload_stream.py)
+APPLICATION_NAME = 'dba_bandit'
 
 try:
-    db_config = configparser.ConfigParser()
-    if os.path.exists(DB_CONFIG):
-        db_config.read(DB_CONFIG)
+    db_config = read_db_config()
+    if db_config.has_section('SYSTEM'):
         db_type = db_config.get('SYSTEM', 'db_type', fallback='MSSQL')
         schema_fallback = 'dbo' if db_type.strip().upper() == 'MSSQL' else 'public'
         SCHEMA_NAME = db_config.get(db_type, 'schema', fallback=schema_fallback)
@@ -37,6 +62,11 @@ MAX_PERMUTATION_LENGTH = 2
 SMALL_TABLE_IGNORE = 10000
 TABLE_MIN_SELECTIVITY = 0.2
 PREDICATE_MIN_SELECTIVITY = 0.01
+# Name prefixes of the indexes created for bandit arms (see BanditArm)
+BANDIT_INDEX_PREFIXES = ('IX_', 'IXN_')
+# Threads estimating the selectivities of the new queries of a round, each on its own connection (1 to plan them
+# one by one on the simulator connection), see bandits/query_admission.py
+ADMISSION_WORKERS = 4
 
 # ===============================  Bandit Parameters  ===============================
 ALPHA_REDUCTION_RATE = 1.05
@@ -54,6 +84,26 @@ COST_TYPE_SUB_TREE_COST = 3
 COST_TYPE_CURRENT_EXECUTION = COST_TYPE_ELAPSED_TIME
 COST_TYPE_CURRENT_CREATION = COST_TYPE_ELAPSED_TIME
 
+# ===============================  Measurement Profiles  ===============================
+# analyze: EXPLAIN ANALYZE with per node timing (most accurate node times, highest overhead)
+# rows_only: EXPLAIN ANALYZE with TIMING OFF, node times attributed from the execution time by cost share
+# plain: plain execution timed by wall clock, index usage from a cached plain EXPLAIN, attributed by cost share
+EXECUTION_PROFILE_ANALYZE = 'analyze'
+EXECUTION_PROFILE_ROWS_ONLY = 'rows_only'
+EXECUTION_PROFILE_PLAIN = 'plain'
+EXECUTION_PROFILE = EXECUTION_PROFILE_ANALYZE
+PLAN_CACHE_SIZE = 4096
+# Decode EXPLAIN (FORMAT JSON) output with orjson when it is installed
+FAST_JSON_PLANS = True
+
+# ===============================  Measurement Reuse  ===============================
+# Reuse a query's last runtime and plan usage while the indexes on the tables it reads are unchanged
+MEASUREMENT_CACHE = False
+MEASUREMENT_CACHE_MAX_REUSE = 3
+MEASUREMENT_CACHE_REFRESH_PROBABILITY = 0.1
+# Measurements kept, the least recently used (query, index configuration) is dropped first
+MEASUREMENT_CACHE_SIZE = 4096
+
 # ===============================  Context Related  ===============================
 CONTEXT_UNIQUENESS = 0
 CONTEXT_INCLUDES = False
@@ -75,6 +125,28 @@ MEASURE_MEMORY_COST = "Memory Cost"
 MEASURE_BATCH_TIME = "Batch Time"
 MEASURE_HYP_BATCH_TIME = "Hyp Batch Time"
 
+# Query sampling (sample_queries in exp.conf), the query execution cost is then estimated
+MEASURE_SAMPLED_QUERIES = "Sampled Queries"
+MEASURE_SAMPLED_EXECUTION_COST = "Sampled Query Execution Cost"
+MEASURE_QUERY_EXECUTION_COST_INTERVAL = "Query Execution Cost 95% Interval"
+
+# Passive feedback (passive_feedback in exp.conf), the query execution cost is then the time of the observed calls
+MEASURE_OBSERVED_CALLS = "Observed Query Calls"
+
+# Phases of a round, timed with shared.timing.PhaseTimer (seconds)
+MEASURE_PHASE_QUERY_STORE = "Phase: Query Store Update"
+MEASURE_PHASE_ARM_GENERATION = "Phase: Arm Generation"
+MEASURE_PHASE_CONTEXT = "Phase: Context Building"
+MEASURE_PHASE_UCB_SCORING = "Phase: UCB Scoring"
+MEASURE_PHASE_ORACLE = "Phase: Oracle"
+MEASURE_PHASE_INDEX_DDL = "Phase: Index DDL"
+MEASURE_PHASE_QUERY_EXECUTION = "Phase: Query Execution"
+MEASURE_PHASE_BANDIT_UPDATE = "Phase: Bandit Update"
+MEASURE_PHASE_PREFETCH_WAIT = "Phase: Prefetch Wait"
+PHASE_MEASURES = (MEASURE_PHASE_QUERY_STORE, MEASURE_PHASE_ARM_GENERATION, MEASURE_PHASE_CONTEXT,
+                  MEASURE_PHASE_UCB_SCORING, MEASURE_PHASE_ORACLE, MEASURE_PHASE_INDEX_DDL,
+                  MEASURE_PHASE_QUERY_EXECUTION, MEASURE_PHASE_BANDIT_UPDATE, MEASURE_PHASE_PREFETCH_WAIT)
+
 COMPONENT_MAB = "MAB"
 COMPONENT_TA_OPTIMAL = "TA_OPTIMAL"
 COMPONENT_TA_FULL = "TA_FULL"
@@ -89,22 +161,3 @@ TA_WORKLOAD_TYPE_OPTIMAL = 'optimal'
 TA_WORKLOAD_TYPE_FULL = 'full'
 TA_WORKLOAD_TYPE_CURRENT = 'current'
 TA_WORKLOAD_TYPE_SCHEDULE = 'schedule'
-
-# ===============================  Other  ===============================
-TABLE_SCAN_TIMES = {"SSB": {"customer": [], "dwdate": [], "lineorder": [], "part": [], "supplier": []},
-                    "TPCH": {"LINEITEM": [], "CUSTOMER": [], "NATION": [], "ORDERS": [], "PART": [], "PARTSUPP": [],
-                             "REGION": [], "SUPPLIER": []},
-                    "TPCHSKEW": {"LINEITEM": [], "CUSTOMER": [], "NATION": [], "ORDERS": [], "PART": [], "PARTSUPP": [],
-                                 "REGION": [], "SUPPLIER": []},
-                    "TPCDS": {"call_center": [], "catalog_page": [], "catalog_returns": [], "catalog_sales": [],
-                              "customer": [], "customer_address": [], "customer_demographics": [], "date_dim": [],
-                              "dbgen_version": [], "household_demographics": [], "income_band": [], "inventory": [],
-                              "item": [], "promotion": [], "reason": [], "ship_mode": [], "store": [],
-                              "store_returns": [], "store_sales": [], "time_dim": [], "warehouse": [], "web_page": [],
-                              "web_returns": [], "web_sales": [], "web_site": []},
-                    "IMDB": {"aka_name": [], "aka_title": [], "cast_info": [], "char_name": [],
-                             "comp_cast_type": [], "company_name": [], "company_type": [], "complete_cast": [],
-                              "info_type": [], "keyword": [], "kind_type": [], "link_type": [],
-                              "movie_companies": [], "movie_info": [], "movie_info_idx": [], "movie_keyword": [], "movie_link": [],
-                              "name": [], "person_info": [], "role_type": [], "title": []}
-                    }
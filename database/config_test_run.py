@@ -7,6 +7,7 @@ import constants
 import shared.configs_v2 as configs
 from database import sql_connection
 from database import sql_helper
+from database import workload_compression
 from shared import helper
 
 
@@ -25,6 +26,7 @@ class ConfigRunner:
         next_config_shift = 0
         queries = helper.get_queries_v2()
         connection = sql_connection.get_sql_connection()
+        compressor = workload_compression.WorkloadCompressor.from_configs(configs, connection)
 
         # Query execution
         execution_cost = 0.0
@@ -61,12 +63,13 @@ class ConfigRunner:
                 cost = execution_cost_last_config / constants.UNIFORM_ASSUMPTION_START
                 execution_cost_round += cost
             else:
-                for query in queries[queries_start:queries_end]:
+                for query, weight in workload_compression.get_weighted_queries(compressor,
+                                                                               queries[queries_start:queries_end]):
                     cost, index_seeks, clustered_index_scans = sql_helper.execute_query_v1(connection,
                                                                                            query['query_string'])
                     logging.info(f"Query {query['id']} cost: {cost}")
-                    execution_cost_round += cost
-                    execution_cost_last_config += cost
+                    execution_cost_round += cost * weight
+                    execution_cost_last_config += cost * weight
 
             end_time_round = datetime.datetime.now()
             actual_time_spent_round = end_time_round - start_time_round
@@ -1,4 +1,3 @@
-import configparser
 import datetime
 import logging
 import os
@@ -8,7 +7,7 @@ from importlib import reload
 
 import constants
 import shared.configs_v2 as configs
-from database import sql_connection, sql_helper as sql_helper
+from database import sql_connection, sql_helper as sql_helper, workload_compression
 from shared import helper
 
 
@@ -16,8 +15,7 @@ class DTARunner:
 
     def __init__(self, ta_runs, workload_type='optimal', uniform=False):
         # workload_types: 'full', 'current', 'optimal', 'last_run'
-        db_config = configparser.ConfigParser()
-        db_config.read(constants.DB_CONFIG)
+        db_config = constants.read_db_config()
         db_type = db_config['SYSTEM']['db_type']
         db_section = db_config[db_type]
         self.server = db_section.get('server', '')
@@ -34,6 +32,7 @@ class DTARunner:
 
     def run(self):
         reload(configs)
+        compressor = workload_compression.WorkloadCompressor.from_configs(configs, self.connection)
         # resets the workload file
         workload_file = open(self.workload_file_current, 'w')
         workload_file.close()
@@ -88,15 +87,19 @@ class DTARunner:
                     next_workload_shift += 1
 
             # executing the queries, we will write the queries the workload file after execution, this work as the
-            # workload that we have saw up to now
+            # workload that we have saw up to now. With compression only the representatives are executed, the tuning
+            # adviser still gets every query
+            round_queries = self.queries[queries_start:queries_end]
+            for query, weight in workload_compression.get_weighted_queries(compressor, round_queries):
+                cost, index_seeks, clustered_index_scans = sql_helper.execute_query_v1(self.connection,
+                                                                                       query['query_string'])
+                logging.info(f"Query {query['id']} cost: {cost}")
+                execution_cost_round += cost * weight
             with open(self.workload_file_current, 'a+') as workload_file, \
                     open(self.workload_file_optimal, 'w+') as workload_file_optimal, \
                     open(self.workload_file_last_run, 'a+') as workload_file_last_run:
-                for query in self.queries[queries_start:queries_end]:
+                for query in round_queries:
                     query_string = query['query_string']
-                    cost, index_seeks, clustered_index_scans = sql_helper.execute_query_v1(self.connection, query_string)
-                    logging.info(f"Query {query['id']} cost: {cost}")
-                    execution_cost_round += cost
                     workload_file.write(query_string)
                     workload_file.write('\n\n\n')
                     workload_file_optimal.write(query_string)
@@ -0,0 +1,176 @@
+"""
+Passive feedback for PostgreSQL (passive_feedback in exp.conf): the rewards of a round are derived from the statistics
+of the queries the application runs instead of executing the workload, so the tuner can run alongside live traffic.
+
+After the index changes of a round the statistics views are read, the round lasts passive_round_seconds of traffic and
+the views are read again:
+- pg_stat_statements gives the calls and the execution time of every statement. Statements are matched to the queries
+  of the round by template fingerprint (shared/fingerprint.py, the $n parameters count as literals), statements of
+  other templates are ignored
+- pg_stat_user_indexes gives the scans of every bandit index
+- pg_stat_user_tables gives the sequential scans of every table
+
+The baseline of a template is its worst mean time per call in a round where it used no bandit index and its tables
+were scanned sequentially. The gain of a template is its baseline minus its mean time per call in the round, times its
+calls, split among the bandit indexes scanned in the round whose table and leading column are among its predicates,
+in proportion to their scans. Scans are not attributed to statements by the views, so an index scanned by several
+templates counts for each of them. The execution cost of the round is the time of the matched statements.
+
+Requires the pg_stat_statements extension (shared_preload_libraries = 'pg_stat_statements' and
+CREATE EXTENSION pg_stat_statements).
+"""
+import logging
+import time
+
+import constants
+import database.reward_helper as reward_helper
+import database.sql_helper as sql_helper
+import shared.timing as timing
+from shared import fingerprint
+
+
+def _get_diff(before, after):
+    """
+    :return: dictionary of the increase of each counter of after, a counter that was reset counts from zero
+    """
+    diff = {}
+    for key, value in after.items():
+        increase = value - before.get(key, 0)
+        diff[key] = value if increase < 0 else increase
+    return diff
+
+
+class PgStatFeedback:
+
+    def __init__(self, round_seconds=60.0):
+        """
+        :param round_seconds: seconds of traffic observed per round
+        """
+        self.round_seconds = round_seconds
+        self.baselines = {}             # template fingerprint -> worst mean time per call without bandit index
+        self._fingerprints = {}         # query string -> template fingerprint
+        self._time_column = None
+        # statistics of the last round
+        self.observed_calls = 0
+        self.unmatched_statements = 0
+
+    @classmethod
+    def from_configs(cls, configs):
+        """
+        :param configs: shared.configs_v2 module
+        :return: PgStatFeedback, None when passive_feedback is off
+        """
+        if not configs.passive_feedback:
+            return None
+        return cls(configs.passive_round_seconds)
+
+    def _get_time_column(self, cursor):
+        if self._time_column is None:
+            cursor.execute('''SELECT extversion FROM pg_extension WHERE extname = 'pg_stat_statements';''')
+            if cursor.fetchone() is None:
+                raise RuntimeError('Passive feedback requires the pg_stat_statements extension: add it to '
+                                   'shared_preload_libraries and run CREATE EXTENSION pg_stat_statements')
+            # total_time was split into planning and execution time in PostgreSQL 13
+            cursor.execute('''SELECT column_name FROM information_schema.columns
+                              WHERE table_name = 'pg_stat_statements' AND column_name = 'total_exec_time';''')
+            self._time_column = 'total_exec_time' if cursor.fetchone() else 'total_time'
+        return self._time_column
+
+    def get_snapshot(self, connection):
+        """
+        :param connection: sql connection
+        :return: (statements, index scans, table sequential scans) where statements maps the query id of
+            pg_stat_statements to [query text, calls, total execution time in seconds]
+        """
+        cursor = connection.cursor()
+        time_column = self._get_time_column(cursor)
+        # the views are otherwise read from the snapshot of the first access in the transaction
+        cursor.execute('SELECT pg_stat_clear_snapshot();')
+        cursor.execute(f'''SELECT queryid, query, calls, {time_column} FROM pg_stat_statements
+                           WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                             AND queryid IS NOT NULL;''')
+        statements = {}
+        for query_id, query_text, calls, total_time in cursor.fetchall():
+            # one row per user (and nesting level), summed per statement
+            statement = statements.setdefault(query_id, [query_text, 0, 0.0])
+            statement[1] += calls
+            statement[2] += total_time / 1000
+        cursor.execute('''SELECT indexrelname, idx_scan FROM pg_stat_user_indexes WHERE schemaname = %s;''',
+                       (constants.SCHEMA_NAME,))
+        index_scans = dict(cursor.fetchall())
+        cursor.execute('''SELECT relname, seq_scan FROM pg_stat_user_tables WHERE schemaname = %s;''',
+                       (constants.SCHEMA_NAME,))
+        table_scans = dict(cursor.fetchall())
+        connection.commit()
+        return statements, index_scans, table_scans
+
+    def _fingerprint(self, query_string):
+        if query_string not in self._fingerprints:
+            self._fingerprints[query_string] = fingerprint.fingerprint(query_string)
+        return self._fingerprints[query_string]
+
+    def create_query_drop(self, connection, schema_name, bandit_arm_list, arm_list_to_add, arm_list_to_delete,
+                          queries):
+        """
+        create_query_drop_v3 of the sql helper, observing the traffic instead of executing the queries
+
+        :return: execution time of the observed queries, index creation costs, arm rewards
+            (index name -> [gain, creation cost])
+        """
+        with timing.phase(constants.MEASURE_PHASE_INDEX_DDL):
+            sql_helper.bulk_drop_index(connection, schema_name, arm_list_to_delete)
+            creation_cost = sql_helper.bulk_create_indexes(connection, schema_name, arm_list_to_add)
+        statements_before, index_scans_before, table_scans_before = self.get_snapshot(connection)
+        time.sleep(self.round_seconds)
+        statements_after, index_scans_after, table_scans_after = self.get_snapshot(connection)
+
+        index_scans = _get_diff(index_scans_before, index_scans_after)
+        table_scans = _get_diff(table_scans_before, table_scans_after)
+        # calls and time of the round per template
+        templates = {}
+        self.unmatched_statements = 0
+        round_templates = {self._fingerprint(query.query_string): query for query in queries}
+        for query_id, (query_text, calls, total_time) in statements_after.items():
+            _, calls_before, time_before = statements_before.get(query_id, (None, 0, 0.0))
+            if calls < calls_before:
+                calls_before, time_before = 0, 0.0
+            if calls == calls_before:
+                continue
+            template = self._fingerprint(query_text)
+            if template not in round_templates:
+                self.unmatched_statements += 1
+                continue
+            template_stats = templates.setdefault(template, [0, 0.0])
+            template_stats[0] += calls - calls_before
+            template_stats[1] += total_time - time_before
+
+        execute_cost = 0.0
+        arm_rewards = {}
+        self.observed_calls = 0
+        for template, (calls, total_time) in templates.items():
+            query = round_templates[template]
+            execute_cost += total_time
+            self.observed_calls += calls
+            mean_time = total_time / calls
+            predicates = {table: {column.lower() for column in columns} for table, columns in query.predicates.items()}
+            used_indexes = {index_name: index_scans[index_name] for index_name, bandit_arm in bandit_arm_list.items()
+                            if index_scans.get(index_name, 0) > 0 and bandit_arm.table_name in predicates
+                            and bandit_arm.index_cols[0].lower() in predicates[bandit_arm.table_name]}
+            if not used_indexes:
+                if any(table_scans.get(table, 0) > 0 for table in predicates):
+                    self.baselines[template] = max(self.baselines.get(template, 0.0), mean_time)
+                continue
+            if template not in self.baselines:
+                logging.warning("No table scan baseline for query %s, no gain is attributed", query.id)
+                continue
+            gain = (self.baselines[template] - mean_time) * calls
+            total_scans = sum(used_indexes.values())
+            for index_name, scans in used_indexes.items():
+                arm_rewards.setdefault(index_name, [0, 0])[0] += gain * scans / total_scans
+
+        reward_helper.add_creation_costs(arm_rewards, creation_cost)
+        logging.info(f"Observed {self.observed_calls} calls of {len(templates)} of the {len(round_templates)} "
+                     f"templates of the round, {self.unmatched_statements} other statements")
+        logging.info("Index creation cost: %s", sum(creation_cost.values()))
+        logging.info("Time taken to run the queries: %s", execute_cost)
+        return execute_cost, creation_cost, arm_rewards
@@ -2,6 +2,30 @@ import xml.etree.ElementTree as ET
 
 ns = {'sp': 'http://schemas.microsoft.com/sqlserver/2004/07/showplan'}
 physical_operations = {'Index Seek', 'Index Scan', "Clustered Index Scan", "Clustered Index Seek"}
+non_clustered_operations = {'Index Seek', 'Index Scan'}
+
+_SP = '{' + ns['sp'] + '}'
+_TAG_REL_OP = _SP + 'RelOp'
+_TAG_COUNTERS = _SP + 'RunTimeCountersPerThread'
+_TAG_INDEX_SCAN = _SP + 'IndexScan'
+_TAG_OBJECT = _SP + 'Object'
+_TAG_STMT_SIMPLE = _SP + 'StmtSimple'
+_TAG_QUERY_TIME_STATS = _SP + 'QueryTimeStats'
+_CHUNK_SIZE = 64 * 1024
+
+
+class _RelOpState:
+    """Running totals of a RelOp while its subtree is being parsed"""
+    __slots__ = ('attrib', 'slot', 'rows_read', 'elapsed_ms', 'has_index_scan', 'awaiting_object', 'object_attrib')
+
+    def __init__(self, attrib, slot):
+        self.attrib = attrib
+        self.slot = slot
+        self.rows_read = 0
+        self.elapsed_ms = 0
+        self.has_index_scan = False
+        self.awaiting_object = False
+        self.object_attrib = None
 
 
 class QueryPlan:
@@ -11,63 +35,90 @@ class QueryPlan:
         self.est_statement_sub_tree_cost = 0
         self.elapsed_time = 0
         self.cpu_time = 0
+        self.total_physical_sub_tree_cost = 0
         self.non_clustered_index_usage = []
         self.clustered_index_usage = []
 
-        root = ET.fromstring(xml_string)
-        stmt_simple = root.find('.//sp:StmtSimple', ns)
-        self.estimated_rows = stmt_simple.attrib.get('StatementEstRows')
-        self.est_statement_sub_tree_cost = stmt_simple.attrib.get('StatementSubTreeCost')
-
-        query_stats = root.find('.//sp:QueryTimeStats', ns)
-        if query_stats is not None:
-            self.cpu_time = query_stats.attrib.get('CpuTime')
-            self.elapsed_time = float(query_stats.attrib.get('ElapsedTime')) / 1000
+        # Single pass over the showplan. Runtime counters of a RelOp include the counters of all the RelOps nested
+        # under it, so each RelOp folds its totals into its parent when it closes. Physical operators keep their slot
+        # in document order, the usage tuples are filled in once the whole statement is seen. Attributes are copied
+        # before the elements are cleared, the pure Python Element.clear() empties the attribute dictionary in place.
+        stmt_simple_attrib = None
+        query_time_stats_attrib = None
+        physical_ops = []
+        open_rel_ops = []
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        for chunk_start in range(0, len(xml_string), _CHUNK_SIZE):
+            parser.feed(xml_string[chunk_start:chunk_start + _CHUNK_SIZE])
+            for event, element in parser.read_events():
+                tag = element.tag
+                if event == 'start':
+                    if tag == _TAG_REL_OP:
+                        slot = None
+                        if element.attrib.get('PhysicalOp') in physical_operations:
+                            slot = len(physical_ops)
+                            physical_ops.append(None)
+                        open_rel_ops.append(_RelOpState(dict(element.attrib), slot))
+                    elif tag == _TAG_COUNTERS:
+                        if open_rel_ops:
+                            rel_op = open_rel_ops[-1]
+                            rows_read = element.attrib.get('ActualRowsRead')
+                            if rows_read is not None:
+                                rel_op.rows_read += int(rows_read)
+                            elapsed_ms = element.attrib.get('ActualElapsedms')
+                            if elapsed_ms is not None:
+                                rel_op.elapsed_ms = max(int(elapsed_ms), rel_op.elapsed_ms)
+                    elif tag == _TAG_INDEX_SCAN:
+                        if open_rel_ops and not open_rel_ops[-1].has_index_scan:
+                            open_rel_ops[-1].has_index_scan = True
+                            open_rel_ops[-1].awaiting_object = True
+                    elif tag == _TAG_OBJECT:
+                        if open_rel_ops and open_rel_ops[-1].awaiting_object:
+                            open_rel_ops[-1].awaiting_object = False
+                            open_rel_ops[-1].object_attrib = dict(element.attrib)
+                    elif tag == _TAG_STMT_SIMPLE and stmt_simple_attrib is None:
+                        stmt_simple_attrib = dict(element.attrib)
+                        self.estimated_rows = stmt_simple_attrib.get('StatementEstRows')
+                        self.est_statement_sub_tree_cost = stmt_simple_attrib.get('StatementSubTreeCost')
+                    elif tag == _TAG_QUERY_TIME_STATS and query_time_stats_attrib is None:
+                        query_time_stats_attrib = dict(element.attrib)
+                        self.cpu_time = query_time_stats_attrib.get('CpuTime')
+                        self.elapsed_time = float(query_time_stats_attrib.get('ElapsedTime')) / 1000
+                elif tag == _TAG_REL_OP:
+                    rel_op = open_rel_ops.pop()
+                    if open_rel_ops:
+                        parent = open_rel_ops[-1]
+                        parent.rows_read += rel_op.rows_read
+                        parent.elapsed_ms = max(rel_op.elapsed_ms, parent.elapsed_ms)
+                        if not parent.has_index_scan and rel_op.has_index_scan:
+                            parent.has_index_scan = True
+                            parent.object_attrib = rel_op.object_attrib
+                    if rel_op.slot is not None:
+                        physical_ops[rel_op.slot] = (rel_op.attrib, rel_op.rows_read, rel_op.elapsed_ms,
+                                                     rel_op.object_attrib)
+                    element.clear()
+                elif tag == _TAG_COUNTERS:
+                    element.clear()
+        parser.close()
 
-        rel_ops = root.findall('.//sp:RelOp', ns)
-        total_po_sub_tree_cost = 0
-        total_po_actual = 0
         # Get the sum of sub tree cost for physical operations (assumption: sub tree cost is dominated by the physical
         # operations)
-        for rel_op in rel_ops:
-            temp_act_elapsed_time = 0
-            if rel_op.attrib.get('PhysicalOp') in physical_operations:
-                total_po_sub_tree_cost += float(rel_op.attrib.get('EstimatedTotalSubtreeCost'))
-                runtime_thread_information = rel_op.findall('.//sp:RunTimeCountersPerThread', ns)
-                for thread_info in runtime_thread_information:
-                    temp_act_elapsed_time = max(
-                        int(thread_info.attrib.get('ActualElapsedms')) if thread_info.attrib.get(
-                            'ActualRowsRead') is not None else 0, temp_act_elapsed_time)
-                total_po_actual += temp_act_elapsed_time/1000
+        for attrib, _, _, _ in physical_ops:
+            self.total_physical_sub_tree_cost += float(attrib.get('EstimatedTotalSubtreeCost'))
 
-        # Now for each rel operator we estimate the elapsed time using the sub tree costs
-        for rel_op in rel_ops:
-            rows_read = 0
-            act_rel_op_elapsed_time = 0
-            if rel_op.attrib.get('PhysicalOp') in physical_operations:
-                runtime_thread_information = rel_op.findall('.//sp:RunTimeCountersPerThread', ns)
-                for thread_info in runtime_thread_information:
-                    rows_read += int(thread_info.attrib.get('ActualRowsRead')) if thread_info.attrib.get(
-                        'ActualRowsRead') is not None else 0
-                    act_rel_op_elapsed_time = max(int(thread_info.attrib.get('ActualElapsedms')) if thread_info.attrib.get(
-                        'ActualElapsedms') is not None else 0, act_rel_op_elapsed_time)
-            act_rel_op_elapsed_time = act_rel_op_elapsed_time/1000
-            # act_rel_op_elapsed_time = float(self.elapsed_time) * (act_rel_op_elapsed_time/total_po_actual) if total_po_actual > 0 else 0
-            # We can either use act_rel_op_elapsed_time or po_elapsed_time for the elapsed time
+        # Now for each physical operator we get the usage, cpu time is estimated using the sub tree costs
+        for attrib, rows_read, elapsed_ms, object_attrib in physical_ops:
+            act_rel_op_elapsed_time = elapsed_ms / 1000
             if rows_read == 0:
-                rows_read = float(rel_op.attrib.get('EstimatedRowsRead')) if rel_op.attrib.get('EstimatedRowsRead') else 0
-            rows_output = float(rel_op.attrib.get('EstimateRows'))
-            if rel_op.attrib.get('PhysicalOp') in physical_operations:
-                po_subtree_cost = float(rel_op.attrib.get('EstimatedTotalSubtreeCost'))
-                po_elapsed_time = float(self.elapsed_time) * (po_subtree_cost / total_po_sub_tree_cost)
-                po_cpu_time = float(self.cpu_time) * (
-                        po_subtree_cost / float(self.est_statement_sub_tree_cost))
-                po_index_scan = rel_op.find('.//sp:IndexScan', ns)
-                if rel_op.attrib.get('PhysicalOp') in {'Index Seek', 'Index Scan'}:
-                    po_index = po_index_scan.find('.//sp:Object', ns).attrib.get('Index').strip("[]")
-                    self.non_clustered_index_usage.append(
-                        (po_index, act_rel_op_elapsed_time, po_cpu_time, po_subtree_cost, rows_read, rows_output))
-                elif rel_op.attrib.get('PhysicalOp') in {'Clustered Index Scan', 'Clustered Index Seek'}:
-                    table = po_index_scan.find('.//sp:Object', ns).attrib.get('Table').strip("[]")
-                    self.clustered_index_usage.append(
-                        (table, act_rel_op_elapsed_time, po_cpu_time, po_subtree_cost, rows_read, rows_output))
+                rows_read = float(attrib.get('EstimatedRowsRead')) if attrib.get('EstimatedRowsRead') else 0
+            rows_output = float(attrib.get('EstimateRows'))
+            po_subtree_cost = float(attrib.get('EstimatedTotalSubtreeCost'))
+            po_cpu_time = float(self.cpu_time) * (po_subtree_cost / float(self.est_statement_sub_tree_cost))
+            if attrib.get('PhysicalOp') in non_clustered_operations:
+                po_index = object_attrib.get('Index').strip("[]")
+                self.non_clustered_index_usage.append(
+                    (po_index, act_rel_op_elapsed_time, po_cpu_time, po_subtree_cost, rows_read, rows_output))
+            else:
+                table = object_attrib.get('Table').strip("[]")
+                self.clustered_index_usage.append(
+                    (table, act_rel_op_elapsed_time, po_cpu_time, po_subtree_cost, rows_read, rows_output))
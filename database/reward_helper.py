@@ -0,0 +1,159 @@
+"""Reward attribution shared by the database helpers that execute (or replay) queries with real plans."""
+import logging
+
+import numpy
+
+import constants
+
+
+class RoundRewards:
+    """
+    Collects the bandit index usage of the queries of a round in columnar arrays, the gains are computed for all the
+    usages in one pass by add_to.
+
+    The gain of an index for a query is the worst table scan time seen for the query (or for any query, when the query
+    has no history) minus the index scan time, minus the table scan time of the query on the same table, split among
+    the bandit indexes the query used on that table.
+    """
+
+    def __init__(self, bandit_arm_list, table_scan_times):
+        """
+        :param bandit_arm_list: bandit arms that are materialised in this round
+        :param table_scan_times: ScanHistory shared by all queries of the helper, updated in place
+        """
+        self.bandit_arm_list = bandit_arm_list
+        self.table_scan_times = table_scan_times
+        self.index_names = []
+        self._index_positions = {}
+        self._table_positions = {}
+        # one entry per usage of a bandit index
+        self._index_ids = []
+        self._group_ids = []            # (query, table) the usage belongs to
+        self._index_times = []
+        self._baselines = []            # worst table scan time, nan without history
+        self._clustered_times = []      # table scan time of the query on the table, 0 without scan
+        self._query_count = 0
+
+    def add_query(self, query, non_clustered_index_usage, clustered_index_usage, update_history=True):
+        """
+        Updates the scan time histories with the usage of one query and records its bandit index usage
+
+        :param query: query object that was executed
+        :param non_clustered_index_usage: merged index usage of the query (name, elapsed, cpu, sub tree cost, ...)
+        :param clustered_index_usage: merged table scan usage of the query
+        :param update_history: False for a reused measurement, its times are already in the histories
+        """
+        query_position = self._query_count
+        self._query_count += 1
+        current_clustered_index_scans = {}
+        if clustered_index_usage:
+            for index_scan in clustered_index_usage:
+                table_name = index_scan[0]
+                current_clustered_index_scans[table_name] = index_scan[constants.COST_TYPE_CURRENT_EXECUTION]
+                if not update_history:
+                    continue
+                if query.table_scan_times.size(table_name) < constants.TABLE_SCAN_TIME_LENGTH:
+                    query.table_scan_times[table_name].append(index_scan[constants.COST_TYPE_CURRENT_EXECUTION])
+                if self.table_scan_times.size(table_name) < constants.TABLE_SCAN_TIME_LENGTH:
+                    self.table_scan_times[table_name].append(index_scan[constants.COST_TYPE_CURRENT_EXECUTION])
+
+        if not non_clustered_index_usage:
+            return
+        for index_use in non_clustered_index_usage:
+            index_name = index_use[0]
+            # Only process indexes that are managed by the bandit algorithm
+            if index_name not in self.bandit_arm_list:
+                logging.debug("Skipping index not in bandit_arm_list: %s", index_name)
+                continue
+            table_name = self.bandit_arm_list[index_name].table_name
+            index_time = index_use[constants.COST_TYPE_CURRENT_EXECUTION]
+            if update_history and query.table_scan_times.size(table_name) < constants.TABLE_SCAN_TIME_LENGTH:
+                query.index_scan_times[table_name].append(index_time)
+
+            baseline = query.table_scan_times.max(table_name)
+            if baseline is None:
+                baseline = self.table_scan_times.max(table_name)
+            if baseline is None:
+                # No table scan history available, this happens when the index is used from the very first query
+                logging.warning("No table scan history for query %s, table %s. Using index time as baseline.",
+                                query.id, table_name)
+
+            if index_name not in self._index_positions:
+                self._index_positions[index_name] = len(self.index_names)
+                self.index_names.append(index_name)
+            if table_name not in self._table_positions:
+                self._table_positions[table_name] = len(self._table_positions)
+            self._index_ids.append(self._index_positions[index_name])
+            self._group_ids.append((query_position, self._table_positions[table_name]))
+            self._index_times.append(index_time)
+            self._baselines.append(numpy.nan if baseline is None else baseline)
+            self._clustered_times.append(current_clustered_index_scans.get(table_name, 0))
+
+    def get_gains(self):
+        """
+        :return: array of the gains of the round, aligned with index_names
+        """
+        if not self._index_ids:
+            return numpy.zeros(0)
+        # number of bandit indexes each query used on the table of the usage
+        _, group_inverse, group_counts = numpy.unique(numpy.array(self._group_ids), axis=0, return_inverse=True,
+                                                      return_counts=True)
+        table_counts = group_counts[group_inverse.reshape(-1)]
+        baselines = numpy.array(self._baselines)
+        gains = numpy.where(numpy.isnan(baselines), 0.0, baselines - numpy.array(self._index_times)) / table_counts
+        gains -= numpy.array(self._clustered_times) / table_counts
+        return numpy.bincount(numpy.array(self._index_ids), weights=gains, minlength=len(self.index_names))
+
+    def add_to(self, arm_rewards):
+        """
+        :param arm_rewards: dictionary of index name -> [gain, creation cost], updated in place
+        """
+        for index_name, gain in zip(self.index_names, self.get_gains().tolist()):
+            if index_name not in arm_rewards:
+                arm_rewards[index_name] = [gain, 0]
+            else:
+                arm_rewards[index_name][0] += gain
+
+
+def add_query_rewards(query, non_clustered_index_usage, clustered_index_usage, bandit_arm_list, table_scan_times,
+                      arm_rewards):
+    """
+    Reward attribution for a single query, see RoundRewards
+
+    :param query: query object that was executed
+    :param non_clustered_index_usage: merged index usage of the query (name, elapsed, cpu, sub tree cost, ...)
+    :param clustered_index_usage: merged table scan usage of the query
+    :param bandit_arm_list: bandit arms that are materialised in this round
+    :param table_scan_times: ScanHistory shared by all queries of the helper
+    :param arm_rewards: dictionary of index name -> [gain, creation cost], updated in place
+    """
+    round_rewards = RoundRewards(bandit_arm_list, table_scan_times)
+    round_rewards.add_query(query, non_clustered_index_usage, clustered_index_usage)
+    round_rewards.add_to(arm_rewards)
+
+
+def add_creation_costs(arm_rewards, creation_cost):
+    """
+    Adds the index creation cost (negative reward) of this round to arm_rewards
+
+    :param arm_rewards: dictionary of index name -> [gain, creation cost], updated in place
+    :param creation_cost: dictionary of index name -> creation time
+    """
+    for key in creation_cost:
+        if key in arm_rewards:
+            arm_rewards[key][1] += -1 * creation_cost[key]
+        else:
+            arm_rewards[key] = [0, -1 * creation_cost[key]]
+
+
+def get_reward_array(arm_rewards, bandit_arms):
+    """
+    :param arm_rewards: dictionary of index name -> [gain, creation cost]
+    :param bandit_arms: arms of the bandit, in the order of the bandit arm ids
+    :return: array of shape (number of arms, 2) with the gain and the creation cost of each arm id
+    """
+    rewards = numpy.zeros((len(bandit_arms), 2))
+    for arm_id, bandit_arm in enumerate(bandit_arms):
+        if bandit_arm.index_name in arm_rewards:
+            rewards[arm_id] = arm_rewards[bandit_arm.index_name]
+    return rewards
@@ -0,0 +1,116 @@
+"""
+Scan time histories of the tables, the baselines of the index rewards.
+
+A ScanHistory maps a table name to a TableScanHistory that is created by the first append, so a query only allocates
+for the tables it scans. A TableScanHistory keeps the times in a float array used as a ring buffer of
+constants.TABLE_SCAN_TIME_LENGTH entries (grown on demand) and keeps running count, mean and max, so the rewards do
+not rescan the history.
+"""
+import numpy
+
+import constants
+
+# Initial size of the array of a table history, doubled until it reaches the capacity
+INITIAL_CAPACITY = 8
+
+
+class TableScanHistory:
+    """Scan times of one table, the running statistics cover every value appended, including overwritten ones"""
+    __slots__ = ('capacity', 'count', 'total', 'maximum', '_values', '_start', '_length')
+
+    def __init__(self, capacity=constants.TABLE_SCAN_TIME_LENGTH):
+        """
+        :param capacity: number of values kept, the oldest value is overwritten once the history is full
+        """
+        self.capacity = capacity
+        self.count = 0
+        self.total = 0.0
+        self.maximum = None
+        self._values = numpy.empty(min(INITIAL_CAPACITY, capacity))
+        self._start = 0             # position of the oldest value once the buffer wrapped around
+        self._length = 0
+
+    def append(self, value):
+        value = float(value)
+        if self._length < self.capacity:
+            if self._length == len(self._values):
+                grown = numpy.empty(min(2 * len(self._values), self.capacity))
+                grown[:self._length] = self._values
+                self._values = grown
+            self._values[self._length] = value
+            self._length += 1
+        else:
+            self._values[self._start] = value
+            self._start = (self._start + 1) % self.capacity
+        self.count += 1
+        self.total += value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def mean(self):
+        """
+        :return: mean of all the values appended, None when empty
+        """
+        return self.total / self.count if self.count else None
+
+    def values(self):
+        """
+        :return: array of the values kept, oldest first
+        """
+        return numpy.concatenate((self._values[self._start:self._length], self._values[:self._start]))
+
+    def recent(self, window):
+        """
+        :param window: number of values
+        :return: array of the last window values
+        """
+        return self.values()[-window:] if window > 0 else numpy.empty(0)
+
+    def recent_mean(self, window):
+        recent = self.recent(window)
+        return float(recent.mean()) if len(recent) else None
+
+    def recent_max(self, window):
+        recent = self.recent(window)
+        return float(recent.max()) if len(recent) else None
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return iter(self.values().tolist())
+
+    def __repr__(self):
+        return f"TableScanHistory(count={self.count}, mean={self.mean()}, max={self.maximum})"
+
+
+class ScanHistory(dict):
+    """
+    Dictionary of table name -> TableScanHistory. Indexing a table creates its history, the size, max and mean
+    lookups do not.
+    """
+
+    def __missing__(self, table_name):
+        history = self[table_name] = TableScanHistory()
+        return history
+
+    def size(self, table_name):
+        """
+        :return: number of scan times kept for the table
+        """
+        history = self.get(table_name)
+        return len(history) if history is not None else 0
+
+    def max(self, table_name):
+        """
+        :return: worst scan time of the table, None without history
+        """
+        history = self.get(table_name)
+        return history.maximum if history is not None else None
+
+    def mean(self, table_name):
+        """
+        :return: mean scan time of the table, None without history
+        """
+        history = self.get(table_name)
+        return history.mean() if history is not None else None
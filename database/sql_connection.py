@@ -1,4 +1,5 @@
-import configparser
+import os
+import sqlite3
 
 try:
     import pyodbc  # type: ignore
@@ -11,6 +12,7 @@ except ImportError as exc:  # pragma: no cover - must be installed for PostgreSQ
     psycopg2 = None
 
 import constants
+from database import sql_trace
 
 
 def get_sql_connection():
@@ -21,10 +23,25 @@ def get_sql_connection():
     """
 
     # Reading the Database configurations
-    db_config = configparser.ConfigParser()
-    db_config.read(constants.DB_CONFIG)
+    db_config = constants.read_db_config()
     db_type = db_config.get('SYSTEM', 'db_type')
 
+    if db_type.strip().upper() == 'SQLITE':
+        database_file = db_config[db_type].get('database')
+        if not os.path.isabs(database_file):
+            database_file = os.path.join(constants.ROOT_DIR, database_file)
+        if not os.path.exists(database_file):
+            raise FileNotFoundError(f"SQLite database {database_file} not found, see scripts/generate_sqlite_dataset.py")
+        # autocommit, every statement is its own transaction like the other connections
+        return sqlite3.connect(database_file, isolation_level=None, check_same_thread=False)
+
+    if db_type.strip().upper() == 'SYNTHETIC':
+        from database.sql_helper_synthetic import SyntheticConnection
+        return SyntheticConnection()
+
+    if db_type.strip().upper() == 'REPLAY':
+        return sql_trace.ReplayConnection(db_config[db_type].get('trace'))
+
     if db_type.strip().upper() in {'POSTGRES', 'POSTGRESQL'}:
         if psycopg2 is None:
             raise ImportError("psycopg2 is required to connect to PostgreSQL databases.")
@@ -35,6 +52,7 @@ def get_sql_connection():
             'dbname': pg_config.get('database'),
             'user': pg_config.get('user'),
             'password': pg_config.get('password'),
+            'application_name': pg_config.get('application_name', fallback=constants.APPLICATION_NAME),
         }
         options = pg_config.get('options', fallback=None)
         if options:
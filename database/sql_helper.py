@@ -1,32 +1,61 @@
 """Database helper facade that dispatches to the engine specific implementation."""
-import configparser
 import importlib
 import os
 from types import ModuleType
 from typing import Dict
 
 import constants
+from database import sql_trace
+
+_CONFIG = constants.read_db_config()
+
+_helper_module = None
 
-_CONFIG = configparser.ConfigParser()
-if os.path.exists(constants.DB_CONFIG):
-    _CONFIG.read(constants.DB_CONFIG)
 
 def _load_helper() -> ModuleType:
+    global _helper_module
+    if _helper_module is not None:
+        return _helper_module
     db_type = _CONFIG.get('SYSTEM', 'db_type', fallback='MSSQL').strip().upper()
     module_name = 'database.sql_helper_v2'
     if db_type in {'POSTGRES', 'POSTGRESQL'}:
         module_name = 'database.sql_helper_postgres'
-    # Always reload to get latest code
+    elif db_type == 'SQLITE':
+        module_name = 'database.sql_helper_sqlite'
+    elif db_type == 'SYNTHETIC':
+        module_name = 'database.sql_helper_synthetic'
+    elif db_type == 'REPLAY':
+        module_name = 'database.sql_helper_replay'
+    trace_path = _CONFIG.get('SYSTEM', 'record_trace', fallback='').strip()
+    if trace_path and db_type != 'REPLAY':
+        if not os.path.isabs(trace_path):
+            trace_path = os.path.join(constants.ROOT_DIR, trace_path)
+        sql_trace.start_recording(trace_path)
+    # Reload on first use so a new simulator starts with fresh helper state (caches, scan histories)
     if module_name in importlib.sys.modules:
         module = importlib.reload(importlib.sys.modules[module_name])
     else:
         module = importlib.import_module(module_name)
+    _helper_module = module
     return module
 
+
+def reload_helper() -> ModuleType:
+    """
+    Reload the implementation module, dropping its module level state. The helper is otherwise loaded once, so
+    caches such as the table metadata and the measurement cache survive across rounds.
+    """
+    global _helper_module
+    _helper_module = None
+    return _load_helper()
+
+
 def __getattr__(name):
     """Dynamically forward attribute access to the implementation module."""
     _impl = _load_helper()
     if hasattr(_impl, name):
+        if sql_trace.is_recording() and name in sql_trace.RECORDED_FUNCTIONS:
+            return sql_trace.recorded(name, getattr(_impl, name))
         return getattr(_impl, name)
     raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
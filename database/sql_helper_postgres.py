@@ -1,40 +1,56 @@
-import configparser
-import copy
 import datetime
 import logging
+import random
 import time
-from collections import defaultdict
-from typing import Dict, List, Tuple
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Set, Tuple
 
 import psycopg2
+import psycopg2.extras
 from psycopg2 import sql
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - optional faster JSON decoding for EXPLAIN output
+    orjson = None
+
 import constants
+from database import reward_helper, scan_history, sql_trace
 from database.column import Column
 from database.table import Table
+from shared import timing
 
 # -------------------------------------------------------------------------------------------------
 # Configuration
 # -------------------------------------------------------------------------------------------------
 
-db_config = configparser.ConfigParser()
-db_config.read(constants.DB_CONFIG)
+db_config = constants.read_db_config()
 db_type = db_config.get('SYSTEM', 'db_type', fallback='POSTGRESQL')
 _db_section = db_config[db_type]
 database = _db_section.get('database', '')
 dataset_name = constants.DATASET_NAME or database.upper()
 
-_table_scan_template_key = dataset_name.upper()
-if _table_scan_template_key not in constants.TABLE_SCAN_TIMES:
-    logging.warning("Dataset '%s' not found in TABLE_SCAN_TIMES constants; using empty template.",
-                    _table_scan_template_key)
-    constants.TABLE_SCAN_TIMES[_table_scan_template_key] = defaultdict(list)
+table_scan_times_hyp = scan_history.ScanHistory()
+table_scan_times = scan_history.ScanHistory()
 
-table_scan_times_hyp = copy.deepcopy(constants.TABLE_SCAN_TIMES[_table_scan_template_key])
-table_scan_times = copy.deepcopy(constants.TABLE_SCAN_TIMES[_table_scan_template_key])
+# the selectivities of new queries can be estimated on several connections at once (bandits/query_admission.py)
+CONCURRENT_PLANNING = True
 
 _tables_global: Dict[str, Table] = {}
 _pk_columns_dict: Dict[str, List[str]] = {}
+# (schema, table) -> row count, the tables are not modified during a run
+_row_counts: Dict[Tuple[str, str], int] = {}
+
+# (query id, indexes on the query's tables) -> last measurement, see execute_query_cached. Both are least recently
+# used caches of MEASUREMENT_CACHE_SIZE entries
+_measurement_cache: Dict[Tuple, Dict] = OrderedDict()
+_query_tables: Dict[int, Set[str]] = OrderedDict()
+
+# Plain EXPLAIN plans used by the 'plain' execution profile, keyed by (query, index configuration), the least
+# recently used plan is dropped when PLAN_CACHE_SIZE plans are cached
+_plan_cache: Dict[Tuple, Dict] = OrderedDict()
+_materialised_indexes: Set[str] = set()
+_ddl_generation = 0
 
 
 # -------------------------------------------------------------------------------------------------
@@ -46,28 +62,74 @@ def _qualname(schema: str, name: str) -> str:
     return f"{schema}.{name}"
 
 
-def _collect_plan_usage(plan_node: Dict, non_clustered_usage: List[Tuple], clustered_usage: List[Tuple]):
-    node_type = plan_node.get('Node Type', '')
-    relation = plan_node.get('Relation Name') or plan_node.get('Alias')
-    actual_time = float(plan_node.get('Actual Total Time', 0.0)) / 1000.0
-    plan_rows = float(plan_node.get('Plan Rows', 0.0))
-    actual_rows = float(plan_node.get('Actual Rows', plan_rows))
-    total_cost = float(plan_node.get('Total Cost', 0.0))
+_INDEX_SCAN_NODES = frozenset({'Index Scan', 'Index Only Scan', 'Bitmap Index Scan'})
+_TABLE_SCAN_NODES = frozenset({'Seq Scan', 'Bitmap Heap Scan', 'Tid Scan'})
+
+
+def _collect_plan_usage(plan_root: Dict, relations: Set[str] = None, time_per_cost: float = None):
+    """
+    Walks the plan tree iteratively and sums up the usage of each index and each table scan in a single pass
+
+    :param plan_root: root plan node (the 'Plan' entry of the EXPLAIN output)
+    :param relations: if given, every relation referenced in the plan is added to this set
+    :param time_per_cost: seconds per plan cost unit, used when the nodes don't carry actual times
+    :return: non clustered index usage, clustered index usage. Lists of tuples
+        (name, elapsed time, cpu time, sub tree cost, rows read, rows output) with one entry per name
+    """
+    index_usage: Dict[str, List[float]] = {}
+    table_usage: Dict[str, List[float]] = {}
+    stack = [plan_root]
+    while stack:
+        plan_node = stack.pop()
+        children = plan_node.get('Plans')
+        if children:
+            # reversed, so that nodes are visited in pre-order like the recursive walk
+            stack.extend(reversed(children))
+
+        relation_name = plan_node.get('Relation Name')
+        if relations is not None and relation_name:
+            relations.add(relation_name)
+        node_type = plan_node.get('Node Type')
+        if node_type in _INDEX_SCAN_NODES:
+            usage_name = plan_node.get('Index Name')
+            accumulators = index_usage
+        elif node_type in _TABLE_SCAN_NODES:
+            usage_name = relation_name or plan_node.get('Alias')
+            accumulators = table_usage
+        else:
+            continue
+        if not usage_name:
+            continue
+
+        plan_rows = float(plan_node.get('Plan Rows', 0.0))
+        actual_rows = float(plan_node.get('Actual Rows', plan_rows))
+        total_cost = float(plan_node.get('Total Cost', 0.0))
+        if time_per_cost is None:
+            actual_time = float(plan_node.get('Actual Total Time', 0.0)) / 1000.0
+        else:
+            # No per node timing, attribute the statement time by the share of the plan cost
+            actual_time = total_cost * time_per_cost
+
+        accumulator = accumulators.get(usage_name)
+        if accumulator is None:
+            accumulators[usage_name] = [actual_time, actual_time, total_cost, actual_rows, plan_rows]
+        else:
+            accumulator[0] += actual_time
+            accumulator[1] += actual_time
+            accumulator[2] += total_cost
+            accumulator[3] += actual_rows
+            accumulator[4] += plan_rows
+
+    return ([(name, *accumulator) for name, accumulator in index_usage.items()],
+            [(name, *accumulator) for name, accumulator in table_usage.items()])
 
-    if node_type in {'Index Scan', 'Index Only Scan'}:
-        index_name = plan_node.get('Index Name')
-        if index_name:
-            non_clustered_usage.append((index_name, actual_time, actual_time, total_cost, actual_rows, plan_rows))
-    elif node_type in {'Bitmap Index Scan'}:
-        index_name = plan_node.get('Index Name')
-        if index_name:
-            non_clustered_usage.append((index_name, actual_time, actual_time, total_cost, actual_rows, plan_rows))
-    elif node_type in {'Seq Scan', 'Bitmap Heap Scan', 'Tid Scan'}:
-        if relation:
-            clustered_usage.append((relation, actual_time, actual_time, total_cost, actual_rows, plan_rows))
 
-    for child in plan_node.get('Plans', []) or []:
-        _collect_plan_usage(child, non_clustered_usage, clustered_usage)
+def _plan_cursor(connection):
+    """Cursor that decodes EXPLAIN (FORMAT JSON) output with orjson when FAST_JSON_PLANS is set and it's available"""
+    cursor = connection.cursor()
+    if constants.FAST_JSON_PLANS and orjson is not None:
+        psycopg2.extras.register_default_json(cursor, loads=orjson.loads)
+    return cursor
 
 
 def merge_index_use(index_uses):
@@ -79,6 +141,13 @@ def merge_index_use(index_uses):
     return [tuple([x] + y) for x, y in d.items()]
 
 
+def _invalidate_plan_cache():
+    """Called for DDL that is not tracked by name, plans cached before it can no longer be trusted."""
+    global _ddl_generation
+    _ddl_generation += 1
+    _plan_cache.clear()
+
+
 def get_selectivity_list(query_obj_list):
     selectivity_list = []
     for query_obj in query_obj_list:
@@ -112,6 +181,7 @@ def create_index_v1(connection, schema_name, tbl_name, col_names, idx_name, incl
         cursor.execute(statement)
         connection.commit()
         elapsed = time.perf_counter() - start
+        _materialised_indexes.add(idx_name)
         logging.info("Added index %s on %s(%s)", idx_name, tbl_name, ', '.join(col_names))
         return elapsed
     except psycopg2.errors.ProgramLimitExceeded as e:
@@ -128,6 +198,7 @@ def create_index_v1(connection, schema_name, tbl_name, col_names, idx_name, incl
 
 
 def create_index_v2(connection, query):
+    _invalidate_plan_cache()
     start = time.perf_counter()
     cursor = connection.cursor()
     cursor.execute(query)
@@ -165,6 +236,7 @@ def drop_index(connection, schema_name, tbl_name, idx_name):
     cursor = connection.cursor()
     cursor.execute(statement)
     connection.commit()
+    _materialised_indexes.discard(idx_name)
     logging.info("Removed index %s", idx_name)
 
 
@@ -174,6 +246,7 @@ def bulk_drop_index(connection, schema_name, bandit_arm_list):
 
 
 def simple_execute(connection, query):
+    _invalidate_plan_cache()
     cursor = connection.cursor()
     cursor.execute(query)
     connection.commit()
@@ -184,101 +257,157 @@ def simple_execute(connection, query):
 # -------------------------------------------------------------------------------------------------
 
 
-def execute_query_v1(connection, query):
+def _get_plain_plan(connection, cleaned_query):
+    key = (cleaned_query, frozenset(_materialised_indexes), _ddl_generation)
+    plan_root = _plan_cache.get(key)
+    if plan_root is not None:
+        _plan_cache.move_to_end(key)
+    else:
+        cursor = _plan_cursor(connection)
+        try:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {cleaned_query}")
+            plan_result = cursor.fetchone()
+        finally:
+            cursor.close()
+        plan_root = plan_result[0][0] if plan_result else {}
+        _plan_cache[key] = plan_root
+        if len(_plan_cache) > constants.PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return plan_root
+
+
+def _run_measurement(connection, cleaned_query):
+    """
+    Runs the query under the configured EXECUTION_PROFILE
+
+    :return: execution time in seconds, plan root, seconds per plan cost unit (None when nodes carry actual times)
+    """
+    profile = constants.EXECUTION_PROFILE
+    cursor = _plan_cursor(connection)
+    try:
+        cursor.execute('DISCARD ALL;')
+        if profile == constants.EXECUTION_PROFILE_PLAIN:
+            start = time.perf_counter()
+            cursor.execute(cleaned_query)
+            if cursor.description is not None:
+                cursor.fetchall()
+            total_time_sec = time.perf_counter() - start
+            plan_root = _get_plain_plan(connection, cleaned_query)
+        else:
+            if profile == constants.EXECUTION_PROFILE_ROWS_ONLY:
+                explain_query = f"EXPLAIN (ANALYZE, TIMING OFF, FORMAT JSON) {cleaned_query}"
+            else:
+                explain_query = f"EXPLAIN (ANALYZE, FORMAT JSON) {cleaned_query}"
+            cursor.execute(explain_query)
+            plan_result = cursor.fetchone()
+            if not plan_result:
+                return 0, None, None
+            plan_root = plan_result[0][0]
+            total_time_sec = float(plan_root.get('Execution Time', 0.0)) / 1000.0
+    finally:
+        cursor.close()
+
+    time_per_cost = None
+    if profile != constants.EXECUTION_PROFILE_ANALYZE:
+        root_cost = float(plan_root.get('Plan', {}).get('Total Cost', 0.0))
+        time_per_cost = total_time_sec / root_cost if root_cost > 0 else 0.0
+    return total_time_sec, plan_root, time_per_cost
+
+
+def _execute_query_plan(connection, query):
     cleaned_query = query.strip().rstrip(';')
-    cursor = connection.cursor()
-    cursor.execute('DISCARD ALL;')
-    explain_query = f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {cleaned_query}"
     try:
-        cursor.execute(explain_query)
-        plan_result = cursor.fetchone()
+        total_time_sec, plan_root, time_per_cost = _run_measurement(connection, cleaned_query)
     except Exception:
         logging.exception("Exception when executing query: %s", cleaned_query)
-        return 0, [], []
-    finally:
-        cursor.close()
+        return 0, [], [], set()
 
-    if not plan_result:
-        return 0, [], []
+    if not plan_root:
+        return 0, [], [], set()
 
-    plan_root = plan_result[0][0]
-    total_time_sec = float(plan_root.get('Execution Time', 0.0)) / 1000.0
-    non_clustered_usage: List[Tuple] = []
-    clustered_usage: List[Tuple] = []
-    _collect_plan_usage(plan_root.get('Plan', {}), non_clustered_usage, clustered_usage)
-    return total_time_sec, non_clustered_usage, clustered_usage
+    relations: Set[str] = set()
+    non_clustered_usage, clustered_usage = _collect_plan_usage(plan_root.get('Plan', {}), relations, time_per_cost)
+    return total_time_sec, non_clustered_usage, clustered_usage, relations
+
+
+def execute_query_v1(connection, query):
+    time_taken, non_clustered_usage, clustered_usage, _ = _execute_query_plan(connection, query)
+    return time_taken, non_clustered_usage, clustered_usage
+
+
+def _index_fingerprint(tables, bandit_arm_list):
+    return frozenset(index_name for index_name, bandit_arm in bandit_arm_list.items()
+                     if bandit_arm.table_name in tables)
+
+
+def _cache_put(cache, key, value):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > constants.MEASUREMENT_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def execute_query_cached(connection, query, bandit_arm_list):
+    """
+    Execute the query, or reuse its last measurement when none of the indexes on the tables it reads changed since.
+    A measurement is reused at most MEASUREMENT_CACHE_MAX_REUSE times, and with probability
+    MEASUREMENT_CACHE_REFRESH_PROBABILITY the query is re-measured anyway to keep track of runtime variance.
+
+    :param connection: sql_connection
+    :param query: query object
+    :param bandit_arm_list: bandit indexes that are materialised in this round
+    :return: time taken, non clustered index usage, clustered index usage (same as execute_query_v1), and whether
+        the measurement was reused. A reused measurement must not be added to the scan time histories again
+    """
+    tables = _query_tables.get(query.id)
+    if constants.MEASUREMENT_CACHE and tables is not None:
+        _query_tables.move_to_end(query.id)
+        key = (query.id, _index_fingerprint(tables, bandit_arm_list))
+        entry = _measurement_cache.get(key)
+        if (entry is not None and entry['query_string'] == query.query_string
+                and entry['reuses'] < constants.MEASUREMENT_CACHE_MAX_REUSE
+                and random.random() >= constants.MEASUREMENT_CACHE_REFRESH_PROBABILITY):
+            entry['reuses'] += 1
+            _measurement_cache.move_to_end(key)
+            logging.info("Query %s reusing measurement (%s/%s)", query.id, entry['reuses'],
+                         constants.MEASUREMENT_CACHE_MAX_REUSE)
+            return entry['sample'] + (True,)
+
+    time_taken, non_clustered_usage, clustered_usage, relations = _execute_query_plan(connection, query.query_string)
+    sql_trace.record_execution(query, bandit_arm_list, time_taken, non_clustered_usage, clustered_usage)
+    if constants.MEASUREMENT_CACHE and time_taken > 0:
+        tables = set(query.predicates) | set(query.payload) | relations
+        _cache_put(_query_tables, query.id, tables)
+        _cache_put(_measurement_cache, (query.id, _index_fingerprint(tables, bandit_arm_list)), {
+            'query_string': query.query_string,
+            'sample': (time_taken, non_clustered_usage, clustered_usage),
+            'reuses': 0
+        })
+    return time_taken, non_clustered_usage, clustered_usage, False
 
 
 def create_query_drop_v3(connection, schema_name, bandit_arm_list, arm_list_to_add, arm_list_to_delete, queries):
-    bulk_drop_index(connection, schema_name, arm_list_to_delete)
-    creation_cost = bulk_create_indexes(connection, schema_name, arm_list_to_add)
+    with timing.phase(constants.MEASURE_PHASE_INDEX_DDL):
+        bulk_drop_index(connection, schema_name, arm_list_to_delete)
+        creation_cost = bulk_create_indexes(connection, schema_name, arm_list_to_add)
+    sql_trace.record_creation_costs(creation_cost, arm_list_to_add)
     execute_cost = 0
     arm_rewards = {}
+    round_rewards = reward_helper.RoundRewards(bandit_arm_list, table_scan_times)
     if not _tables_global:
         get_tables(connection)
 
     for query in queries:
-        time_taken, non_clustered_index_usage, clustered_index_usage = execute_query_v1(connection,
-                                                                                         query.query_string)
-        non_clustered_index_usage = merge_index_use(non_clustered_index_usage)
-        clustered_index_usage = merge_index_use(clustered_index_usage)
+        with timing.phase(constants.MEASURE_PHASE_QUERY_EXECUTION):
+            time_taken, non_clustered_index_usage, clustered_index_usage, reused = execute_query_cached(
+                connection, query, bandit_arm_list)
         execute_cost += time_taken
         logging.info("Query %s cost: %s", query.id, time_taken)
 
-        current_clustered_index_scans = {}
-        if clustered_index_usage:
-            for index_scan in clustered_index_usage:
-                table_name = index_scan[0]
-                current_clustered_index_scans[table_name] = index_scan[constants.COST_TYPE_CURRENT_EXECUTION]
-                if len(query.table_scan_times[table_name]) < constants.TABLE_SCAN_TIME_LENGTH:
-                    query.table_scan_times[table_name].append(index_scan[constants.COST_TYPE_CURRENT_EXECUTION])
-                if len(table_scan_times[table_name]) < constants.TABLE_SCAN_TIME_LENGTH:
-                    table_scan_times[table_name].append(index_scan[constants.COST_TYPE_CURRENT_EXECUTION])
-
-        if non_clustered_index_usage:
-            table_counts = {}
-            for index_use in non_clustered_index_usage:
-                index_name = index_use[0]
-                # Only process indexes that are managed by the bandit algorithm
-                if index_name not in bandit_arm_list:
-                    logging.debug("Skipping index not in bandit_arm_list: %s", index_name)
-                    continue
-                table_name = bandit_arm_list[index_name].table_name
-                table_counts[table_name] = table_counts.get(table_name, 0) + 1
-
-            for index_use in non_clustered_index_usage:
-                index_name = index_use[0]
-                # Only process indexes that are managed by the bandit algorithm
-                if index_name not in bandit_arm_list:
-                    continue
-                table_name = bandit_arm_list[index_name].table_name
-                if len(query.table_scan_times[table_name]) < constants.TABLE_SCAN_TIME_LENGTH:
-                    query.index_scan_times[table_name].append(index_use[constants.COST_TYPE_CURRENT_EXECUTION])
-                table_scan_time = query.table_scan_times[table_name]
-                if len(table_scan_time) > 0:
-                    temp_reward = max(table_scan_time) - index_use[constants.COST_TYPE_CURRENT_EXECUTION]
-                    temp_reward = temp_reward / table_counts[table_name]
-                elif len(table_scan_times[table_name]) > 0:
-                    temp_reward = max(table_scan_times[table_name]) - index_use[constants.COST_TYPE_CURRENT_EXECUTION]
-                    temp_reward = temp_reward / table_counts[table_name]
-                else:
-                    # No table scan history available - use index scan time as baseline
-                    # This happens when index is used from the very first query
-                    logging.warning("No table scan history for query %s, table %s. Using index time as baseline.", 
-                                   query.id, table_name)
-                    temp_reward = 0  # Neutral reward since we have no comparison baseline
-                if table_name in current_clustered_index_scans:
-                    temp_reward -= current_clustered_index_scans[table_name] / table_counts[table_name]
-                if index_name not in arm_rewards:
-                    arm_rewards[index_name] = [temp_reward, 0]
-                else:
-                    arm_rewards[index_name][0] += temp_reward
-
-    for key in creation_cost:
-        if key in arm_rewards:
-            arm_rewards[key][1] += -1 * creation_cost[key]
-        else:
-            arm_rewards[key] = [0, -1 * creation_cost[key]]
+        round_rewards.add_query(query, non_clustered_index_usage, clustered_index_usage, update_history=not reused)
+
+    round_rewards.add_to(arm_rewards)
+    reward_helper.add_creation_costs(arm_rewards, creation_cost)
     logging.info("Index creation cost: %s", sum(creation_cost.values()))
     logging.info("Time taken to run the queries: %s", execute_cost)
     return execute_cost, creation_cost, arm_rewards
@@ -317,6 +446,8 @@ def get_all_columns_v2(connection):
 
 
 def get_table_row_count(connection, schema_name, tbl_name):
+    if (schema_name, tbl_name) in _row_counts:
+        return _row_counts[(schema_name, tbl_name)]
     cursor = connection.cursor()
     cursor.execute('''SELECT reltuples::bigint
                       FROM pg_class c
@@ -324,9 +455,12 @@ def get_table_row_count(connection, schema_name, tbl_name):
                       WHERE n.nspname = %s AND c.relname = %s;''', (schema_name, tbl_name))
     result = cursor.fetchone()
     if result and result[0] is not None:
-        return int(result[0])
-    cursor.execute(sql.SQL('SELECT COUNT(*) FROM {}').format(sql.Identifier(schema_name, tbl_name)))
-    return cursor.fetchone()[0]
+        row_count = int(result[0])
+    else:
+        cursor.execute(sql.SQL('SELECT COUNT(*) FROM {}').format(sql.Identifier(schema_name, tbl_name)))
+        row_count = cursor.fetchone()[0]
+    _row_counts[(schema_name, tbl_name)] = row_count
+    return row_count
 
 
 def get_primary_key(connection, schema_name, table_name):
@@ -439,18 +573,18 @@ def get_estimated_size_of_index_v1(connection, schema_name, tbl_name, col_names)
 
 
 def get_table_scan_times(connection, query_string):
-    query_table_scan_times = copy.deepcopy(constants.TABLE_SCAN_TIMES[_table_scan_template_key])
+    query_table_scan_times = scan_history.ScanHistory()
     time_taken, _, clustered_index_scans = execute_query_v1(connection, query_string)
     if clustered_index_scans:
         for index_scan in clustered_index_scans:
             table_name = index_scan[0]
-            if len(query_table_scan_times[table_name]) < constants.TABLE_SCAN_TIME_LENGTH:
+            if query_table_scan_times.size(table_name) < constants.TABLE_SCAN_TIME_LENGTH:
                 query_table_scan_times[table_name].append(index_scan[constants.COST_TYPE_CURRENT_EXECUTION])
     return query_table_scan_times
 
 
 def get_table_scan_times_structure():
-    return copy.deepcopy(constants.TABLE_SCAN_TIMES[_table_scan_template_key])
+    return scan_history.ScanHistory()
 
 
 def get_current_pds_size(connection):
@@ -522,7 +656,7 @@ def get_query_plan(*args, **kwargs):
 
 def get_selectivity_v3(connection, query, predicates):
     cleaned_query = query.strip().rstrip(';')
-    cursor = connection.cursor()
+    cursor = _plan_cursor(connection)
     explain_query = f"EXPLAIN (FORMAT JSON) {cleaned_query}"
     cursor.execute(explain_query)
     plan_result = cursor.fetchone()
@@ -531,31 +665,31 @@ def get_selectivity_v3(connection, query, predicates):
         return {table: 1 for table in predicates.keys()}
 
     plan_root = plan_result[0][0]
-    estimated_rows_per_table: Dict[str, float] = defaultdict(lambda: float('inf'))
-
-    def _collect_selectivity(node):
-        node_type = node.get('Node Type', '')
+    estimated_rows_per_table: Dict[str, float] = {}
+    stack = [plan_root.get('Plan', {})]
+    while stack:
+        node = stack.pop()
+        children = node.get('Plans')
+        if children:
+            stack.extend(children)
         relation = node.get('Relation Name') or node.get('Alias')
-        plan_rows = float(node.get('Plan Rows', 0.0))
         if relation and relation in predicates:
-            estimated_rows_per_table[relation] = min(estimated_rows_per_table[relation], plan_rows)
-        for child in node.get('Plans', []) or []:
-            _collect_selectivity(child)
-
-    _collect_selectivity(plan_root.get('Plan', {}))
+            plan_rows = float(node.get('Plan Rows', 0.0))
+            estimated_rows_per_table[relation] = min(estimated_rows_per_table.get(relation, plan_rows), plan_rows)
 
     selectivity = {}
     for table in predicates.keys():
-        estimated_rows = estimated_rows_per_table[table]
-        if estimated_rows == float('inf'):
+        if table not in estimated_rows_per_table:
             selectivity[table] = 1
         else:
             row_count = get_table_row_count(connection, constants.SCHEMA_NAME, table)
-            selectivity[table] = min(1, estimated_rows / max(row_count, 1))
+            selectivity[table] = min(1, estimated_rows_per_table[table] / max(row_count, 1))
     return selectivity
 
 
 def remove_all_non_clustered(connection, schema_name):
+    _invalidate_plan_cache()
+    _materialised_indexes.clear()
     cursor = connection.cursor()
     try:
                 cursor.execute('''SELECT indexname
@@ -601,6 +735,20 @@ def remove_all_non_clustered(connection, schema_name):
     cursor.close()
 
 
+def get_bandit_index_names(connection, schema_name):
+    """
+    :return: dictionary of index name -> table name of the indexes created by the bandit that exist in the schema
+    """
+    cursor = connection.cursor()
+    cursor.execute('SELECT indexname, tablename FROM pg_indexes WHERE schemaname = %s;', (schema_name,))
+    index_names = {row[0]: row[1] for row in cursor.fetchall()
+                   if row[0].startswith(constants.BANDIT_INDEX_PREFIXES)}
+    cursor.close()
+    # indexes left by an earlier process are part of the configuration the plan cache is keyed on
+    _materialised_indexes.update(index_names)
+    return index_names
+
+
 def drop_all_dta_statistics(connection):
     logging.info('Skipping DTA statistics cleanup for PostgreSQL (not applicable).')
 
@@ -0,0 +1,381 @@
+"""
+Replay backend: serves the sql_helper API from a trace recorded with database.sql_trace, without a database.
+
+Executions are looked up by query string and index configuration. When the exact configuration of the indexes on the
+query's tables was never recorded, the nearest recorded configuration (fewest indexes added or removed) is used and
+the usage of indexes that are not materialised now is dropped from it.
+"""
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, List, Set
+
+import constants
+from database import reward_helper, scan_history, sql_trace
+from database.table import Table
+from shared import timing
+
+# -------------------------------------------------------------------------------------------------
+# Configuration
+# -------------------------------------------------------------------------------------------------
+
+db_config = constants.read_db_config()
+_db_section = db_config['REPLAY']
+trace_path = _db_section.get('trace')
+if not os.path.isabs(trace_path):
+    trace_path = os.path.join(constants.ROOT_DIR, trace_path)
+dataset_name = constants.DATASET_NAME or _db_section.get('dataset', '').upper()
+
+table_scan_times_hyp = scan_history.ScanHistory()
+table_scan_times = scan_history.ScanHistory()
+
+# the selectivities come from the trace, there is nothing to plan concurrently
+CONCURRENT_PLANNING = False
+
+# -------------------------------------------------------------------------------------------------
+# Trace
+# -------------------------------------------------------------------------------------------------
+
+_trace = sql_trace.load_trace(trace_path)
+logging.info("Replaying database measurements from %s", trace_path)
+
+_tables_global: Dict[str, Table] = {}
+if sql_trace.KIND_TABLES in _trace:
+    _tables_global = sql_trace.tables_from_dict(_trace[sql_trace.KIND_TABLES][-1]['tables'])
+
+_selectivities = {record['query_string']: record['selectivity']
+                  for record in _trace.get(sql_trace.KIND_SELECTIVITY, [])}
+_index_sizes = {(record['table'], tuple(record['columns'])): record['value']
+                for record in _trace.get(sql_trace.KIND_INDEX_SIZE, [])}
+
+# query string -> recorded executions, each with the bandit indexes (name -> table) that were materialised at the time
+_executions: Dict[str, List[Dict]] = defaultdict(list)
+# indexes of the recordings, built once so a lookup does not scan the executions:
+# index name -> table, query string -> tables its recordings used,
+# query string -> recorded configuration (index name, table pairs) -> recordings of that configuration
+_index_tables: Dict[str, str] = {}
+_recorded_tables: Dict[str, Set[str]] = defaultdict(set)
+_configurations: Dict[str, Dict[frozenset, List[Dict]]] = defaultdict(lambda: defaultdict(list))
+for _record in _trace.get(sql_trace.KIND_EXECUTION, []):
+    _executions[_record['query_string']].append(_record)
+    _index_tables.update(_record['indexes'])
+    _recorded_tables[_record['query_string']].update(usage[0] for usage in _record['clustered'])
+    _recorded_tables[_record['query_string']].update(_record['indexes'][usage[0]] for usage in _record['non_clustered']
+                                                     if usage[0] in _record['indexes'])
+    _configurations[_record['query_string']][frozenset(_record['indexes'].items())].append(_record)
+
+# index name -> recorded creation costs and sizes
+_creation_costs: Dict[str, List[float]] = defaultdict(list)
+_index_memory: Dict[str, float] = {}
+for _record in _trace.get(sql_trace.KIND_CREATION, []):
+    if _record['value'] > 0:
+        _creation_costs[_record['index']].append(_record['value'])
+        if _record['memory']:
+            _index_memory[_record['index']] = _record['memory']
+_total_creation_memory = sum(_index_memory[name] for name in _index_memory)
+_total_creation_cost = sum(sum(_creation_costs[name]) / len(_creation_costs[name]) for name in _index_memory)
+
+# Replay state: materialised bandit indexes (name -> size in MB) and a counter to cycle through repeated recordings
+_materialised_indexes: Dict[str, float] = {}
+_replay_counts: Dict[tuple, int] = defaultdict(int)
+# (query string, tables, current configuration) -> nearest recordings and their distance
+_nearest_cache: Dict[tuple, tuple] = {}
+
+
+# -------------------------------------------------------------------------------------------------
+# Index management
+# -------------------------------------------------------------------------------------------------
+
+
+def _creation_cost(bandit_arm):
+    costs = _creation_costs.get(bandit_arm.index_name)
+    if costs:
+        return sum(costs) / len(costs)
+    if _total_creation_memory > 0 and bandit_arm.memory:
+        # Never created while recording, scale the average creation cost per MB
+        return _total_creation_cost / _total_creation_memory * bandit_arm.memory
+    return 0
+
+
+def create_index_v1(connection, schema_name, tbl_name, col_names, idx_name, include_cols=()):
+    logging.info("Added (replay): %s", idx_name)
+    return 0
+
+
+def create_index_v2(connection, query):
+    return 0
+
+
+def create_statistics(connection, query):
+    return 0
+
+
+def bulk_create_indexes(connection, schema_name, bandit_arm_list):
+    cost = {}
+    for index_name, bandit_arm in bandit_arm_list.items():
+        cost[index_name] = _creation_cost(bandit_arm)
+        set_arm_size(connection, bandit_arm)
+        _materialised_indexes[index_name] = bandit_arm.memory
+        logging.info("Added (replay): %s", index_name)
+    return cost
+
+
+def drop_index(connection, schema_name, tbl_name, idx_name):
+    _materialised_indexes.pop(idx_name, None)
+    logging.info("Removed (replay): %s", idx_name)
+
+
+def bulk_drop_index(connection, schema_name, bandit_arm_list):
+    for index_name, bandit_arm in bandit_arm_list.items():
+        drop_index(connection, schema_name, bandit_arm.table_name, bandit_arm.index_name)
+
+
+def remove_all_non_clustered(connection, schema_name):
+    _materialised_indexes.clear()
+
+
+def get_bandit_index_names(connection, schema_name):
+    # the trace does not keep the table of an index, drop_index does not need it
+    return {index_name: None for index_name in _materialised_indexes}
+
+
+def simple_execute(connection, query):
+    return 0
+
+
+def set_arm_size(connection, bandit_arm):
+    if bandit_arm.index_name in _index_memory:
+        bandit_arm.memory = _index_memory[bandit_arm.index_name]
+    return bandit_arm
+
+
+# -------------------------------------------------------------------------------------------------
+# Query execution
+# -------------------------------------------------------------------------------------------------
+
+
+def _query_tables(query):
+    return set(query.predicates) | set(query.payload) | _recorded_tables[query.query_string]
+
+
+def _nearest_recordings(configurations, current: Set[str], tables: Set[str]):
+    """
+    :param configurations: recorded configurations of the query -> recorded executions
+    :param current: bandit indexes materialised now on the tables of the query
+    :param tables: tables read by the query
+    :return: recordings at the smallest configuration distance, and that distance
+    """
+    nearest = []
+    nearest_distance = None
+    for configuration, recordings in configurations.items():
+        recorded = {index_name for index_name, table_name in configuration if table_name in tables}
+        distance = len(current ^ recorded)
+        if nearest_distance is None or distance < nearest_distance:
+            nearest, nearest_distance = list(recordings), distance
+        elif distance == nearest_distance:
+            nearest.extend(recordings)
+    return nearest, nearest_distance
+
+
+def _replay_execution(query, bandit_arm_list):
+    """
+    :param query: query object
+    :param bandit_arm_list: bandit indexes that are materialised in this round
+    :return: time taken, non clustered index usage, clustered index usage (same as execute_query_v1)
+    """
+    if query.query_string not in _executions:
+        raise KeyError(f"Query {query.id} was never executed while recording {trace_path}")
+
+    tables = frozenset(_query_tables(query))
+    current = frozenset(index_name for index_name, arm in bandit_arm_list.items() if arm.table_name in tables)
+    nearest_key = (query.query_string, tables, current)
+    if nearest_key not in _nearest_cache:
+        _nearest_cache[nearest_key] = _nearest_recordings(_configurations[query.query_string], current, tables)
+    nearest, nearest_distance = _nearest_cache[nearest_key]
+
+    # Repeated recordings of the same configuration are served in turn to keep their runtime variance
+    key = (query.query_string, current)
+    recording = nearest[_replay_counts[key] % len(nearest)]
+    _replay_counts[key] += 1
+    if nearest_distance:
+        logging.debug("Query %s replayed from a configuration %s indexes away", query.id, nearest_distance)
+
+    non_clustered_index_usage = [tuple(usage) for usage in recording['non_clustered'] if usage[0] in bandit_arm_list]
+    clustered_index_usage = [tuple(usage) for usage in recording['clustered']]
+    return recording['time'], non_clustered_index_usage, clustered_index_usage
+
+
+class _AdHocQuery:
+    """Query stand in for execute_query_v1, which only gets the query string"""
+
+    def __init__(self, query_string):
+        self.id = query_string
+        self.query_string = query_string
+        self.predicates = {}
+        self.payload = {}
+
+
+def execute_query_v1(connection, query):
+    time_taken, non_clustered_index_usage, clustered_index_usage = _replay_execution(
+        _AdHocQuery(query), {index_name: _ReplayArm(index_name) for index_name in _materialised_indexes})
+    return time_taken, non_clustered_index_usage, clustered_index_usage
+
+
+class _ReplayArm:
+    """Minimal bandit arm for indexes that are only known by name"""
+
+    def __init__(self, index_name):
+        self.index_name = index_name
+        self.table_name = _index_table(index_name)
+
+
+def _index_table(index_name):
+    return _index_tables.get(index_name)
+
+
+def create_query_drop_v3(connection, schema_name, bandit_arm_list, arm_list_to_add, arm_list_to_delete, queries):
+    with timing.phase(constants.MEASURE_PHASE_INDEX_DDL):
+        bulk_drop_index(connection, schema_name, arm_list_to_delete)
+        creation_cost = bulk_create_indexes(connection, schema_name, arm_list_to_add)
+    execute_cost = 0
+    arm_rewards = {}
+    round_rewards = reward_helper.RoundRewards(bandit_arm_list, table_scan_times)
+
+    for query in queries:
+        with timing.phase(constants.MEASURE_PHASE_QUERY_EXECUTION):
+            time_taken, non_clustered_index_usage, clustered_index_usage = _replay_execution(query, bandit_arm_list)
+        execute_cost += time_taken
+        logging.info("Query %s cost: %s", query.id, time_taken)
+
+        round_rewards.add_query(query, non_clustered_index_usage, clustered_index_usage)
+
+    round_rewards.add_to(arm_rewards)
+    reward_helper.add_creation_costs(arm_rewards, creation_cost)
+    logging.info("Index creation cost: %s", sum(creation_cost.values()))
+    logging.info("Time taken to run the queries: %s", execute_cost)
+    return execute_cost, creation_cost, arm_rewards
+
+
+# -------------------------------------------------------------------------------------------------
+# Schema metadata
+# -------------------------------------------------------------------------------------------------
+
+
+def get_all_columns(connection):
+    record = _trace[sql_trace.KIND_COLUMNS][-1]
+    columns = defaultdict(list)
+    columns.update(record['columns'])
+    return columns, record['count']
+
+
+def get_tables(connection):
+    return _tables_global
+
+
+def get_primary_key(connection, schema_name, table_name):
+    return _tables_global[table_name].pk_columns
+
+
+def get_table_row_count(connection, schema_name, tbl_name):
+    return _tables_global[tbl_name].table_row_count
+
+
+def get_column_data_length_v2(connection, table_name, col_names):
+    column_data_length = 0
+    for column_name in col_names:
+        column = _tables_global[table_name].columns[column_name]
+        column_data_length += column.column_size if column.column_size else 0
+    return column_data_length
+
+
+def get_max_column_data_length_v2(connection, table_name, col_names):
+    column_data_length = 0
+    for column_name in col_names:
+        column = _tables_global[table_name].columns[column_name]
+        column_data_length += column.max_column_size if column.max_column_size else 0
+    return column_data_length
+
+
+def get_estimated_size_of_index_v1(connection, schema_name, tbl_name, col_names):
+    key = (tbl_name, tuple(col_names))
+    if key in _index_sizes:
+        return _index_sizes[key]
+    # Same estimate as the PostgreSQL helper, from the recorded table metadata
+    header_size = 6
+    nullable_buffer = 2
+    primary_key = get_primary_key(connection, schema_name, tbl_name)
+    primary_key_size = get_column_data_length_v2(connection, tbl_name, primary_key)
+    col_not_pk = tuple(set(col_names) - set(primary_key))
+    key_columns_length = get_column_data_length_v2(connection, tbl_name, col_not_pk)
+    index_row_length = header_size + primary_key_size + key_columns_length + nullable_buffer
+    row_count = max(_tables_global[tbl_name].table_row_count, 1)
+    estimated_size = row_count * index_row_length / float(1024 * 1024)
+    if get_max_column_data_length_v2(connection, tbl_name, col_names) > 1700:
+        logging.warning('Index exceeding 1700 bytes: %s', col_names)
+        estimated_size = 99999999
+    return estimated_size
+
+
+# -------------------------------------------------------------------------------------------------
+# Statistics helpers
+# -------------------------------------------------------------------------------------------------
+
+
+def get_selectivity_v3(connection, query, predicates):
+    if query in _selectivities:
+        return _selectivities[query]
+    logging.debug("No recorded selectivity for query, assuming 1: %s", query)
+    return {table: 1 for table in predicates.keys()}
+
+
+def get_table_scan_times_structure():
+    return scan_history.ScanHistory()
+
+
+def get_current_pds_size(connection):
+    # Size before the bandit created any index (first recorded value) plus the bandit indexes materialised now
+    pds_sizes = _trace.get(sql_trace.KIND_PDS_SIZE)
+    base_size = pds_sizes[0]['value'] if pds_sizes else 0.0
+    return base_size + sum(_materialised_indexes.values())
+
+
+def get_database_size(connection):
+    database_sizes = _trace.get(sql_trace.KIND_DATABASE_SIZE)
+    return database_sizes[-1]['value'] if database_sizes else 0.0
+
+
+def restart_sql_server():
+    logging.info('Skipping database restart for trace replay (not required).')
+
+
+def drop_all_dta_statistics(connection):
+    logging.info('Skipping DTA statistics cleanup for trace replay (not applicable).')
+
+
+# -------------------------------------------------------------------------------------------------
+# Hypothetical index placeholders (not supported)
+# -------------------------------------------------------------------------------------------------
+
+
+def hyp_create_index_v1(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for trace replay. Set hyp_rounds = 0.')
+
+
+def hyp_bulk_create_indexes(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for trace replay. Set hyp_rounds = 0.')
+
+
+def hyp_enable_index(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for trace replay. Set hyp_rounds = 0.')
+
+
+def hyp_execute_query(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for trace replay. Set hyp_rounds = 0.')
+
+
+def hyp_create_query_drop_v1(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for trace replay. Set hyp_rounds = 0.')
+
+
+def hyp_create_query_drop_v2(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for trace replay. Set hyp_rounds = 0.')
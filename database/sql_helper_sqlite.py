@@ -0,0 +1,528 @@
+"""
+SQLite implementation of the sql_helper API, for running the bandit end to end on a local database file
+(see scripts/generate_sqlite_dataset.py).
+
+SQLite has no per operator runtime statistics. The query is executed and timed as a whole, and the time is attributed
+to the table and index accesses of its EXPLAIN QUERY PLAN in proportion to the rows each access is estimated to read
+(sqlite_stat1 for index searches, the table row count for scans).
+"""
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import constants
+from database import reward_helper, scan_history, sql_trace
+from database.column import Column
+from database.table import Table
+from shared import timing
+
+# -------------------------------------------------------------------------------------------------
+# Configuration
+# -------------------------------------------------------------------------------------------------
+
+db_config = constants.read_db_config()
+db_type = db_config.get('SYSTEM', 'db_type', fallback='SQLITE')
+_db_section = db_config[db_type]
+database = _db_section.get('database', '')
+dataset_name = constants.DATASET_NAME or os.path.splitext(os.path.basename(database))[0].upper()
+
+table_scan_times_hyp = scan_history.ScanHistory()
+table_scan_times = scan_history.ScanHistory()
+
+# the selectivities of new queries can be estimated on several connections at once (bandits/query_admission.py)
+CONCURRENT_PLANNING = True
+
+_tables_global: Dict[str, Table] = {}
+_row_counts: Dict[str, int] = {}
+_index_stats: Dict[str, List[int]] = {}
+
+# -------------------------------------------------------------------------------------------------
+# Utility helpers
+# -------------------------------------------------------------------------------------------------
+
+# e.g. 'SEARCH mc USING COVERING INDEX IX_movie_companies_movie_id (movie_id=?)', 'SCAN t'
+_PLAN_STEP = re.compile(r'^(SCAN|SEARCH) (\w+)(?: AS \w+)?'
+                        r'(?: USING (AUTOMATIC (?:PARTIAL )?COVERING INDEX|COVERING INDEX|INDEX|'
+                        r'INTEGER PRIMARY KEY|PRIMARY KEY)(?: (\w+))?)?(?: \((.*)\))?')
+_FROM_CLAUSE = re.compile(r'\bFROM\b(.*?)(?:\bWHERE\b|\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|;|$)',
+                          re.IGNORECASE | re.DOTALL)
+_FROM_ITEM = re.compile(r'^\s*(\w+)(?:\s+(?:AS\s+)?(\w+))?\s*$', re.IGNORECASE)
+
+# Share of the rows a range constraint is assumed to keep, same order of magnitude as the SQLite planner
+_RANGE_SELECTIVITY = 0.25
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _alias_map(query):
+    """
+    :param query: query string
+    :return: dictionary of alias (or table name) -> table name for the tables in the FROM clauses
+    """
+    aliases = {}
+    for from_clause in _FROM_CLAUSE.findall(query):
+        for from_item in from_clause.split(','):
+            match = _FROM_ITEM.match(from_item)
+            if match:
+                aliases[match.group(2) or match.group(1)] = match.group(1)
+                aliases[match.group(1)] = match.group(1)
+    return aliases
+
+
+def _get_index_stats(connection, index_name):
+    """
+    :return: sqlite_stat1 entry of the index: [rows, rows per value of the first column, of the first two, ...]
+    """
+    if index_name not in _index_stats:
+        stats = []
+        try:
+            result = connection.execute('SELECT stat FROM sqlite_stat1 WHERE idx = ?', (index_name,)).fetchone()
+            if result and result[0]:
+                stats = [int(value) for value in result[0].split() if value.isdigit()]
+        except sqlite3.OperationalError:
+            # sqlite_stat1 only exists after the first ANALYZE
+            pass
+        _index_stats[index_name] = stats
+    return _index_stats[index_name]
+
+
+def _estimate_rows(connection, table_name, access, index_name, constraints):
+    """
+    :return: estimated number of rows read by one table or index access of the plan
+    """
+    row_count = max(get_table_row_count(connection, constants.SCHEMA_NAME, table_name), 1)
+    if not constraints:
+        return row_count
+    conditions = constraints.split(' AND ')
+    equalities = sum(1 for condition in conditions if condition.endswith('=?') and '<' not in condition
+                     and '>' not in condition)
+    if access in ('INTEGER PRIMARY KEY', 'PRIMARY KEY') and equalities:
+        return 1
+    stats = _get_index_stats(connection, index_name) if index_name else []
+    if equalities and len(stats) > equalities:
+        rows = stats[equalities]
+    elif equalities:
+        rows = row_count * _RANGE_SELECTIVITY ** (equalities + 1)
+    else:
+        rows = row_count
+    if equalities < len(conditions):
+        rows *= _RANGE_SELECTIVITY
+    return max(min(rows, row_count), 1)
+
+
+def _plan_accesses(connection, query):
+    """
+    :param connection: sql_connection
+    :param query: query string
+    :return: list of (table name, index name or None, estimated rows) for the table and index accesses of the plan
+    """
+    aliases = _alias_map(query)
+    accesses = []
+    for _, _, _, detail in connection.execute('EXPLAIN QUERY PLAN ' + query).fetchall():
+        match = _PLAN_STEP.match(detail)
+        if not match:
+            continue
+        operation, name, access, index_name, constraints = match.groups()
+        table_name = aliases.get(name, name)
+        if access is None or access.startswith('AUTOMATIC') or access.endswith('PRIMARY KEY'):
+            # Table accesses, including the transient indexes SQLite builds by scanning the table
+            index_name = None
+        accesses.append((table_name, index_name,
+                         _estimate_rows(connection, table_name, access, index_name,
+                                        constraints if operation == 'SEARCH' else None)))
+    return accesses
+
+
+def get_selectivity_list(query_obj_list):
+    selectivity_list = []
+    for query_obj in query_obj_list:
+        selectivity_list.append(query_obj.selectivity)
+    return selectivity_list
+
+
+# -------------------------------------------------------------------------------------------------
+# Index management
+# -------------------------------------------------------------------------------------------------
+
+
+def create_index_v1(connection, schema_name, tbl_name, col_names, idx_name, include_cols=()):
+    # SQLite has no included columns, they are appended to the key to keep the index covering
+    columns = list(col_names) + [col for col in include_cols if col not in col_names]
+    statement = 'CREATE INDEX IF NOT EXISTS {} ON {} ({})'.format(
+        _quote(idx_name), _quote(tbl_name), ', '.join(_quote(col) for col in columns))
+    start = time.perf_counter()
+    try:
+        connection.execute(statement)
+        connection.execute('ANALYZE ' + _quote(idx_name))
+    except sqlite3.Error as e:
+        logging.error("Failed to create index %s on %s(%s): %s", idx_name, tbl_name, ', '.join(col_names), str(e))
+        return 0.0
+    elapsed = time.perf_counter() - start
+    _index_stats.pop(idx_name, None)
+    logging.info("Added index %s on %s(%s)", idx_name, tbl_name, ', '.join(col_names))
+    return elapsed
+
+
+def create_index_v2(connection, query):
+    connection.execute(query)
+
+
+def create_statistics(connection, query):
+    connection.execute(query)
+
+
+def bulk_create_indexes(connection, schema_name, bandit_arm_list):
+    cost = {}
+    for index_name, bandit_arm in bandit_arm_list.items():
+        creation_time = create_index_v1(connection, schema_name, bandit_arm.table_name,
+                                        bandit_arm.index_cols, bandit_arm.index_name,
+                                        bandit_arm.include_cols)
+        cost[index_name] = creation_time
+        if creation_time > 0:
+            set_arm_size(connection, bandit_arm)
+    return cost
+
+
+def drop_index(connection, schema_name, tbl_name, idx_name):
+    connection.execute('DROP INDEX IF EXISTS ' + _quote(idx_name))
+    _index_stats.pop(idx_name, None)
+    logging.info("Removed index %s", idx_name)
+
+
+def bulk_drop_index(connection, schema_name, bandit_arm_list):
+    for index_name, bandit_arm in bandit_arm_list.items():
+        drop_index(connection, schema_name, bandit_arm.table_name, bandit_arm.index_name)
+
+
+def simple_execute(connection, query):
+    start = time.perf_counter()
+    connection.execute(query).fetchall()
+    return time.perf_counter() - start
+
+
+def remove_all_non_clustered(connection, schema_name):
+    # Indexes without sql are the automatic ones backing primary keys and unique constraints
+    index_names = [row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall()]
+    for index_name in index_names:
+        drop_index(connection, schema_name, None, index_name)
+
+
+def get_bandit_index_names(connection, schema_name):
+    """
+    :return: dictionary of index name -> table name of the indexes created by the bandit that exist in the database
+    """
+    return {row[0]: row[1] for row in connection.execute(
+        "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall()
+        if row[0].startswith(constants.BANDIT_INDEX_PREFIXES)}
+
+
+# -------------------------------------------------------------------------------------------------
+# Query execution metrics
+# -------------------------------------------------------------------------------------------------
+
+
+def execute_query_v1(connection, query):
+    """
+    :return: time taken, non clustered index usage, clustered index usage. Usage tuples are
+        (name, elapsed time, cpu time, sub tree cost, rows read, rows output) with one entry per name
+    """
+    cleaned_query = query.strip().rstrip(';')
+    try:
+        accesses = _plan_accesses(connection, cleaned_query)
+        start = time.perf_counter()
+        connection.execute(cleaned_query).fetchall()
+        total_time_sec = time.perf_counter() - start
+    except sqlite3.Error:
+        logging.exception("Exception when executing query: %s", cleaned_query)
+        return 0, [], []
+
+    total_rows = sum(rows for _, _, rows in accesses)
+    index_usage: Dict[str, List[float]] = {}
+    table_usage: Dict[str, List[float]] = {}
+    for table_name, index_name, rows in accesses:
+        elapsed = total_time_sec * rows / total_rows if total_rows else 0.0
+        usage_name, accumulators = (index_name, index_usage) if index_name else (table_name, table_usage)
+        accumulator = accumulators.get(usage_name)
+        if accumulator is None:
+            accumulators[usage_name] = [elapsed, elapsed, rows, rows, rows]
+        else:
+            accumulator[0] += elapsed
+            accumulator[1] += elapsed
+            accumulator[2] += rows
+            accumulator[3] += rows
+            accumulator[4] += rows
+    return (total_time_sec, [(name, *accumulator) for name, accumulator in index_usage.items()],
+            [(name, *accumulator) for name, accumulator in table_usage.items()])
+
+
+def create_query_drop_v3(connection, schema_name, bandit_arm_list, arm_list_to_add, arm_list_to_delete, queries):
+    with timing.phase(constants.MEASURE_PHASE_INDEX_DDL):
+        bulk_drop_index(connection, schema_name, arm_list_to_delete)
+        creation_cost = bulk_create_indexes(connection, schema_name, arm_list_to_add)
+    sql_trace.record_creation_costs(creation_cost, arm_list_to_add)
+    execute_cost = 0
+    arm_rewards = {}
+    round_rewards = reward_helper.RoundRewards(bandit_arm_list, table_scan_times)
+
+    for query in queries:
+        with timing.phase(constants.MEASURE_PHASE_QUERY_EXECUTION):
+            time_taken, non_clustered_index_usage, clustered_index_usage = execute_query_v1(connection,
+                                                                                            query.query_string)
+        sql_trace.record_execution(query, bandit_arm_list, time_taken, non_clustered_index_usage,
+                                   clustered_index_usage)
+        execute_cost += time_taken
+        logging.info("Query %s cost: %s", query.id, time_taken)
+
+        round_rewards.add_query(query, non_clustered_index_usage, clustered_index_usage)
+
+    round_rewards.add_to(arm_rewards)
+    reward_helper.add_creation_costs(arm_rewards, creation_cost)
+    logging.info("Index creation cost: %s", sum(creation_cost.values()))
+    logging.info("Time taken to run the queries: %s", execute_cost)
+    return execute_cost, creation_cost, arm_rewards
+
+
+# -------------------------------------------------------------------------------------------------
+# Schema metadata
+# -------------------------------------------------------------------------------------------------
+
+
+def _table_names(connection):
+    return [row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name").fetchall()]
+
+
+def get_all_columns(connection):
+    columns = defaultdict(list)
+    count = 0
+    for table_name in _table_names(connection):
+        for row in connection.execute('PRAGMA table_info({})'.format(_quote(table_name))).fetchall():
+            columns[table_name].append(row[1])
+            count += 1
+    return columns, count
+
+
+def get_all_columns_v2(connection):
+    columns = defaultdict(list)
+    count = 0
+    for table_name in _table_names(connection):
+        if get_table_row_count(connection, constants.SCHEMA_NAME, table_name) >= constants.SMALL_TABLE_IGNORE:
+            for row in connection.execute('PRAGMA table_info({})'.format(_quote(table_name))).fetchall():
+                columns[table_name].append(row[1])
+                count += 1
+    return columns, count
+
+
+def get_table_row_count(connection, schema_name, tbl_name):
+    if tbl_name not in _row_counts:
+        _row_counts[tbl_name] = connection.execute('SELECT COUNT(*) FROM ' + _quote(tbl_name)).fetchone()[0]
+    return _row_counts[tbl_name]
+
+
+def get_primary_key(connection, schema_name, table_name):
+    table_info = connection.execute('PRAGMA table_info({})'.format(_quote(table_name))).fetchall()
+    return [row[1] for row in sorted(table_info, key=lambda row: row[5]) if row[5] > 0]
+
+
+def get_columns(connection, table_name):
+    columns: Dict[str, Column] = {}
+    for _, column_name, data_type, _, _, _ in connection.execute(
+            'PRAGMA table_info({})'.format(_quote(table_name))).fetchall():
+        column = Column(table_name, column_name, data_type)
+        if 'INT' in data_type.upper() or 'REAL' in data_type.upper():
+            column_length = max_column_length = 8
+        else:
+            average_length, max_length = connection.execute('SELECT AVG(LENGTH({0})), MAX(LENGTH({0})) FROM {1}'.format(
+                _quote(column_name), _quote(table_name))).fetchone()
+            column_length = int(average_length or 0)
+            max_column_length = int(max_length or 0)
+        column.set_column_size(column_length)
+        column.set_max_column_size(max_column_length)
+        columns[column_name] = column
+    return columns
+
+
+def get_tables(connection):
+    global _tables_global
+    if _tables_global:
+        return _tables_global
+
+    tables = {}
+    for table_name in _table_names(connection):
+        row_count = get_table_row_count(connection, constants.SCHEMA_NAME, table_name)
+        pk_columns = get_primary_key(connection, constants.SCHEMA_NAME, table_name)
+        tables[table_name] = Table(table_name, row_count, pk_columns)
+        tables[table_name].set_columns(get_columns(connection, table_name))
+    _tables_global = tables
+    return _tables_global
+
+
+def get_column_data_length_v2(connection, table_name, col_names):
+    tables = get_tables(connection)
+    column_data_length = 0
+    for column_name in col_names:
+        column = tables[table_name].columns[column_name]
+        column_data_length += column.column_size if column.column_size else 0
+    return column_data_length
+
+
+def get_max_column_data_length_v2(connection, table_name, col_names):
+    tables = get_tables(connection)
+    column_data_length = 0
+    for column_name in col_names:
+        column = tables[table_name].columns[column_name]
+        column_data_length += column.max_column_size if column.max_column_size else 0
+    return column_data_length
+
+
+def get_estimated_size_of_index_v1(connection, schema_name, tbl_name, col_names):
+    table = get_tables(connection)[tbl_name]
+    header_size = 6
+    nullable_buffer = 2
+    primary_key = get_primary_key(connection, schema_name, tbl_name)
+    primary_key_size = get_column_data_length_v2(connection, tbl_name, primary_key)
+    col_not_pk = tuple(set(col_names) - set(primary_key))
+    key_columns_length = get_column_data_length_v2(connection, tbl_name, col_not_pk)
+    index_row_length = header_size + primary_key_size + key_columns_length + nullable_buffer
+    row_count = max(table.table_row_count, 1)
+    estimated_size = row_count * index_row_length
+    estimated_size = estimated_size / float(1024 * 1024)
+    logging.debug('%s : %s', col_names, estimated_size)
+    return estimated_size
+
+
+# -------------------------------------------------------------------------------------------------
+# Statistics helpers
+# -------------------------------------------------------------------------------------------------
+
+
+def get_table_scan_times(connection, query_string):
+    query_table_scan_times = scan_history.ScanHistory()
+    time_taken, _, clustered_index_scans = execute_query_v1(connection, query_string)
+    if clustered_index_scans:
+        for index_scan in clustered_index_scans:
+            table_name = index_scan[0]
+            if query_table_scan_times.size(table_name) < constants.TABLE_SCAN_TIME_LENGTH:
+                query_table_scan_times[table_name].append(index_scan[constants.COST_TYPE_CURRENT_EXECUTION])
+    return query_table_scan_times
+
+
+def get_table_scan_times_structure():
+    return scan_history.ScanHistory()
+
+
+def _index_sizes(connection) -> List[Tuple[str, float]]:
+    """
+    :return: list of (index name, size in MB) of the indexes created with CREATE INDEX, measured with the dbstat
+        virtual table
+    """
+    page_size = connection.execute('PRAGMA page_size').fetchone()[0]
+    return [(name, float(pages) * page_size / (1024 * 1024)) for name, pages in connection.execute(
+        "SELECT m.name, COUNT(*) FROM dbstat AS d JOIN sqlite_master AS m ON m.name = d.name "
+        "WHERE m.type = 'index' AND m.sql IS NOT NULL GROUP BY m.name").fetchall()]
+
+
+def get_current_pds_size(connection):
+    try:
+        return sum(size for _, size in _index_sizes(connection))
+    except sqlite3.OperationalError:
+        # SQLite built without dbstat, fall back to the estimated sizes
+        size = 0.0
+        for index_name, table_name in connection.execute(
+                "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall():
+            col_names = [row[2] for row in connection.execute(
+                'PRAGMA index_info({})'.format(_quote(index_name))).fetchall()]
+            size += get_estimated_size_of_index_v1(connection, constants.SCHEMA_NAME, table_name, col_names)
+        return size
+
+
+def set_arm_size(connection, bandit_arm):
+    try:
+        result = connection.execute(
+            'SELECT COUNT(*) FROM dbstat WHERE name = ?', (bandit_arm.index_name,)).fetchone()
+    except sqlite3.OperationalError:
+        return bandit_arm
+    page_size = connection.execute('PRAGMA page_size').fetchone()[0]
+    if result and result[0]:
+        bandit_arm.memory = float(result[0]) * page_size / (1024 * 1024)
+    return bandit_arm
+
+
+def restart_sql_server():
+    logging.info('Skipping database restart for SQLite (not required).')
+
+
+def get_database_size(connection):
+    page_count = connection.execute('PRAGMA page_count').fetchone()[0]
+    page_size = connection.execute('PRAGMA page_size').fetchone()[0]
+    return float(page_count) * page_size / (1024 * 1024)
+
+
+def get_selectivity_v3(connection, query, predicates):
+    """
+    SQLite does not expose row estimates, the selectivity of a table is the share of its rows read by the index
+    search the planner picks for it (1 for tables that are scanned)
+    """
+    try:
+        accesses = _plan_accesses(connection, query.strip().rstrip(';'))
+    except sqlite3.Error:
+        logging.exception("Exception when planning query: %s", query)
+        return {table: 1 for table in predicates.keys()}
+
+    estimated_rows_per_table: Dict[str, float] = {}
+    for table_name, _, rows in accesses:
+        if table_name in predicates:
+            estimated_rows_per_table[table_name] = min(estimated_rows_per_table.get(table_name, rows), rows)
+
+    selectivity = {}
+    for table in predicates.keys():
+        if table not in estimated_rows_per_table:
+            selectivity[table] = 1
+        else:
+            row_count = get_table_row_count(connection, constants.SCHEMA_NAME, table)
+            selectivity[table] = min(1, estimated_rows_per_table[table] / max(row_count, 1))
+    return selectivity
+
+
+def drop_all_dta_statistics(connection):
+    logging.info('Skipping DTA statistics cleanup for SQLite (not applicable).')
+
+
+# -------------------------------------------------------------------------------------------------
+# Hypothetical index placeholders (not supported)
+# -------------------------------------------------------------------------------------------------
+
+
+def hyp_create_index_v1(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for SQLite. Set hyp_rounds = 0.')
+
+
+def hyp_bulk_create_indexes(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for SQLite. Set hyp_rounds = 0.')
+
+
+def hyp_enable_index(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for SQLite. Set hyp_rounds = 0.')
+
+
+def hyp_execute_query(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for SQLite. Set hyp_rounds = 0.')
+
+
+def hyp_create_query_drop_v1(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for SQLite. Set hyp_rounds = 0.')
+
+
+def hyp_create_query_drop_v2(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for SQLite. Set hyp_rounds = 0.')
+
+
+def get_query_plan(*args, **kwargs):
+    raise NotImplementedError('XML showplans are not available for SQLite.')
@@ -0,0 +1,353 @@
+"""
+In-process stand-in for the database layer, used to run the simulators at scales no real database run would allow
+(see benchmarks/bench_scalability.py).
+
+The schema comes from a JSON file written by benchmarks/synthetic_workload.py. Queries are not executed. Their runtime
+comes from a simple cost model: each table a query reads is either scanned, or accessed through the cheapest usable
+index, where an index is usable when a prefix of its key columns is in the predicates of the query.
+"""
+import json
+import logging
+import math
+import os
+import random
+from collections import defaultdict
+from typing import Dict
+
+import constants
+from database import reward_helper, scan_history, sql_trace
+from database.column import Column
+from database.table import Table
+from shared import timing
+
+# -------------------------------------------------------------------------------------------------
+# Configuration
+# -------------------------------------------------------------------------------------------------
+
+db_config = constants.read_db_config()
+_db_section = db_config['SYNTHETIC']
+schema_path = _db_section.get('schema_file')
+if not os.path.isabs(schema_path):
+    schema_path = os.path.join(constants.ROOT_DIR, schema_path)
+dataset_name = constants.DATASET_NAME or 'SYNTHETIC'
+
+table_scan_times_hyp = scan_history.ScanHistory()
+table_scan_times = scan_history.ScanHistory()
+
+# the selectivities come from the schema statistics, there is nothing to plan concurrently
+CONCURRENT_PLANNING = False
+
+# Cost model, in seconds
+ROW_SCAN_COST = _db_section.getfloat('row_scan_cost', 1e-7)
+ROW_LOOKUP_COST = _db_section.getfloat('row_lookup_cost', 1e-6)
+INDEX_SEEK_COST = _db_section.getfloat('index_seek_cost', 1e-4)
+ROW_BUILD_COST = _db_section.getfloat('row_build_cost', 5e-8)
+RUNTIME_NOISE = _db_section.getfloat('runtime_noise', 0.05)
+
+with open(schema_path) as schema_file:
+    _schema = json.load(schema_file)['tables']
+
+_rng = random.Random(_db_section.getint('seed', 0))
+_tables_global: Dict[str, Table] = {}
+# index name -> (table name, key columns, covered columns)
+_materialised_indexes: Dict[str, tuple] = {}
+# query string -> predicates, for execute_query_v1 which only gets the query string
+_query_predicates: Dict[str, Dict] = {}
+
+
+class SyntheticConnection:
+    """Stands in for the database connection of the synthetic backend"""
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# -------------------------------------------------------------------------------------------------
+# Cost model
+# -------------------------------------------------------------------------------------------------
+
+
+def _column_selectivity(table_name, column_name):
+    return _schema[table_name]['columns'][column_name]['selectivity']
+
+
+def _table_access(table_name, predicate_columns, payload_columns):
+    """
+    :return: (index name or None for a table scan, time, rows read, rows output) of the cheapest access to the table
+    """
+    row_count = _schema[table_name]['rows']
+    selectivity = 1.0
+    for column_name in predicate_columns:
+        selectivity *= _column_selectivity(table_name, column_name)
+    rows_output = row_count * selectivity
+    best = (None, row_count * ROW_SCAN_COST, row_count, rows_output)
+
+    needed_columns = set(predicate_columns) | set(payload_columns)
+    for index_name, (index_table, key_columns, covered_columns) in _materialised_indexes.items():
+        if index_table != table_name:
+            continue
+        prefix_selectivity = 1.0
+        prefix_length = 0
+        for column_name in key_columns:
+            if column_name not in predicate_columns:
+                break
+            prefix_selectivity *= _column_selectivity(table_name, column_name)
+            prefix_length += 1
+        if prefix_length == 0:
+            continue
+        rows_read = row_count * prefix_selectivity
+        row_cost = ROW_SCAN_COST if needed_columns <= covered_columns else ROW_LOOKUP_COST
+        index_time = INDEX_SEEK_COST + rows_read * row_cost
+        if index_time < best[1]:
+            best = (index_name, index_time, rows_read, rows_output)
+    return best
+
+
+def _run_query(predicates, payload):
+    """
+    :return: time taken, non clustered index usage, clustered index usage (same as execute_query_v1)
+    """
+    non_clustered_usage = []
+    clustered_usage = []
+    time_taken = 0
+    for table_name in set(predicates) | set(payload):
+        index_name, access_time, rows_read, rows_output = _table_access(
+            table_name, predicates.get(table_name, ()), payload.get(table_name, ()))
+        access_time *= _rng.lognormvariate(0, RUNTIME_NOISE)
+        time_taken += access_time
+        if index_name is None:
+            clustered_usage.append((table_name, access_time, access_time, access_time, rows_read, rows_output))
+        else:
+            non_clustered_usage.append((index_name, access_time, access_time, access_time, rows_read, rows_output))
+    return time_taken, non_clustered_usage, clustered_usage
+
+
+# -------------------------------------------------------------------------------------------------
+# Index management
+# -------------------------------------------------------------------------------------------------
+
+
+def create_index_v1(connection, schema_name, tbl_name, col_names, idx_name, include_cols=()):
+    row_count = _schema[tbl_name]['rows']
+    _materialised_indexes[idx_name] = (tbl_name, tuple(col_names), set(col_names) | set(include_cols))
+    creation_time = row_count * max(math.log2(max(row_count, 2)), 1) * ROW_BUILD_COST * (
+            len(col_names) + len(include_cols))
+    logging.info("Added index %s on %s(%s)", idx_name, tbl_name, ', '.join(col_names))
+    return creation_time
+
+
+def create_index_v2(connection, query):
+    return 0
+
+
+def create_statistics(connection, query):
+    return 0
+
+
+def bulk_create_indexes(connection, schema_name, bandit_arm_list):
+    cost = {}
+    for index_name, bandit_arm in bandit_arm_list.items():
+        cost[index_name] = create_index_v1(connection, schema_name, bandit_arm.table_name, bandit_arm.index_cols,
+                                           bandit_arm.index_name, bandit_arm.include_cols)
+    return cost
+
+
+def drop_index(connection, schema_name, tbl_name, idx_name):
+    _materialised_indexes.pop(idx_name, None)
+    logging.info("Removed index %s", idx_name)
+
+
+def bulk_drop_index(connection, schema_name, bandit_arm_list):
+    for index_name, bandit_arm in bandit_arm_list.items():
+        drop_index(connection, schema_name, bandit_arm.table_name, bandit_arm.index_name)
+
+
+def remove_all_non_clustered(connection, schema_name):
+    _materialised_indexes.clear()
+
+
+def get_bandit_index_names(connection, schema_name):
+    return {index_name: index[0] for index_name, index in _materialised_indexes.items()}
+
+
+def simple_execute(connection, query):
+    return 0
+
+
+def set_arm_size(connection, bandit_arm):
+    return bandit_arm
+
+
+# -------------------------------------------------------------------------------------------------
+# Query execution metrics
+# -------------------------------------------------------------------------------------------------
+
+
+def execute_query_v1(connection, query):
+    return _run_query(_query_predicates.get(query, {}), {})
+
+
+def create_query_drop_v3(connection, schema_name, bandit_arm_list, arm_list_to_add, arm_list_to_delete, queries):
+    with timing.phase(constants.MEASURE_PHASE_INDEX_DDL):
+        bulk_drop_index(connection, schema_name, arm_list_to_delete)
+        creation_cost = bulk_create_indexes(connection, schema_name, arm_list_to_add)
+    execute_cost = 0
+    arm_rewards = {}
+    round_rewards = reward_helper.RoundRewards(bandit_arm_list, table_scan_times)
+
+    for query in queries:
+        with timing.phase(constants.MEASURE_PHASE_QUERY_EXECUTION):
+            time_taken, non_clustered_index_usage, clustered_index_usage = _run_query(query.predicates, query.payload)
+        sql_trace.record_execution(query, bandit_arm_list, time_taken, non_clustered_index_usage,
+                                   clustered_index_usage)
+        execute_cost += time_taken
+        logging.debug("Query %s cost: %s", query.id, time_taken)
+
+        round_rewards.add_query(query, non_clustered_index_usage, clustered_index_usage)
+
+    round_rewards.add_to(arm_rewards)
+    reward_helper.add_creation_costs(arm_rewards, creation_cost)
+    logging.info("Index creation cost: %s", sum(creation_cost.values()))
+    logging.info("Time taken to run the queries: %s", execute_cost)
+    return execute_cost, creation_cost, arm_rewards
+
+
+# -------------------------------------------------------------------------------------------------
+# Schema metadata
+# -------------------------------------------------------------------------------------------------
+
+
+def get_all_columns(connection):
+    columns = defaultdict(list)
+    count = 0
+    for table_name, table in _schema.items():
+        columns[table_name] = list(table['columns'])
+        count += len(table['columns'])
+    return columns, count
+
+
+def get_all_columns_v2(connection):
+    columns = defaultdict(list)
+    count = 0
+    for table_name, table in _schema.items():
+        if table['rows'] >= constants.SMALL_TABLE_IGNORE:
+            columns[table_name] = list(table['columns'])
+            count += len(table['columns'])
+    return columns, count
+
+
+def get_table_row_count(connection, schema_name, tbl_name):
+    return _schema[tbl_name]['rows']
+
+
+def get_primary_key(connection, schema_name, table_name):
+    return _schema[table_name]['pk']
+
+
+def get_tables(connection):
+    global _tables_global
+    if _tables_global:
+        return _tables_global
+
+    tables = {}
+    for table_name, table_dict in _schema.items():
+        table = Table(table_name, table_dict['rows'], table_dict['pk'])
+        columns = {}
+        for column_name, column_dict in table_dict['columns'].items():
+            column = Column(table_name, column_name, column_dict['type'])
+            column.set_column_size(column_dict['size'])
+            column.set_max_column_size(column_dict['size'])
+            columns[column_name] = column
+        table.set_columns(columns)
+        tables[table_name] = table
+    _tables_global = tables
+    return _tables_global
+
+
+def get_estimated_size_of_index_v1(connection, schema_name, tbl_name, col_names):
+    table_dict = _schema[tbl_name]
+    header_size = 6
+    nullable_buffer = 2
+    primary_key_size = sum(table_dict['columns'][column]['size'] for column in table_dict['pk'])
+    key_columns_length = sum(table_dict['columns'][column]['size']
+                             for column in set(col_names) - set(table_dict['pk']))
+    index_row_length = header_size + primary_key_size + key_columns_length + nullable_buffer
+    return max(table_dict['rows'], 1) * index_row_length / float(1024 * 1024)
+
+
+# -------------------------------------------------------------------------------------------------
+# Statistics helpers
+# -------------------------------------------------------------------------------------------------
+
+
+def get_selectivity_v3(connection, query, predicates):
+    _query_predicates[query] = predicates
+    selectivity = {}
+    for table_name, columns in predicates.items():
+        table_selectivity = 1.0
+        for column_name in columns:
+            table_selectivity *= _column_selectivity(table_name, column_name)
+        selectivity[table_name] = table_selectivity
+    return selectivity
+
+
+def get_table_scan_times_structure():
+    return scan_history.ScanHistory()
+
+
+def get_current_pds_size(connection):
+    size = 0.0
+    for index_name, (table_name, key_columns, covered_columns) in _materialised_indexes.items():
+        size += get_estimated_size_of_index_v1(connection, constants.SCHEMA_NAME, table_name, covered_columns)
+    return size
+
+
+def get_database_size(connection):
+    size = 0.0
+    for table_dict in _schema.values():
+        row_length = sum(column['size'] for column in table_dict['columns'].values())
+        size += table_dict['rows'] * row_length / float(1024 * 1024)
+    return size
+
+
+def restart_sql_server():
+    logging.info('Skipping database restart for the synthetic backend (not required).')
+
+
+def drop_all_dta_statistics(connection):
+    logging.info('Skipping DTA statistics cleanup for the synthetic backend (not applicable).')
+
+
+# -------------------------------------------------------------------------------------------------
+# Hypothetical index placeholders (not supported)
+# -------------------------------------------------------------------------------------------------
+
+
+def hyp_create_index_v1(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for the synthetic backend. Set hyp_rounds = 0.')
+
+
+def hyp_bulk_create_indexes(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for the synthetic backend. Set hyp_rounds = 0.')
+
+
+def hyp_enable_index(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for the synthetic backend. Set hyp_rounds = 0.')
+
+
+def hyp_execute_query(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for the synthetic backend. Set hyp_rounds = 0.')
+
+
+def hyp_create_query_drop_v1(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for the synthetic backend. Set hyp_rounds = 0.')
+
+
+def hyp_create_query_drop_v2(*args, **kwargs):
+    raise NotImplementedError('Hypothetical indexes are not supported for the synthetic backend. Set hyp_rounds = 0.')
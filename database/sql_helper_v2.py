@@ -1,24 +1,26 @@
-import configparser
 import datetime
 import logging
 import os
 import subprocess
 import time
 from collections import defaultdict
-import copy
 
 import constants
+from database import scan_history
 from database.query_plan import QueryPlan
 from database.column import Column
 from database.table import Table
+from shared import timing
 
-db_config = configparser.ConfigParser()
-db_config.read(constants.DB_CONFIG)
+db_config = constants.read_db_config()
 db_type = db_config['SYSTEM']['db_type']
 database = db_config[db_type]['database']
 
-table_scan_times_hyp = copy.deepcopy(constants.TABLE_SCAN_TIMES[database[:-4]])
-table_scan_times = copy.deepcopy(constants.TABLE_SCAN_TIMES[database[:-4]])
+table_scan_times_hyp = scan_history.ScanHistory()
+table_scan_times = scan_history.ScanHistory()
+
+# the selectivities of new queries can be estimated on several connections at once (bandits/query_admission.py)
+CONCURRENT_PLANNING = True
 
 tables_global = None
 pk_columns_dict = {}
@@ -229,14 +231,16 @@ def create_query_drop_v3(connection, schema_name, bandit_arm_list, arm_list_to_a
     :param queries: queries that should be executed
     :return:
     """
-    bulk_drop_index(connection, schema_name, arm_list_to_delete)
-    creation_cost = bulk_create_indexes(connection, schema_name, arm_list_to_add)
+    with timing.phase(constants.MEASURE_PHASE_INDEX_DDL):
+        bulk_drop_index(connection, schema_name, arm_list_to_delete)
+        creation_cost = bulk_create_indexes(connection, schema_name, arm_list_to_add)
     execute_cost = 0
     arm_rewards = {}
     if tables_global is None:
         get_tables(connection)
     for query in queries:
-        time, non_clustered_index_usage, clustered_index_usage = execute_query_v1(connection, query.query_string)
+        with timing.phase(constants.MEASURE_PHASE_QUERY_EXECUTION):
+            time, non_clustered_index_usage, clustered_index_usage = execute_query_v1(connection, query.query_string)
         non_clustered_index_usage = merge_index_use(non_clustered_index_usage)
         clustered_index_usage = merge_index_use(clustered_index_usage)
         logging.info(f"Query {query.id} cost: {time}")
@@ -246,7 +250,7 @@ def create_query_drop_v3(connection, schema_name, bandit_arm_list, arm_list_to_a
             for index_scan in clustered_index_usage:
                 table_name = index_scan[0]
                 current_clustered_index_scans[table_name] = index_scan[constants.COST_TYPE_CURRENT_EXECUTION]
-                if len(query.table_scan_times[table_name]) < constants.TABLE_SCAN_TIME_LENGTH:
+                if query.table_scan_times.size(table_name) < constants.TABLE_SCAN_TIME_LENGTH:
                     query.table_scan_times[table_name].append(index_scan[constants.COST_TYPE_CURRENT_EXECUTION])
                     table_scan_times[table_name].append(index_scan[constants.COST_TYPE_CURRENT_EXECUTION])
         if non_clustered_index_usage:
@@ -261,14 +265,13 @@ def create_query_drop_v3(connection, schema_name, bandit_arm_list, arm_list_to_a
             for index_use in non_clustered_index_usage:
                 index_name = index_use[0]
                 table_name = bandit_arm_list[index_name].table_name
-                if len(query.table_scan_times[table_name]) < constants.TABLE_SCAN_TIME_LENGTH:
+                if query.table_scan_times.size(table_name) < constants.TABLE_SCAN_TIME_LENGTH:
                     query.index_scan_times[table_name].append(index_use[constants.COST_TYPE_CURRENT_EXECUTION])
-                table_scan_time = query.table_scan_times[table_name]
-                if len(table_scan_time) > 0:
-                    temp_reward = max(table_scan_time) - index_use[constants.COST_TYPE_CURRENT_EXECUTION]
+                if query.table_scan_times.size(table_name) > 0:
+                    temp_reward = query.table_scan_times.max(table_name) - index_use[constants.COST_TYPE_CURRENT_EXECUTION]
                     temp_reward = temp_reward/table_counts[table_name]
-                elif len(table_scan_times[table_name]) > 0:
-                    temp_reward = max(table_scan_times[table_name]) - index_use[constants.COST_TYPE_CURRENT_EXECUTION]
+                elif table_scan_times.size(table_name) > 0:
+                    temp_reward = table_scan_times.max(table_name) - index_use[constants.COST_TYPE_CURRENT_EXECUTION]
                     temp_reward = temp_reward / table_counts[table_name]
                 else:
                     logging.error(f"Queries without index scan information {query.id}")
@@ -410,16 +413,16 @@ def hyp_create_query_drop_v1(connection, schema_name, bandit_arm_list, arm_list_
         estimated_sub_tree_cost += float(cost)
         if clustered_index_scans:
             for index_scan in clustered_index_scans:
-                if len(table_scan_times_hyp[index_scan[0]]) < constants.TABLE_SCAN_TIME_LENGTH:
+                if table_scan_times_hyp.size(index_scan[0]) < constants.TABLE_SCAN_TIME_LENGTH:
                     table_scan_times_hyp[index_scan[0]].append(index_scan[3])
 
         if index_seeks:
             for index_seek in index_seeks:
-                table_scan_time_hyp = table_scan_times_hyp[bandit_arm_list[index_seek[0]].table_name]
-                arm_rewards[index_seek[0]] = max(table_scan_time_hyp) - index_seek[3]
+                table_scan_time_hyp = table_scan_times_hyp.max(bandit_arm_list[index_seek[0]].table_name)
+                arm_rewards[index_seek[0]] = table_scan_time_hyp - index_seek[3]
 
     for key in creation_cost:
-        creation_cost[key] = max(table_scan_times_hyp[bandit_arm_list[key].table_name])
+        creation_cost[key] = table_scan_times_hyp.max(bandit_arm_list[key].table_name)
         if key in arm_rewards:
             arm_rewards[key] += -1 * creation_cost[key]
         else:
@@ -456,20 +459,19 @@ def hyp_create_query_drop_v2(connection, schema_name, bandit_arm_list, arm_list_
         if clustered_index_usage:
             for index_scan in clustered_index_usage:
                 table_name = index_scan[0]
-                if len(query.table_scan_times_hyp[table_name]) < constants.TABLE_SCAN_TIME_LENGTH:
+                if query.table_scan_times_hyp.size(table_name) < constants.TABLE_SCAN_TIME_LENGTH:
                     query.table_scan_times_hyp[table_name].append(index_scan[constants.COST_TYPE_SUB_TREE_COST])
                     table_scan_times_hyp[table_name].append(index_scan[constants.COST_TYPE_SUB_TREE_COST])
         if non_clustered_index_usage:
             for index_use in non_clustered_index_usage:
                 index_name = index_use[0]
                 table_name = bandit_arm_list[index_name].table_name
-                if len(query.table_scan_times_hyp[table_name]) < constants.TABLE_SCAN_TIME_LENGTH:
+                if query.table_scan_times_hyp.size(table_name) < constants.TABLE_SCAN_TIME_LENGTH:
                     query.index_scan_times_hyp[table_name].append(index_use[constants.COST_TYPE_SUB_TREE_COST])
-                table_scan_time = query.table_scan_times_hyp[table_name]
-                if len(table_scan_time) > 0:
-                    temp_reward = max(table_scan_time) - index_use[constants.COST_TYPE_SUB_TREE_COST]
-                elif len(table_scan_times_hyp[table_name]) > 0:
-                    temp_reward = max(table_scan_times_hyp[table_name]) - index_use[constants.COST_TYPE_SUB_TREE_COST]
+                if query.table_scan_times_hyp.size(table_name) > 0:
+                    temp_reward = query.table_scan_times_hyp.max(table_name) - index_use[constants.COST_TYPE_SUB_TREE_COST]
+                elif table_scan_times_hyp.size(table_name) > 0:
+                    temp_reward = table_scan_times_hyp.max(table_name) - index_use[constants.COST_TYPE_SUB_TREE_COST]
                 else:
                     logging.error(f"Queries without index scan information {query.id}")
                     raise Exception
@@ -766,20 +768,36 @@ def remove_all_non_clustered(connection, schema_name):
         drop_index(connection, schema_name, result[1], result[0])
 
 
+def get_bandit_index_names(connection, schema_name):
+    """
+    Get the indexes created by the bandit that exist in the database
+    :param connection: SQL Connection
+    :param schema_name: schema name related to the index
+    :return: dictionary of index name -> table name
+    """
+    query = f"""select i.name as index_name, t.name as table_name
+                from sys.indexes i, sys.tables t, sys.schemas s
+                where i.object_id = t.object_id and t.schema_id = s.schema_id and i.type_desc = 'NONCLUSTERED'
+                and s.name = '{schema_name}'"""
+    cursor = connection.cursor()
+    cursor.execute(query)
+    results = cursor.fetchall()
+    return {result[0]: result[1] for result in results if result[0].startswith(constants.BANDIT_INDEX_PREFIXES)}
+
+
 def get_table_scan_times(connection, query_string):
-    query_table_scan_times = copy.deepcopy(constants.TABLE_SCAN_TIMES[database])
+    query_table_scan_times = scan_history.ScanHistory()
     time, index_seeks, clustered_index_scans = execute_query_v1(connection, query_string)
     if clustered_index_scans:
         for index_scan in clustered_index_scans:
             table_name = index_scan[0]
-            if len(query_table_scan_times[table_name]) < constants.TABLE_SCAN_TIME_LENGTH:
+            if query_table_scan_times.size(table_name) < constants.TABLE_SCAN_TIME_LENGTH:
                 query_table_scan_times[table_name].append(index_scan[constants.COST_TYPE_CURRENT_EXECUTION])
     return query_table_scan_times
 
 
 def get_table_scan_times_structure():
-    query_table_scan_times = copy.deepcopy(constants.TABLE_SCAN_TIMES[database[:-4]])
-    return query_table_scan_times
+    return scan_history.ScanHistory()
 
 
 def drop_all_dta_statistics(connection):
@@ -0,0 +1,203 @@
+"""
+Recording of database measurements for offline replay.
+
+When recording is on, every measurement the simulators take from the database (schema metadata, selectivities,
+index sizes, query executions under a given index configuration and index creation costs) is appended to a JSON lines
+trace. database.sql_helper_replay serves a simulation from such a trace without a database connection.
+"""
+import json
+import logging
+import os
+import threading
+
+from database.column import Column
+from database.table import Table
+
+KIND_TABLES = 'tables'
+KIND_COLUMNS = 'columns'
+KIND_SELECTIVITY = 'selectivity'
+KIND_PDS_SIZE = 'pds_size'
+KIND_DATABASE_SIZE = 'database_size'
+KIND_INDEX_SIZE = 'index_size'
+KIND_EXECUTION = 'execution'
+KIND_CREATION = 'creation'
+
+_trace_file = None
+_trace_lock = threading.Lock()
+# trace path -> ((modification time, size), records), the replay backend is reloaded for every experiment
+_loaded_traces = {}
+
+
+def start_recording(trace_path):
+    """
+    Starts appending measurements to the given trace file. Traces of several runs can share one file, the replay
+    backend merges them.
+
+    :param trace_path: path of the JSON lines trace
+    """
+    global _trace_file
+    if _trace_file is not None:
+        if _trace_file.name == trace_path:
+            return
+        stop_recording()
+    _trace_file = open(trace_path, 'a', encoding='utf-8')
+    logging.info("Recording database measurements to %s", trace_path)
+
+
+def stop_recording():
+    global _trace_file
+    if _trace_file is not None:
+        _trace_file.close()
+        _trace_file = None
+
+
+def is_recording():
+    return _trace_file is not None
+
+
+def _write(record):
+    if _trace_file is None:
+        return
+    line = json.dumps(record)
+    with _trace_lock:
+        _trace_file.write(line + '\n')
+        _trace_file.flush()
+
+
+def tables_to_dict(tables):
+    """
+    :param tables: dictionary of table name -> Table
+    :return: JSON friendly version of the tables
+    """
+    return {table_name: {
+        'row_count': table.table_row_count,
+        'pk_columns': list(table.pk_columns),
+        'columns': {column_name: [column.column_type, column.column_size, column.max_column_size]
+                    for column_name, column in (table.columns or {}).items()}
+    } for table_name, table in tables.items()}
+
+
+def tables_from_dict(tables_dict):
+    """
+    :param tables_dict: output of tables_to_dict
+    :return: dictionary of table name -> Table
+    """
+    tables = {}
+    for table_name, table_dict in tables_dict.items():
+        table = Table(table_name, table_dict['row_count'], table_dict['pk_columns'])
+        columns = {}
+        for column_name, (column_type, column_size, max_column_size) in table_dict['columns'].items():
+            column = Column(table_name, column_name, column_type)
+            column.set_column_size(column_size)
+            column.set_max_column_size(max_column_size)
+            columns[column_name] = column
+        table.set_columns(columns)
+        tables[table_name] = table
+    return tables
+
+
+def record_execution(query, bandit_arm_list, time_taken, non_clustered_index_usage, clustered_index_usage):
+    """
+    Records one execution of a query together with the bandit indexes that were materialised when it ran
+
+    :param query: query object
+    :param bandit_arm_list: bandit indexes that are materialised in this round
+    :param time_taken: execution time
+    :param non_clustered_index_usage: index usage tuples
+    :param clustered_index_usage: table scan usage tuples
+    """
+    if _trace_file is None:
+        return
+    _write({'kind': KIND_EXECUTION,
+            'query_id': query.id,
+            'query_string': query.query_string,
+            'indexes': {index_name: arm.table_name for index_name, arm in bandit_arm_list.items()},
+            'time': time_taken,
+            'non_clustered': non_clustered_index_usage or [],
+            'clustered': clustered_index_usage or []})
+
+
+def record_creation_costs(creation_cost, bandit_arm_list):
+    """
+    :param creation_cost: dictionary of index name -> creation time
+    :param bandit_arm_list: bandit arms created in this round
+    """
+    if _trace_file is None:
+        return
+    for index_name, cost in creation_cost.items():
+        arm = bandit_arm_list.get(index_name)
+        _write({'kind': KIND_CREATION, 'index': index_name, 'value': cost,
+                'memory': arm.memory if arm is not None else None})
+
+
+def _record_call(name, args, result):
+    if name == 'get_tables':
+        _write({'kind': KIND_TABLES, 'tables': tables_to_dict(result)})
+    elif name == 'get_all_columns':
+        columns, count = result
+        _write({'kind': KIND_COLUMNS, 'columns': dict(columns), 'count': count})
+    elif name == 'get_selectivity_v3':
+        _write({'kind': KIND_SELECTIVITY, 'query_string': args[1], 'selectivity': result})
+    elif name == 'get_current_pds_size':
+        _write({'kind': KIND_PDS_SIZE, 'value': result})
+    elif name == 'get_database_size':
+        _write({'kind': KIND_DATABASE_SIZE, 'value': result})
+    elif name == 'get_estimated_size_of_index_v1':
+        _write({'kind': KIND_INDEX_SIZE, 'table': args[2], 'columns': list(args[3]), 'value': result})
+
+
+RECORDED_FUNCTIONS = frozenset({'get_tables', 'get_all_columns', 'get_selectivity_v3', 'get_current_pds_size',
+                                'get_database_size', 'get_estimated_size_of_index_v1'})
+
+
+def recorded(name, function):
+    """
+    Wraps a helper function so its result is added to the trace while recording
+
+    :param name: helper function name, one of RECORDED_FUNCTIONS
+    :param function: helper function
+    :return: wrapped function
+    """
+    def wrapper(*args):
+        result = function(*args)
+        if _trace_file is not None:
+            _record_call(name, args, result)
+        return result
+    wrapper.__name__ = name
+    return wrapper
+
+
+def load_trace(trace_path):
+    """
+    :param trace_path: path of the JSON lines trace
+    :return: dictionary of kind -> list of records, in recording order, shared by the loads of an unchanged trace
+    """
+    stat = os.stat(trace_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    if trace_path in _loaded_traces and _loaded_traces[trace_path][0] == version:
+        return _loaded_traces[trace_path][1]
+    records = {}
+    with open(trace_path, encoding='utf-8') as trace_file:
+        for line in trace_file:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                records.setdefault(record['kind'], []).append(record)
+    _loaded_traces[trace_path] = (version, records)
+    return records
+
+
+class ReplayConnection:
+    """Stands in for the database connection when the simulation is served from a trace"""
+
+    def __init__(self, trace_path):
+        self.trace_path = trace_path
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
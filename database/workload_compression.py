@@ -0,0 +1,80 @@
+"""
+Workload compression for the baseline runners (compress_workload in exp.conf).
+
+The queries of a round are clustered by template fingerprint (shared/fingerprint.py) and, optionally, by plan shape:
+the order of magnitude of the planner's selectivity estimate for each table of the query, so literal variants whose
+plans differ much (a selective and an unselective literal) are kept apart. Each cluster is represented by a few of its
+queries spread over the cluster, each standing for an equal share of the cluster. The runners execute the
+representatives only and extrapolate the round cost with the weights.
+"""
+import logging
+import math
+
+from database import sql_helper
+from shared import fingerprint
+
+
+class WorkloadCompressor:
+
+    def __init__(self, connection, plan_shape=True, representatives=1):
+        """
+        :param connection: sql connection, for the selectivity estimates of the plan shapes
+        :param plan_shape: also cluster by plan shape, one planner call per distinct query
+        :param representatives: number of queries executed per cluster
+        """
+        self.connection = connection
+        self.plan_shape = plan_shape
+        self.representatives = max(1, representatives)
+        self._cluster_keys = {}     # (query id, query string) -> cluster key
+
+    @classmethod
+    def from_configs(cls, configs, connection):
+        """
+        :param configs: shared.configs_v2 module
+        :param connection: sql connection
+        :return: WorkloadCompressor, None when compress_workload is off
+        """
+        if not configs.compress_workload:
+            return None
+        return cls(connection, configs.compression_plan_shape, configs.compression_representatives)
+
+    def _cluster_key(self, query):
+        key = (query['id'], query['query_string'])
+        if key not in self._cluster_keys:
+            shape = ()
+            if self.plan_shape and query.get('predicates'):
+                selectivity = sql_helper.get_selectivity_v3(self.connection, query['query_string'],
+                                                            query['predicates'])
+                shape = tuple(sorted((table, math.floor(math.log10(max(value, 1e-12))))
+                                     for table, value in selectivity.items()))
+            self._cluster_keys[key] = (fingerprint.fingerprint(query['query_string']), shape)
+        return self._cluster_keys[key]
+
+    def compress(self, queries):
+        """
+        :param queries: query dictionaries of a round
+        :return: list of (representative query, weight), the weights add up to the number of queries
+        """
+        clusters = {}
+        for query in queries:
+            clusters.setdefault(self._cluster_key(query), []).append(query)
+        representatives = []
+        for cluster in clusters.values():
+            count = min(len(cluster), self.representatives)
+            # spread over the cluster, the queries of a round are often ordered by time
+            for n in range(count):
+                representatives.append((cluster[n * len(cluster) // count], len(cluster) / count))
+        logging.info(f"Compressed {len(queries)} queries to {len(representatives)} representatives of "
+                     f"{len(clusters)} clusters")
+        return representatives
+
+
+def get_weighted_queries(compressor, queries):
+    """
+    :param compressor: WorkloadCompressor, None to execute every query
+    :param queries: query dictionaries of a round
+    :return: list of (query, weight) to execute
+    """
+    if compressor is None:
+        return [(query, 1) for query in queries]
+    return compressor.compress(queries)
@@ -1,137 +1,103 @@
 #!/usr/bin/env python3
 """
-Script to convert JOB benchmark queries to DBABandits workload format.
-This reads all .sql files from the JOB queries directory and creates a JSON workload file.
+Script to convert JOB benchmark queries, or any SQL query log, to DBABandits workload format.
+
+The queries are read from the .sql files of a directory (one query per file, the JOB queries by default), from SQL
+log files with statements separated by semicolons, or from an existing workload file whose structures are derived
+again. The predicates, payload, group by and order by columns of every query are derived by shared/sql_parser.py;
+queries of the same template are parsed once and the templates are parsed in parallel.
+
+    python scripts/generate_job_workload.py --queries-dir /path/to/job_queries
+    python scripts/generate_job_workload.py --log queries.log --schema --output resources/workloads/my_log.json
 """
 
+import argparse
+import glob
 import json
 import os
-import glob
-import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+from shared import sql_parser
 
 # Path to JOB queries directory
 JOB_QUERIES_DIR = "/home/qihan/load_imdb/job_queries"
 OUTPUT_FILE = "resources/workloads/job_all_queries.json"
 
-def extract_tables_from_query(query):
-    """Extract table names from SQL query."""
-    # Pattern to match table names in FROM and JOIN clauses
-    # This handles: FROM table AS alias, JOIN table AS alias
-    pattern = r'(?:FROM|JOIN)\s+(\w+)\s+AS'
-    tables = re.findall(pattern, query, re.IGNORECASE)
-    return list(set(tables))  # Remove duplicates
 
-def extract_predicates(query, tables):
+def read_queries(queries_dir=None, log_files=(), workload_file=None):
     """
-    Simple predicate extraction based on WHERE clause columns.
-    Returns a dict mapping table names to lists of columns used in predicates.
+    :return: list of (query id, query string), ids follow the order of the queries unless a workload gives them
     """
-    predicates = {}
-    
-    # Extract WHERE clause
-    where_match = re.search(r'WHERE\s+(.*?)(?:GROUP BY|ORDER BY|;|$)', query, re.IGNORECASE | re.DOTALL)
-    if not where_match:
-        return predicates
-    
-    where_clause = where_match.group(1)
-    
-    # Find all table.column or alias.column references
-    for table in tables:
-        # Look for patterns like "table.column" or "alias.column" in WHERE clause
-        pattern = rf'\b{table[0]}\.(\w+)'
-        columns = re.findall(pattern, where_clause)
-        if columns:
-            predicates[table] = list(set(columns))
-    
-    return predicates
-
-def extract_payload(query, tables):
+    query_strings = []
+    if queries_dir:
+        sql_files = sorted(glob.glob(os.path.join(queries_dir, "*.sql")))
+        print(f"Found {len(sql_files)} query files in {queries_dir}")
+        for sql_file in sql_files:
+            with open(sql_file) as f:
+                query_strings += sql_parser.split_statements(f.read())
+    for log_file in log_files:
+        with open(log_file) as f:
+            query_strings += sql_parser.split_statements(f.read())
+    queries = [(idx, query_string) for idx, query_string in enumerate(query_strings, start=1)]
+    if workload_file:
+        with open(workload_file) as f:
+            workload = [json.loads(line) for line in f if line.strip()]
+        queries += [(query['id'], query['query_string']) for query in workload]
+    return queries
+
+
+def get_table_columns():
     """
-    Extract payload (columns accessed) from query.
-    For simplicity, we'll just include common columns that might be accessed.
+    :return: table columns of the database configured in db.conf, to resolve the unqualified columns
     """
-    payload = {}
-    
-    # Extract SELECT clause
-    select_match = re.search(r'SELECT\s+(.*?)\s+FROM', query, re.IGNORECASE | re.DOTALL)
-    if not select_match:
-        return payload
-    
-    select_clause = select_match.group(1)
-    
-    # For each table, try to find columns referenced
-    for table in tables:
-        pattern = rf'\b{table[0]}\.(\w+)'
-        columns = re.findall(pattern, select_clause)
-        if columns:
-            payload[table] = list(set(columns))
-    
-    # Also check in WHERE clause for join conditions
-    where_match = re.search(r'WHERE\s+(.*?)(?:GROUP BY|ORDER BY|;|$)', query, re.IGNORECASE | re.DOTALL)
-    if where_match:
-        where_clause = where_match.group(1)
-        for table in tables:
-            pattern = rf'\b{table[0]}\.(\w+)'
-            columns = re.findall(pattern, where_clause)
-            if columns:
-                if table not in payload:
-                    payload[table] = []
-                payload[table].extend(columns)
-                payload[table] = list(set(payload[table]))
-    
-    return payload
-
-def process_job_queries():
-    """Process all JOB query files and generate workload JSON."""
-    workload_entries = []
-    
-    # Get all .sql files
-    sql_files = sorted(glob.glob(os.path.join(JOB_QUERIES_DIR, "*.sql")))
-    
-    print(f"Found {len(sql_files)} JOB query files")
-    
-    for idx, sql_file in enumerate(sql_files, start=1):
-        with open(sql_file, 'r') as f:
-            query = f.read().strip()
-        
-        # Clean up the query - normalize whitespace
-        query = re.sub(r'\s+', ' ', query)
-        
-        # Extract metadata
-        tables = extract_tables_from_query(query)
-        predicates = extract_predicates(query, tables)
-        payload = extract_payload(query, tables)
-        
-        entry = {
-            "id": idx,
-            "query_string": query,
-            "predicates": predicates,
-            "payload": payload,
-            "group_by": {},
-            "order_by": {}
-        }
-        
-        workload_entries.append(entry)
-        
-        if idx <= 5:  # Print first 5 for verification
-            print(f"\nQuery {idx} ({os.path.basename(sql_file)}):")
-            print(f"  Tables: {tables}")
-            print(f"  Predicates: {predicates}")
-    
-    # Write to output file
-    output_path = os.path.join("/home/qihan/DBABandits", OUTPUT_FILE)
+    import database.sql_connection as sql_connection
+    import database.sql_helper as sql_helper
+
+    connection = sql_connection.get_sql_connection()
+    try:
+        table_columns, _ = sql_helper.get_all_columns(connection)
+    finally:
+        sql_connection.close_sql_connection(connection)
+    return table_columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries-dir', help=f'directory of .sql query files (default {JOB_QUERIES_DIR} when no '
+                                              f'other source is given)')
+    parser.add_argument('--log', nargs='*', default=[], help='SQL log files, statements separated by semicolons')
+    parser.add_argument('--workload', help='existing workload file, its query ids and strings are kept')
+    parser.add_argument('--output', default=OUTPUT_FILE, help='workload file to write')
+    parser.add_argument('--schema', action='store_true',
+                        help='resolve unqualified columns with the tables of the database configured in db.conf')
+    parser.add_argument('--workers', type=int, default=None, help='parser processes, defaults to the CPU count')
+    args = parser.parse_args()
+
+    queries_dir = args.queries_dir or (None if args.log or args.workload else JOB_QUERIES_DIR)
+    queries = read_queries(queries_dir, args.log, args.workload)
+    query_parser = sql_parser.QueryParser(get_table_columns() if args.schema else None)
+    start = time.perf_counter()
+    query_structures = query_parser.analyse_all([query_string for _, query_string in queries], args.workers)
+    print(f"Parsed {len(query_parser.cache)} templates of {len(queries)} queries in "
+          f"{time.perf_counter() - start:.2f} s")
+
+    output_path = args.output if os.path.isabs(args.output) else os.path.join(constants.ROOT_DIR, args.output)
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
+    without_predicates = 0
     with open(output_path, 'w') as f:
-        for entry in workload_entries:
-            f.write(json.dumps(entry) + '\n')
-    
-    print(f"\n✅ Successfully created workload file: {output_path}")
-    print(f"   Total queries: {len(workload_entries)}")
-    
-    return len(workload_entries)
+        for (query_id, query_string), structures in zip(queries, query_structures):
+            f.write(json.dumps(sql_parser.get_workload_entry(query_id, query_string, structures)) + '\n')
+            without_predicates += not structures['predicates']
+    print(f"Created workload file: {output_path}")
+    print(f"   Total queries: {len(queries)}, without predicates: {without_predicates}")
+    return len(queries)
+
 
 if __name__ == "__main__":
-    num_queries = process_job_queries()
-    print(f"\nYou can now run the experiment with all {num_queries} JOB queries!")
+    num_queries = main()
+    print(f"\nYou can now run the experiment with all {num_queries} queries!")
     print("Don't forget to update exp.conf with appropriate rounds and query ranges.")
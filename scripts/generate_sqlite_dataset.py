@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Script to build a scaled-down synthetic IMDB (JOB schema) database in SQLite, for running the bandit with
+db_type = SQLITE without a database server.
+
+Row counts are the IMDB row counts times the scale factor. Text columns are filled with random strings mixed with
+the literals the workload compares them to, so the workload predicates select some rows.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+
+DEFAULT_OUTPUT = "resources/sqlite/imdb_small.db"
+DEFAULT_WORKLOAD = "resources/workloads/job_all_queries.json"
+
+# JOB schema: table -> (IMDB row count, [(column, type)]). The first column is the primary key.
+SCHEMA = {
+    "aka_name": (901343, [("id", "INTEGER"), ("person_id", "INTEGER"), ("name", "TEXT"), ("imdb_index", "TEXT"),
+                          ("name_pcode_cf", "TEXT"), ("name_pcode_nf", "TEXT"), ("surname_pcode", "TEXT"),
+                          ("md5sum", "TEXT")]),
+    "aka_title": (361472, [("id", "INTEGER"), ("movie_id", "INTEGER"), ("title", "TEXT"), ("imdb_index", "TEXT"),
+                           ("kind_id", "INTEGER"), ("production_year", "INTEGER"), ("phonetic_code", "TEXT"),
+                           ("episode_of_id", "INTEGER"), ("season_nr", "INTEGER"), ("episode_nr", "INTEGER"),
+                           ("note", "TEXT"), ("md5sum", "TEXT")]),
+    "cast_info": (36244344, [("id", "INTEGER"), ("person_id", "INTEGER"), ("movie_id", "INTEGER"),
+                             ("person_role_id", "INTEGER"), ("note", "TEXT"), ("nr_order", "INTEGER"),
+                             ("role_id", "INTEGER")]),
+    "char_name": (3140339, [("id", "INTEGER"), ("name", "TEXT"), ("imdb_index", "TEXT"), ("imdb_id", "INTEGER"),
+                            ("name_pcode_nf", "TEXT"), ("surname_pcode", "TEXT"), ("md5sum", "TEXT")]),
+    "comp_cast_type": (4, [("id", "INTEGER"), ("kind", "TEXT")]),
+    "company_name": (234997, [("id", "INTEGER"), ("name", "TEXT"), ("country_code", "TEXT"), ("imdb_id", "INTEGER"),
+                              ("name_pcode_nf", "TEXT"), ("name_pcode_sf", "TEXT"), ("md5sum", "TEXT")]),
+    "company_type": (4, [("id", "INTEGER"), ("kind", "TEXT")]),
+    "complete_cast": (135086, [("id", "INTEGER"), ("movie_id", "INTEGER"), ("subject_id", "INTEGER"),
+                               ("status_id", "INTEGER")]),
+    "info_type": (113, [("id", "INTEGER"), ("info", "TEXT")]),
+    "keyword": (134170, [("id", "INTEGER"), ("keyword", "TEXT"), ("phonetic_code", "TEXT")]),
+    "kind_type": (7, [("id", "INTEGER"), ("kind", "TEXT")]),
+    "link_type": (18, [("id", "INTEGER"), ("link", "TEXT")]),
+    "movie_companies": (2609129, [("id", "INTEGER"), ("movie_id", "INTEGER"), ("company_id", "INTEGER"),
+                                  ("company_type_id", "INTEGER"), ("note", "TEXT")]),
+    "movie_info": (14835720, [("id", "INTEGER"), ("movie_id", "INTEGER"), ("info_type_id", "INTEGER"),
+                              ("info", "TEXT"), ("note", "TEXT")]),
+    "movie_info_idx": (1380035, [("id", "INTEGER"), ("movie_id", "INTEGER"), ("info_type_id", "INTEGER"),
+                                 ("info", "TEXT"), ("note", "TEXT")]),
+    "movie_keyword": (4523930, [("id", "INTEGER"), ("movie_id", "INTEGER"), ("keyword_id", "INTEGER")]),
+    "movie_link": (29997, [("id", "INTEGER"), ("movie_id", "INTEGER"), ("linked_movie_id", "INTEGER"),
+                           ("link_type_id", "INTEGER")]),
+    "name": (4167491, [("id", "INTEGER"), ("name", "TEXT"), ("imdb_index", "TEXT"), ("imdb_id", "INTEGER"),
+                       ("gender", "TEXT"), ("name_pcode_cf", "TEXT"), ("name_pcode_nf", "TEXT"),
+                       ("surname_pcode", "TEXT"), ("md5sum", "TEXT")]),
+    "person_info": (2963664, [("id", "INTEGER"), ("person_id", "INTEGER"), ("info_type_id", "INTEGER"),
+                              ("info", "TEXT"), ("note", "TEXT")]),
+    "role_type": (12, [("id", "INTEGER"), ("role", "TEXT")]),
+    "title": (2528312, [("id", "INTEGER"), ("title", "TEXT"), ("imdb_index", "TEXT"), ("kind_id", "INTEGER"),
+                        ("production_year", "INTEGER"), ("imdb_id", "INTEGER"), ("phonetic_code", "TEXT"),
+                        ("episode_of_id", "INTEGER"), ("season_nr", "INTEGER"), ("episode_nr", "INTEGER"),
+                        ("series_years", "TEXT"), ("md5sum", "TEXT")]),
+}
+
+# Foreign key column -> referenced table
+REFERENCES = {
+    "person_id": "name", "movie_id": "title", "linked_movie_id": "title", "episode_of_id": "title",
+    "person_role_id": "char_name", "role_id": "role_type", "company_id": "company_name",
+    "company_type_id": "company_type", "info_type_id": "info_type", "keyword_id": "keyword", "kind_id": "kind_type",
+    "link_type_id": "link_type", "subject_id": "comp_cast_type", "status_id": "comp_cast_type",
+}
+
+# Tables below this size are not scaled (lookup tables such as info_type and kind_type)
+MIN_SCALED_ROWS = 200
+# Share of the rows of a text column that take one of the workload literals
+LITERAL_SHARE = 0.3
+INSERT_BATCH = 10000
+
+
+def harvest_literals(workload_file):
+    """
+    Collects the string literals the workload compares each column to
+
+    :param workload_file: workload in the JSON lines format
+    :return: dictionary of (table, column) -> list of literals
+    """
+    literals = {}
+    comparison = re.compile(r"(\w+)\.(\w+)\s+(?:NOT\s+)?(?:=|LIKE|ILIKE|IN)\s*(\([^)]*\)|'[^']*')", re.IGNORECASE)
+    alias_pattern = re.compile(r"(\w+)\s+AS\s+(\w+)", re.IGNORECASE)
+    with open(workload_file) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            query = json.loads(line)['query_string']
+            aliases = {alias: table for table, alias in alias_pattern.findall(query) if table in SCHEMA}
+            for alias, column, value in comparison.findall(query):
+                table = aliases.get(alias, alias)
+                if table not in SCHEMA:
+                    continue
+                for literal in re.findall(r"'([^']*)'", value):
+                    literal = literal.replace('%', '')
+                    if literal:
+                        literals.setdefault((table, column), []).append(literal)
+    return literals
+
+
+def row_counts(scale):
+    return {table: rows if rows < MIN_SCALED_ROWS else max(MIN_SCALED_ROWS, int(rows * scale))
+            for table, (rows, _) in SCHEMA.items()}
+
+
+def generate_value(rng, table, column, column_type, counts, literals):
+    if column in REFERENCES:
+        return rng.randint(1, counts[REFERENCES[column]])
+    if column_type == "INTEGER":
+        if column == "production_year":
+            return rng.randint(1900, 2020)
+        return rng.randint(0, 1000)
+    column_literals = literals.get((table, column))
+    if column_literals and rng.random() < LITERAL_SHARE:
+        return rng.choice(column_literals)
+    if column == "md5sum":
+        return '%032x' % rng.getrandbits(128)
+    return '%s %d' % (column, rng.randint(0, counts[table]))
+
+
+def generate(output, scale, workload_file, seed):
+    rng = random.Random(seed)
+    literals = harvest_literals(workload_file)
+    counts = row_counts(scale)
+    if os.path.exists(output):
+        os.remove(output)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    connection = sqlite3.connect(output)
+    for table, (_, columns) in SCHEMA.items():
+        start = time.perf_counter()
+        column_defs = ', '.join('%s %s%s' % (name, column_type, ' PRIMARY KEY' if i == 0 else '')
+                                for i, (name, column_type) in enumerate(columns))
+        connection.execute('CREATE TABLE %s (%s)' % (table, column_defs))
+        insert = 'INSERT INTO %s VALUES (%s)' % (table, ', '.join('?' * len(columns)))
+        batch = []
+        for row_id in range(1, counts[table] + 1):
+            batch.append([row_id] + [generate_value(rng, table, name, column_type, counts, literals)
+                                     for name, column_type in columns[1:]])
+            if len(batch) == INSERT_BATCH:
+                connection.executemany(insert, batch)
+                batch = []
+        if batch:
+            connection.executemany(insert, batch)
+        connection.commit()
+        print(f"  {table}: {counts[table]} rows ({time.perf_counter() - start:.1f}s)")
+    connection.execute('ANALYZE')
+    connection.commit()
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='SQLite database file to create')
+    parser.add_argument('--scale', type=float, default=0.001, help='fraction of the IMDB row counts')
+    parser.add_argument('--workload', default=DEFAULT_WORKLOAD, help='workload used to pick the literal values')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    output = args.output if os.path.isabs(args.output) else os.path.join(constants.ROOT_DIR, args.output)
+    workload = args.workload if os.path.isabs(args.workload) else os.path.join(constants.ROOT_DIR, args.workload)
+    print(f"Generating {output} at scale {args.scale}")
+    generate(output, args.scale, workload, args.seed)
+    print(f"\n✅ Successfully created SQLite database: {output}")
+    print("Set db_type = SQLITE in config/db.conf to run the bandit against it.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Checkpoints of the simulator state, so a failed experiment can continue from its last completed round.
+
+Checkpoints are pickled with the highest protocol (numpy arrays are stored as raw buffers) and written atomically: the
+state goes to a temporary file that replaces the checkpoint only once it is complete, so a crash while writing leaves
+the previous checkpoint intact.
+"""
+import logging
+import os
+import pickle
+
+
+def save_checkpoint(path, state):
+    """
+    :param path: checkpoint file
+    :param state: picklable dictionary with the simulator state
+    """
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as checkpoint_file:
+        pickle.dump(state, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temporary_path, path)
+    logging.info(f"Checkpoint of round {state.get('round')} written to {path}")
+
+
+def load_checkpoint(path):
+    """
+    :param path: checkpoint file
+    :return: saved state, None if there is no checkpoint
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as checkpoint_file:
+        return pickle.load(checkpoint_file)
+
+
+def remove_checkpoint(path):
+    if os.path.exists(path):
+        os.remove(path)
@@ -1,5 +1,6 @@
 import configparser
 import json
+import os
 
 import constants as constants
 
@@ -7,8 +8,12 @@ import constants as constants
 exp_config = configparser.ConfigParser()
 exp_config.read(constants.EXPERIMENT_CONFIG)
 
-# experiment id for the current run
-experiment_id = exp_config['general']['run_experiment']
+# experiment id for the current run, the environment can select another experiment and override its settings
+experiment_id = os.environ.get(constants.ENV_EXPERIMENT_ID) or exp_config['general']['run_experiment']
+if os.environ.get(constants.ENV_EXPERIMENT_OVERRIDES):
+    exp_config.read_dict({experiment_id: {key: value if isinstance(value, str) else json.dumps(value)
+                                          for key, value in
+                                          json.loads(os.environ[constants.ENV_EXPERIMENT_OVERRIDES]).items()}})
 
 # information about experiment
 reps = int(exp_config[experiment_id]['reps'])
@@ -32,3 +37,46 @@ max_memory = int(exp_config[experiment_id]['max_memory'])
 # hyper parameters
 input_alpha = float(exp_config[experiment_id]['input_alpha'])
 input_lambda = float(exp_config[experiment_id]['input_lambda'])
+
+# profiling (optional, see shared/profiling.py)
+profile_rounds = json.loads(exp_config[experiment_id].get('profile_rounds', '[]'))
+trace_memory = exp_config[experiment_id].getboolean('trace_memory', fallback=False)
+trace_memory_top = exp_config[experiment_id].getint('trace_memory_top', fallback=20)
+
+# checkpoints (optional), rounds between checkpoints of the simulator state, 0 to disable
+checkpoint_interval = exp_config[experiment_id].getint('checkpoint_interval', fallback=0)
+resume = exp_config[experiment_id].getboolean('resume', fallback=False)
+
+# query store (optional), evict the queries that left the window to a spill file in the experiment folder
+evict_expired_queries = exp_config[experiment_id].getboolean('evict_expired_queries', fallback=False)
+
+# query store (optional), literal variants of a query template share one query object
+share_query_templates = exp_config[experiment_id].getboolean('share_query_templates', fallback=False)
+
+# prepare the next round while the queries of the current round execute (optional, C3UCB simulator)
+prefetch_next_round = exp_config[experiment_id].getboolean('prefetch_next_round', fallback=False)
+
+# execute a sample of the queries of each round and estimate the rest (optional, C3UCB simulator)
+sample_queries = exp_config[experiment_id].getboolean('sample_queries', fallback=False)
+sample_target_error = exp_config[experiment_id].getfloat('sample_target_error', fallback=0.05)
+sample_min_fraction = exp_config[experiment_id].getfloat('sample_min_fraction', fallback=0.1)
+sample_seed = exp_config[experiment_id].getint('sample_seed', fallback=0)
+
+# read the queries of each round from a PostgreSQL server log, csvlog or jsonlog, instead of the workload file
+# (optional, C3UCB simulator)
+workload_stream = exp_config[experiment_id].get('workload_stream', fallback='').strip().lower()
+stream_log_file = exp_config[experiment_id].get('stream_log_file', fallback='')
+stream_batch_size = exp_config[experiment_id].getint('stream_batch_size', fallback=100)
+stream_batch_seconds = exp_config[experiment_id].getfloat('stream_batch_seconds', fallback=0.0)
+stream_buffer_size = exp_config[experiment_id].getint('stream_buffer_size', fallback=10000)
+stream_follow = exp_config[experiment_id].getboolean('stream_follow', fallback=True)
+
+# derive the rewards from the statistics of the live traffic instead of executing the queries (optional, C3UCB
+# simulator, PostgreSQL with pg_stat_statements)
+passive_feedback = exp_config[experiment_id].getboolean('passive_feedback', fallback=False)
+passive_round_seconds = exp_config[experiment_id].getfloat('passive_round_seconds', fallback=60.0)
+
+# baseline runners (optional), execute representatives of the query templates of a round and extrapolate the cost
+compress_workload = exp_config[experiment_id].getboolean('compress_workload', fallback=False)
+compression_plan_shape = exp_config[experiment_id].getboolean('compression_plan_shape', fallback=True)
+compression_representatives = exp_config[experiment_id].getint('compression_representatives', fallback=1)
@@ -0,0 +1,35 @@
+"""
+Fingerprints of query templates: queries that differ only in their literals get the same fingerprint.
+
+The query text is normalised by replacing string and numeric literals, and the $n parameters of the statements
+normalised by pg_stat_statements, with '?', collapsing IN lists to a single '?', lower casing and collapsing
+whitespace. The fingerprint is a 64 bit hash of the normalised text.
+"""
+import hashlib
+import re
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PARAMETER = re.compile(r"\$\d+")
+_NUMERIC_LITERAL = re.compile(r"(?<![\w.])[-+]?\d+(?:\.\d+)?(?:e[-+]?\d+)?(?![\w.])", re.IGNORECASE)
+_IN_LIST = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query_string):
+    """
+    :param query_string: SQL text
+    :return: text of the query template
+    """
+    template = _STRING_LITERAL.sub('?', query_string)
+    template = _PARAMETER.sub('?', template)
+    template = _NUMERIC_LITERAL.sub('?', template)
+    template = _WHITESPACE.sub(' ', template).strip().rstrip(';').strip().lower()
+    return _IN_LIST.sub('in (?)', template)
+
+
+def fingerprint(query_string):
+    """
+    :param query_string: SQL text
+    :return: 64 bit fingerprint of the query template
+    """
+    return int.from_bytes(hashlib.blake2b(normalize_query(query_string).encode(), digest_size=8).digest(), 'little')
@@ -1,6 +1,7 @@
 import configparser
 import json
 import os
+import shutil
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -60,6 +61,22 @@ def get_experiment_folder_path(experiment_id):
     return experiment_folder_path
 
 
+def get_results_folder_path(experiment_id, component_id, keep=False):
+    """
+    Get a fresh folder for the results sink parts of a component, results of earlier runs are removed
+
+    :param experiment_id: name of the experiment
+    :param component_id: id of the component (report)
+    :param keep: keep the results of earlier runs, for a run that resumes them
+    :return: folder path as string
+    """
+    results_folder_path = os.path.join(get_experiment_folder_path(experiment_id), 'results', component_id)
+    if not keep:
+        shutil.rmtree(results_folder_path, ignore_errors=True)
+    os.makedirs(results_folder_path, exist_ok=True)
+    return results_folder_path
+
+
 def get_workload_folder_path(experiment_id):
     """
     Get the folder location of the experiment
@@ -108,21 +125,19 @@ def plot_moving_average(statistic_dict, window_size, title, experiment_id):
 
 def get_queries_v2():
     """
-    Read all the queries in the queries pointed by the QUERY_DICT_FILE constant
-    :return: list of queries
+    Read all the queries in the workload file of the current experiment
+    :return: list of queries, or a lazily read sequence of them for a compiled workload (shared/workload_compiler.py)
     """
-    # Reading the configuration for given experiment ID
-    exp_config = configparser.ConfigParser()
-    exp_config.read(constants.EXPERIMENT_CONFIG)
-
-    # experiment id for the current run
-    experiment_id = exp_config['general']['run_experiment']
-    workload_file = str(exp_config[experiment_id]['workload_file'])
+    # The experiment settings, including the overrides given through the environment
+    from shared import configs_v2 as configs
+    from shared import workload_compiler
 
     queries = []
-    workload_path = workload_file
+    workload_path = configs.workload_file
     if not os.path.isabs(workload_path):
         workload_path = os.path.join(constants.ROOT_DIR, workload_path)
+    if workload_path.endswith(workload_compiler.COMPILED_WORKLOAD_SUFFIX):
+        return workload_compiler.CompiledWorkload(workload_path)
     with open(workload_path) as f:
         line = f.readline()
         while line:
@@ -180,8 +195,7 @@ def plot_exp_report(exp_id, exp_report_list, measurement_names, log_y=False):
         comps = []
         final_df = DataFrame()
         for exp_report in exp_report_list:
-            df = exp_report.data
-            df[constants.DF_COL_COMP_ID] = exp_report.component_id
+            df = exp_report.data.assign(**{constants.DF_COL_COMP_ID: exp_report.component_id})
             final_df = pd.concat([final_df, df])
             comps.append(exp_report.component_id)
 
@@ -0,0 +1,109 @@
+"""
+Opt-in profiling of the simulator rounds, switched on from the experiment config (shared/configs_v2.py):
+
+    profile_rounds = [5, 10]    cProfile rounds 5 to 9 (round numbers as logged, 'round: t')
+    trace_memory = True         tracemalloc snapshot at every round boundary
+    trace_memory_top = 20       allocation sites reported per round
+
+The cProfile stats of the range are written to <prefix>_profile_rounds_<start>-<end>.prof (load with pstats or
+snakeviz) with a text summary next to it. The memory report <prefix>_memory.txt lists, for every round, the
+allocation sites that grew the most since the previous round boundary, which makes the growth of the arm store,
+the query store and the scan histories visible.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import tracemalloc
+
+# Rows of the text summary of the cProfile stats
+PROFILE_SUMMARY_ROWS = 50
+# Allocations of the profiling itself are left out of the memory report
+_SNAPSHOT_FILTERS = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, pstats.__file__),
+                     tracemalloc.Filter(False, cProfile.__file__))
+
+
+class RoundProfiler:
+
+    def __init__(self, folder_path, file_prefix, profile_rounds=(), trace_memory=False, trace_memory_top=20):
+        """
+        :param folder_path: folder the reports are written to (the experiment folder)
+        :param file_prefix: prefix of the report files, e.g. the simulator name
+        :param profile_rounds: [start, end) range of rounds to run under cProfile, empty to disable
+        :param trace_memory: take a tracemalloc snapshot at every round boundary
+        :param trace_memory_top: number of allocation sites reported per round
+        """
+        self.folder_path = folder_path
+        self.file_prefix = file_prefix
+        self.profile_start, self.profile_end = profile_rounds if profile_rounds else (None, None)
+        self.trace_memory = trace_memory
+        self.trace_memory_top = trace_memory_top
+        self.profiler = None
+        self.last_snapshot = None
+        self.memory_report = None
+        self.started_tracemalloc = False
+
+    @classmethod
+    def from_configs(cls, configs, folder_path, file_prefix):
+        """
+        :param configs: shared.configs_v2 module
+        """
+        return cls(folder_path, file_prefix, configs.profile_rounds, configs.trace_memory, configs.trace_memory_top)
+
+    def _path(self, suffix):
+        return os.path.join(self.folder_path, f"{self.file_prefix}_{suffix}")
+
+    def start_round(self, round_number):
+        if self.trace_memory and self.last_snapshot is None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracemalloc = True
+            self.memory_report = open(self._path('memory.txt'), 'w')
+            self.last_snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        if round_number == self.profile_start:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def end_round(self, round_number):
+        if self.profiler is not None:
+            # the snapshots are not part of the profiled work
+            self.profiler.disable()
+        if self.trace_memory:
+            snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+            current, peak = tracemalloc.get_traced_memory()
+            self.memory_report.write(f"round: {round_number}, traced: {current / 1024 / 1024:.2f}MB, "
+                                     f"peak: {peak / 1024 / 1024:.2f}MB\n")
+            for stat in snapshot.compare_to(self.last_snapshot, 'lineno')[:self.trace_memory_top]:
+                self.memory_report.write(f"    {stat}\n")
+            self.memory_report.flush()
+            tracemalloc.reset_peak()
+            self.last_snapshot = snapshot
+        if self.profiler is not None:
+            if round_number + 1 >= self.profile_end:
+                self._dump_profile()
+            else:
+                self.profiler.enable()
+
+    def _dump_profile(self):
+        self.profiler.disable()
+        stats_path = self._path(f"profile_rounds_{self.profile_start}-{self.profile_end}.prof")
+        self.profiler.dump_stats(stats_path)
+        summary = io.StringIO()
+        pstats.Stats(self.profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_SUMMARY_ROWS)
+        with open(stats_path[:-len('.prof')] + '.txt', 'w') as summary_file:
+            summary_file.write(summary.getvalue())
+        logging.info(f"Profile of rounds {self.profile_start} to {self.profile_end - 1} written to {stats_path}")
+        self.profiler = None
+
+    def close(self):
+        """Writes the reports of a run that ended inside the profiled range and stops tracing"""
+        if self.profiler is not None:
+            self._dump_profile()
+        if self.memory_report is not None:
+            self.memory_report.close()
+            self.memory_report = None
+            self.last_snapshot = None
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
@@ -0,0 +1,126 @@
+"""
+Append-only storage of the measurements of an experiment, written round by round so a crashed run keeps the rounds it
+finished.
+
+Every run (component and repetition) writes its own part file in the folder of its report: an Arrow IPC stream with a
+record batch per round when pyarrow is installed, a CSV file otherwise. Each round is flushed to disk as soon as it is
+appended. read_results reads all the parts of a folder back into one DataFrame, ignoring the unfinished batch a crash
+may leave at the end of a part.
+"""
+import glob
+import os
+
+import pandas as pd
+from pandas import DataFrame
+
+import constants
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # pragma: no cover - optional, CSV parts are written without it
+    pyarrow = None
+
+ARROW_SUFFIX = '.arrows'
+CSV_SUFFIX = '.csv'
+RESULT_COLUMNS = [constants.DF_COL_BATCH, constants.DF_COL_MEASURE_NAME, constants.DF_COL_MEASURE_VALUE,
+                  constants.DF_COL_REP]
+
+if pyarrow is not None:
+    _ARROW_SCHEMA = pyarrow.schema([(constants.DF_COL_BATCH, pyarrow.int64()),
+                                    (constants.DF_COL_MEASURE_NAME, pyarrow.string()),
+                                    (constants.DF_COL_MEASURE_VALUE, pyarrow.float64()),
+                                    (constants.DF_COL_REP, pyarrow.int64())])
+
+
+class ResultsSink:
+    """Writes the [batch, measure, value] rows of one run to a part file"""
+
+    def __init__(self, folder_path, part_name, rep):
+        """
+        :param folder_path: folder of the parts of a report
+        :param part_name: name of the part file, without suffix (one part per run)
+        :param rep: repetition number written with every row
+        """
+        os.makedirs(folder_path, exist_ok=True)
+        self.rep = rep
+        self.writer = None
+        if pyarrow is not None:
+            self.path = os.path.join(folder_path, part_name + ARROW_SUFFIX)
+            self.file = open(self.path, 'wb')
+            self.writer = pyarrow.ipc.new_stream(self.file, _ARROW_SCHEMA)
+        else:
+            self.path = os.path.join(folder_path, part_name + CSV_SUFFIX)
+            self.file = open(self.path, 'w', newline='')
+            DataFrame(columns=RESULT_COLUMNS).to_csv(self.file, index=False)
+            self.file.flush()
+
+    def append(self, rows):
+        """
+        :param rows: list of [batch, measure name, value] rows, usually the measures of one round
+        """
+        if not rows:
+            return
+        batches = [int(row[0]) for row in rows]
+        measures = [str(row[1]) for row in rows]
+        values = [float(row[2]) for row in rows]
+        if self.writer is not None:
+            self.writer.write_batch(pyarrow.record_batch(
+                [batches, measures, values, [self.rep] * len(rows)], schema=_ARROW_SCHEMA))
+        else:
+            DataFrame({constants.DF_COL_BATCH: batches, constants.DF_COL_MEASURE_NAME: measures,
+                       constants.DF_COL_MEASURE_VALUE: values, constants.DF_COL_REP: self.rep}).to_csv(
+                self.file, header=False, index=False)
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.writer is not None:
+            self.writer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def _read_arrow_part(path):
+    batches = []
+    with open(path, 'rb') as part_file:
+        try:
+            reader = pyarrow.ipc.open_stream(part_file)
+            while True:
+                batches.append(reader.read_next_batch())
+        except StopIteration:
+            pass
+        except (pyarrow.ArrowInvalid, OSError):
+            # an interrupted run leaves an empty or truncated stream, keep the complete batches
+            pass
+    if not batches:
+        return DataFrame(columns=RESULT_COLUMNS)
+    return pyarrow.Table.from_batches(batches).to_pandas()
+
+
+def read_results(folder_path):
+    """
+    :param folder_path: folder of the parts of a report
+    :return: DataFrame with the rows of all the parts (RESULT_COLUMNS)
+    """
+    frames = []
+    for path in sorted(glob.glob(os.path.join(folder_path, '*' + CSV_SUFFIX))):
+        # a line cut short by a crash has missing fields
+        frames.append(pd.read_csv(path, on_bad_lines='skip').dropna(
+            subset=[constants.DF_COL_MEASURE_VALUE, constants.DF_COL_REP]))
+    arrow_paths = sorted(glob.glob(os.path.join(folder_path, '*' + ARROW_SUFFIX)))
+    if arrow_paths and pyarrow is None:
+        raise ImportError(f"pyarrow is required to read the results in {folder_path}")
+    for path in arrow_paths:
+        frames.append(_read_arrow_part(path))
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return DataFrame(columns=RESULT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
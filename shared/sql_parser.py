@@ -0,0 +1,544 @@
+"""
+SQL front end that derives the workload structures of a query (predicates, payload, group by and order by columns per
+table) from its text, for turning query logs into workload files (see scripts/generate_job_workload.py).
+
+The query is tokenised and split into query blocks (the statement, its subqueries, CTEs and UNION branches). Table
+aliases are resolved per block, and outer blocks for correlated subqueries. In WHERE and JOIN ... ON conditions a
+conjunct that compares columns of two different table references is a join, its columns are join columns, the columns
+of the other conjuncts are filter columns. The predicates of a table are its filter columns followed by its join
+columns. The payload holds the columns used in the select list, GROUP BY, HAVING and ORDER BY.
+
+Columns without a table qualifier are resolved with the table columns of the database when they are given, otherwise
+only in blocks that read a single table. Queries that differ only in their literals share a template fingerprint
+(shared/fingerprint.py) and are analysed once.
+"""
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from shared import fingerprint
+
+_TOKEN = re.compile(r"""
+      (?P<space>\s+|--[^\n]*|/\*.*?\*/)
+    | (?P<string>[eEnN]?'(?:[^']|'')*')
+    | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+    | (?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)
+    | (?P<name>[^\W\d]\w*)
+    | (?P<param>\$\d+|%s|%\(\w+\)s|\?|:\w+)
+    | (?P<op>::|<>|!=|<=|>=|\|\||[-+*/%=<>~!^&|])
+    | (?P<punct>[(),.;])
+    | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+# keywords that start a clause of a query block
+_CLAUSES = {'select': 'select', 'from': 'from', 'where': 'where', 'group': 'group', 'having': 'having',
+            'order': 'order', 'limit': 'other', 'offset': 'other', 'fetch': 'other', 'for': 'other',
+            'window': 'other', 'returning': 'other', 'with': 'with', 'update': 'from', 'set': 'other',
+            'delete': 'other', 'insert': 'other', 'values': 'other'}
+_SET_OPERATIONS = {'union', 'intersect', 'except', 'minus'}
+_JOINS = {'join', 'inner', 'left', 'right', 'full', 'outer', 'cross', 'natural', 'straight_join'}
+_COMPARISONS = {'=', '<', '>', '<=', '>=', '<>', '!='}
+# words that are not column references when they appear unqualified
+_RESERVED = {
+    'all', 'and', 'any', 'array', 'as', 'asc', 'at', 'between', 'both', 'by', 'case', 'cast', 'collate', 'cross',
+    'current', 'current_date', 'current_time', 'current_timestamp', 'date', 'day', 'dd', 'default', 'desc',
+    'distinct', 'else', 'end', 'epoch', 'escape', 'except', 'exists', 'extract', 'false', 'filter', 'first',
+    'following', 'for', 'from', 'full', 'group', 'having', 'hh', 'hour', 'ilike', 'in', 'inner', 'intersect',
+    'interval', 'into', 'is', 'isnull', 'join', 'last', 'lateral', 'leading', 'left', 'like', 'limit', 'materialized',
+    'minute', 'mm', 'month', 'natural', 'not', 'notnull', 'null', 'nulls', 'offset', 'on', 'only', 'or', 'order',
+    'outer', 'over', 'partition', 'preceding', 'quarter', 'range', 'recursive', 'regexp', 'right', 'row', 'rows',
+    'second', 'select', 'similar', 'some', 'then', 'ties', 'time', 'timestamp', 'to', 'top', 'trailing', 'true',
+    'unbounded', 'union', 'unknown', 'using', 'week', 'when', 'where', 'window', 'with', 'within', 'year', 'yy',
+    'yyyy', 'zone'}
+# placeholder for a subquery in the tokens of its parent block
+_SUBQUERY = ('subquery', None, 0, 0)
+
+
+def tokenize(query_string):
+    """
+    :param query_string: SQL text
+    :return: list of (kind, value, start, end) tokens without whitespace and comments. Unquoted names are lower
+        cased, quoted names keep their case
+    """
+    tokens = []
+    for match in _TOKEN.finditer(query_string):
+        kind = match.lastgroup
+        if kind == 'space':
+            continue
+        value = match.group()
+        if kind == 'name':
+            value = value.lower()
+        elif kind == 'quoted':
+            kind, value = 'name', value[1:-1].replace('""', '"')
+        tokens.append((kind, value, match.start(), match.end()))
+    return tokens
+
+
+def split_statements(text):
+    """
+    :param text: SQL text of one or more statements separated by semicolons
+    :return: list of the statement texts
+    """
+    statements = []
+    start = None
+    for kind, value, token_start, token_end in tokenize(text):
+        if kind == 'punct' and value == ';':
+            if start is not None:
+                statements.append(text[start:token_start].strip())
+            start = None
+        elif start is None:
+            start = token_start
+    if start is not None:
+        statements.append(text[start:].strip())
+    return statements
+
+
+def _is_word(token, *words):
+    return token[0] == 'name' and token[1] in words
+
+
+def _is_punct(token, value):
+    return token[0] == 'punct' and token[1] == value
+
+
+class _Block:
+    """A query block: its clauses as token lists, the table references it defines and its parent block"""
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.clauses = {}       # clause -> list of token lists, subqueries replaced by _SUBQUERY
+        self.tables = {}        # alias (or table name) -> table name
+        self.derived = set()    # aliases of derived tables and CTEs, their columns are not table columns
+        self.ctes = set()
+        self.select_aliases = set()
+
+    def clause(self, name):
+        self.clauses.setdefault(name, []).append([])
+        return self.clauses[name][-1]
+
+    def is_cte(self, name):
+        block = self
+        while block is not None:
+            if name in block.ctes:
+                return True
+            block = block.parent
+        return False
+
+
+def _parse_blocks(tokens):
+    """
+    :return: list of the query blocks of a statement
+    """
+    blocks = []
+
+    def parse(i, parent):
+        block = _Block(parent)
+        blocks.append(block)
+        current = block.clause('other')
+        depth = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token[0] == 'punct' and token[1] == '(':
+                if i + 1 < len(tokens) and _is_word(tokens[i + 1], 'select', 'with', 'values'):
+                    i = parse(i + 1, block)
+                    current.append(_SUBQUERY)
+                else:
+                    depth += 1
+                    current.append(token)
+            elif token[0] == 'punct' and token[1] == ')':
+                if depth == 0:
+                    return i
+                depth -= 1
+                current.append(token)
+            elif depth == 0 and token[0] == 'punct' and token[1] == ';':
+                return i
+            elif depth == 0 and _is_word(token, *_SET_OPERATIONS):
+                block = _Block(parent)
+                blocks.append(block)
+                current = block.clause('other')
+            elif depth == 0 and token[0] == 'name' and token[1] in _CLAUSES:
+                current = block.clause(_CLAUSES[token[1]])
+                if token[1] in ('group', 'order') and i + 1 < len(tokens) and _is_word(tokens[i + 1], 'by'):
+                    i += 1
+            else:
+                current.append(token)
+            i += 1
+        return i
+
+    parse(0, None)
+    return blocks
+
+
+def _split(tokens, is_separator):
+    """
+    :return: token lists between the separators at parenthesis depth 0
+    """
+    parts = [[]]
+    depth = 0
+    for token in tokens:
+        if token[0] == 'punct' and token[1] in '()':
+            depth += 1 if token[1] == '(' else -1
+        if depth == 0 and is_separator(token):
+            parts.append([])
+        else:
+            parts[-1].append(token)
+    return [part for part in parts if part]
+
+
+def _read_from_clause(block, tokens):
+    """
+    Registers the table references of a FROM clause in the block
+
+    :return: (list of ON conditions, list of (left references, right reference, USING columns))
+    """
+    conditions = []
+    using_joins = []
+    references = []
+    item = []
+    depth = 0
+
+    def close_item():
+        if item:
+            references.append(_read_table_reference(block, item))
+            item.clear()
+
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token[0] == 'punct' and token[1] in '()':
+            depth += 1 if token[1] == '(' else -1
+        if depth == 0 and (_is_punct(token, ',') or _is_word(token, *_JOINS)):
+            close_item()
+        elif depth == 0 and _is_word(token, 'on', 'using'):
+            close_item()
+            condition = []
+            j = i + 1
+            condition_depth = 0
+            while j < len(tokens):
+                if tokens[j][0] == 'punct' and tokens[j][1] in '()':
+                    condition_depth += 1 if tokens[j][1] == '(' else -1
+                if condition_depth == 0 and (_is_punct(tokens[j], ',') or _is_word(tokens[j], *_JOINS)):
+                    break
+                condition.append(tokens[j])
+                j += 1
+            if token[1] == 'on':
+                conditions.append(condition)
+            else:
+                columns = [column[1] for column in condition if column[0] == 'name']
+                using_joins.append((list(references[:-1]), references[-1] if references else None, columns))
+            i = j
+            continue
+        else:
+            item.append(token)
+        i += 1
+    close_item()
+    return conditions, using_joins
+
+
+def _read_table_reference(block, item):
+    """
+    :param item: tokens of a table reference, e.g. schema.table AS t, or a subquery with its alias
+    :return: alias of the reference, None if it defines none
+    """
+    while item and _is_word(item[0], 'lateral', 'only'):
+        item = item[1:]
+    if not item:
+        return None
+    position = 0
+    table = None
+    if item[0] is _SUBQUERY:
+        position = 1
+    elif item[0][0] == 'name':
+        table = item[0][1]
+        position = 1
+        while position + 1 < len(item) and _is_punct(item[position], '.') and item[position + 1][0] == 'name':
+            table = item[position + 1][1]
+            position += 2
+        if position < len(item) and _is_punct(item[position], '('):
+            # a table function, its columns are not table columns
+            table = None
+            depth = 0
+            while position < len(item):
+                if item[position][0] == 'punct' and item[position][1] in '()':
+                    depth += 1 if item[position][1] == '(' else -1
+                position += 1
+                if depth == 0:
+                    break
+    else:
+        return None
+    if position < len(item) and _is_word(item[position], 'as'):
+        position += 1
+    alias = item[position][1] if position < len(item) and item[position][0] == 'name' else table
+    if alias is None:
+        return None
+    if table is None or block.is_cte(table):
+        block.derived.add(alias)
+    else:
+        block.tables[alias] = table
+    return alias
+
+
+def _select_alias(item):
+    """
+    :param item: tokens of a select list item
+    :return: (output column alias or None, tokens of the expression)
+    """
+    if len(item) > 1 and item[-1][0] == 'name' and not _is_punct(item[-2], '.'):
+        previous = item[-2]
+        if _is_word(previous, 'as'):
+            return item[-1][1], item[:-2]
+        if (previous[0] == 'name' and (previous[1] not in _RESERVED or previous[1] == 'end')) or \
+                _is_punct(previous, ')') or previous[0] in ('string', 'number'):
+            return item[-1][1], item[:-1]
+    return None, item
+
+
+def _column_references(tokens):
+    """
+    :param tokens: tokens of an expression or condition
+    :return: list of (qualifier or None, column) references
+    """
+    references = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token[0] != 'name':
+            i += 1
+            continue
+        parts = [token[1]]
+        j = i + 1
+        while j + 1 < len(tokens) and _is_punct(tokens[j], '.') and tokens[j + 1][0] == 'name':
+            parts.append(tokens[j + 1][1])
+            j += 2
+        if j + 1 < len(tokens) and _is_punct(tokens[j], '.'):
+            # qualifier.*
+            i = j + 2
+            continue
+        previous = tokens[i - 1] if i > 0 else None
+        following = tokens[j] if j < len(tokens) else None
+        is_function = following is not None and _is_punct(following, '(')
+        is_type = (previous is not None and (_is_word(previous, 'as') or previous[:2] == ('op', '::'))) or (
+                following is not None and following[0] == 'string')
+        if not is_function and not is_type:
+            if len(parts) > 1:
+                references.append((parts[-2], parts[-1]))
+            elif parts[0] not in _RESERVED:
+                references.append((None, parts[0]))
+        i = j
+    return references
+
+
+class QueryParser:
+    """Analyses queries against an optional schema, caching the results by template fingerprint"""
+
+    def __init__(self, table_columns=None):
+        """
+        :param table_columns: optional dictionary of table name -> column names (e.g. sql_helper.get_all_columns),
+            resolves unqualified columns and restricts the results to the tables and columns of the database
+        """
+        self.table_columns = table_columns
+        self._schema = None
+        if table_columns is not None:
+            self._schema = {table.lower(): (table, {column.lower(): column for column in columns})
+                            for table, columns in table_columns.items()}
+        self.cache = {}     # template fingerprint -> query structures
+
+    def analyse(self, query_string):
+        """
+        :param query_string: SQL text of one statement
+        :return: dictionary with the per table column lists 'predicates', 'payload', 'group_by', 'order_by', and
+            'filters' and 'joins' that make up the predicates. Queries of the same template share the dictionary,
+            it must not be modified
+        """
+        key = fingerprint.fingerprint(query_string)
+        if key not in self.cache:
+            self.cache[key] = self._analyse(query_string)
+        return self.cache[key]
+
+    def analyse_all(self, query_strings, workers=None):
+        """
+        Analyses a query log, the templates that are not cached yet are parsed in parallel worker processes
+
+        :param query_strings: list of SQL texts
+        :param workers: number of processes, defaults to the number of CPUs
+        :return: list of the analyse results, aligned with query_strings
+        """
+        keys = [fingerprint.fingerprint(query_string) for query_string in query_strings]
+        templates = {}
+        for key, query_string in zip(keys, query_strings):
+            if key not in self.cache and key not in templates:
+                templates[key] = query_string
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(templates) > 1:
+            chunk_size = max(1, len(templates) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=min(workers, len(templates)), initializer=_init_worker,
+                                     initargs=(self.table_columns,)) as executor:
+                results = executor.map(_analyse_in_worker, templates.values(), chunksize=chunk_size)
+                self.cache.update(zip(templates.keys(), results))
+        else:
+            for key, query_string in templates.items():
+                self.cache[key] = self._analyse(query_string)
+        logging.debug(f"Analysed {len(templates)} templates for {len(query_strings)} queries")
+        return [self.cache[key] for key in keys]
+
+    def _resolve(self, block, qualifier, column):
+        """
+        :return: (table, column, table reference) of a column reference, table and column are None for a column of a
+            derived table or CTE, None if the reference cannot be resolved
+        """
+        while block is not None:
+            if qualifier is not None:
+                if qualifier in block.tables:
+                    return self._table_column(block.tables[qualifier], column, (id(block), qualifier))
+                if qualifier in block.derived:
+                    return None, None, (id(block), qualifier)
+            elif block.tables or block.derived:
+                if self._schema is None:
+                    if len(block.tables) == 1 and not block.derived:
+                        alias, table = next(iter(block.tables.items()))
+                        return self._table_column(table, column, (id(block), alias))
+                    return None
+                for alias, table in block.tables.items():
+                    resolved = self._table_column(table, column, (id(block), alias))
+                    if resolved is not None:
+                        return resolved
+            block = block.parent
+        return None
+
+    def _table_column(self, table, column, reference):
+        if self._schema is None:
+            return table, column, reference
+        if table.lower() not in self._schema:
+            return None
+        table, columns = self._schema[table.lower()]
+        if column.lower() not in columns:
+            return None
+        return table, columns[column.lower()], reference
+
+    def _analyse(self, query_string):
+        filters = {}
+        joins = {}
+        payload = {}
+        group_by = {}
+        order_by = {}
+
+        def add(structure, resolved_columns):
+            for table, column, _ in resolved_columns:
+                if table is None:
+                    continue
+                table_columns = structure.setdefault(table, [])
+                if column not in table_columns:
+                    table_columns.append(column)
+
+        def is_comma(token):
+            return _is_punct(token, ',')
+
+        blocks = _parse_blocks(tokenize(query_string))
+        for block in blocks:
+            for tokens in block.clauses.get('with', []):
+                for cte in _split(tokens, is_comma):
+                    if _is_word(cte[0], 'recursive'):
+                        cte = cte[1:]
+                    if cte and cte[0][0] == 'name':
+                        block.ctes.add(cte[0][1])
+        conditions = {}     # block id -> WHERE and ON conditions of the block
+        for block in blocks:
+            conditions[id(block)] = list(block.clauses.get('where', []))
+            for tokens in block.clauses.get('from', []):
+                on_conditions, using_joins = _read_from_clause(block, tokens)
+                conditions[id(block)] += on_conditions
+                for left_aliases, right_alias, columns in using_joins:
+                    for column in columns:
+                        if right_alias in block.tables:
+                            add(joins, [resolved for resolved in (
+                                self._table_column(block.tables[right_alias], column, right_alias),)
+                                        if resolved is not None])
+                        # on the left the column belongs to the nearest reference that has it (any table without a
+                        # schema), the columns of derived tables are unknown
+                        for alias in reversed(left_aliases):
+                            if alias not in block.tables:
+                                break
+                            resolved = self._table_column(block.tables[alias], column, alias)
+                            if resolved is not None:
+                                add(joins, [resolved])
+                                break
+            for tokens in block.clauses.get('select', []):
+                for item in _split(tokens, is_comma):
+                    alias, _ = _select_alias(item)
+                    if alias is not None:
+                        block.select_aliases.add(alias)
+
+        for block in blocks:
+            def resolve(references, aliases=()):
+                resolved = []
+                for qualifier, column in references:
+                    if qualifier is None and column in aliases:
+                        continue
+                    resolved_column = self._resolve(block, qualifier, column)
+                    if resolved_column is not None:
+                        resolved.append(resolved_column)
+                return resolved
+
+            for condition in conditions[id(block)]:
+                between = [False]
+
+                def is_and(token):
+                    if _is_word(token, 'between'):
+                        between[0] = True
+                    elif _is_word(token, 'and'):
+                        if between[0]:
+                            between[0] = False
+                            return False
+                        return True
+                    return False
+
+                for conjunct in _split(condition, is_and):
+                    resolved = resolve(_column_references(conjunct))
+                    is_join = len({reference for _, _, reference in resolved}) > 1 and any(
+                        token[0] == 'op' and token[1] in _COMPARISONS for token in conjunct) and not any(
+                        _is_word(token, 'or') for token in conjunct)
+                    add(joins if is_join else filters, resolved)
+            for tokens in block.clauses.get('select', []):
+                for item in _split(tokens, is_comma):
+                    add(payload, resolve(_column_references(_select_alias(item)[1])))
+            for tokens in block.clauses.get('having', []):
+                add(payload, resolve(_column_references(tokens), block.select_aliases))
+            for tokens in block.clauses.get('group', []):
+                resolved = resolve(_column_references(tokens), block.select_aliases)
+                add(group_by, resolved)
+                add(payload, resolved)
+            for tokens in block.clauses.get('order', []):
+                resolved = resolve(_column_references(tokens), block.select_aliases)
+                add(order_by, resolved)
+                add(payload, resolved)
+
+        predicates = {table: list(columns) for table, columns in filters.items()}
+        for table, columns in joins.items():
+            predicates.setdefault(table, []).extend(column for column in columns if column not in predicates[table])
+        return {'predicates': predicates, 'payload': payload, 'group_by': group_by, 'order_by': order_by,
+                'filters': filters, 'joins': joins}
+
+
+def get_workload_entry(query_id, query_string, query_structures):
+    """
+    :param query_id: id of the query in the workload
+    :param query_string: SQL text
+    :param query_structures: result of QueryParser.analyse for the query
+    :return: workload file entry of the query
+    """
+    return {'id': query_id, 'query_string': query_string, 'predicates': query_structures['predicates'],
+            'payload': query_structures['payload'], 'group_by': query_structures['group_by'],
+            'order_by': query_structures['order_by']}
+
+
+_worker_parser = None
+
+
+def _init_worker(table_columns):
+    global _worker_parser
+    _worker_parser = QueryParser(table_columns)
+
+
+def _analyse_in_worker(query_string):
+    return _worker_parser._analyse(query_string)
@@ -0,0 +1,88 @@
+"""
+High resolution timing of the phases of a simulation round.
+
+The simulator activates a PhaseTimer for the run, and the code of each phase (including the database helpers and the
+bandit, which do not see the timer) wraps itself in ``timing.phase(name)``. Durations of the same phase add up until
+the timer is reset, so a phase can be entered many times per round (e.g. once per query). Without an active timer,
+``phase`` only costs the function call.
+"""
+import time
+from collections import defaultdict
+
+_active_timer = None
+
+
+class PhaseTimer:
+    """Accumulates perf_counter_ns spans per phase name"""
+
+    def __init__(self):
+        self.durations_ns = defaultdict(int)
+
+    def add(self, phase_name, duration_ns):
+        self.durations_ns[phase_name] += duration_ns
+
+    def seconds(self, phase_name):
+        return self.durations_ns.get(phase_name, 0) / 1e9
+
+    def reset(self):
+        self.durations_ns = defaultdict(int)
+
+    def get_results(self, round_number, phase_names):
+        """
+        :param round_number: round the measures belong to
+        :param phase_names: phases to report, phases that never ran are reported as 0
+        :return: [round, measure, seconds] rows in the format of the simulator results
+        """
+        return [[round_number, phase_name, self.seconds(phase_name)] for phase_name in phase_names]
+
+
+class _Span:
+    __slots__ = ('timer', 'phase_name', 'start')
+
+    def __init__(self, timer, phase_name):
+        self.timer = timer
+        self.phase_name = phase_name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.add(self.phase_name, time.perf_counter_ns() - self.start)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def set_active_timer(timer):
+    """
+    :param timer: PhaseTimer receiving the spans of timing.phase, None to stop timing
+    """
+    global _active_timer
+    _active_timer = timer
+
+
+def get_active_timer():
+    return _active_timer
+
+
+def phase(phase_name):
+    """
+    Context manager timing a block as part of the given phase of the active timer
+
+    :param phase_name: phase name, one of the MEASURE_PHASE_* constants
+    """
+    if _active_timer is None:
+        return _NO_SPAN
+    return _Span(_active_timer, phase_name)
@@ -0,0 +1,180 @@
+"""
+Compiled workload files: a JSON lines workload converted to an indexed binary file that is memory mapped and read
+lazily, so opening a workload does not depend on its size.
+
+    python -m shared.workload_compiler resources/workloads/tpc_h_static_100.json experiments/tpc_h_static_100.wlc
+
+Select the compiled file with workload_file in exp.conf. Layout (little endian):
+
+    header      magic, version, query count, structure count and the offsets of the three sections below
+    queries     one fixed size record per query: id, template fingerprint (shared/fingerprint.py), offset and
+                length of the query text, and the structure numbers of its predicates, payload, group by, order by
+                and remaining fields
+    structures  offset and length of each distinct structure (JSON), identical structures are stored once
+    data        UTF-8 query texts and structures
+
+CompiledWorkload materialises the queries of a slice only; the structures are decoded once and shared by the
+queries that use them, so they must not be modified.
+"""
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from collections.abc import Sequence
+
+import numpy
+
+from shared import fingerprint
+
+MAGIC = b'DBAWLC\x00\x00'
+VERSION = 1
+COMPILED_WORKLOAD_SUFFIX = '.wlc'
+
+_HEADER = struct.Struct('<8sIIQQQQQ')
+QUERY_RECORD = numpy.dtype([('id', '<i8'), ('fingerprint', '<u8'), ('text_offset', '<u8'), ('text_length', '<u4'),
+                            ('predicates', '<u4'), ('payload', '<u4'), ('group_by', '<u4'), ('order_by', '<u4'),
+                            ('extra', '<u4')])
+_STRUCTURE_RECORD = numpy.dtype([('offset', '<u8'), ('length', '<u4')])
+# Query fields kept as structures, in the order of the materialised query dictionaries
+_STRUCTURE_FIELDS = ('predicates', 'payload', 'group_by', 'order_by')
+
+
+def compile_workload(workload_path, output_path):
+    """
+    Compiles a JSON lines workload, one query per line, reading it once
+
+    :param workload_path: JSON lines workload (id, query_string, predicates, payload, group_by, order_by)
+    :param output_path: compiled workload file to write
+    :return: number of queries
+    """
+    structure_numbers = {}      # JSON of a structure -> structure number
+    structure_records = []
+    query_count = 0
+    with tempfile.TemporaryFile() as records_file, tempfile.TemporaryFile() as data_file:
+        data_length = 0
+
+        def add_data(data):
+            nonlocal data_length
+            data_file.write(data)
+            data_length += len(data)
+            return data_length - len(data)
+
+        def intern(value):
+            encoded = json.dumps(value, separators=(',', ':'))
+            if encoded not in structure_numbers:
+                data = encoded.encode()
+                structure_numbers[encoded] = len(structure_records)
+                structure_records.append((add_data(data), len(data)))
+            return structure_numbers[encoded]
+
+        with open(workload_path) as workload_file:
+            for line in workload_file:
+                if not line.strip():
+                    continue
+                query = json.loads(line)
+                query_id = query.pop('id')
+                if not isinstance(query_id, int):
+                    raise ValueError(f"Query ids must be integers to be compiled, got {query_id!r}")
+                text = query.pop('query_string').encode()
+                record = numpy.zeros(1, dtype=QUERY_RECORD)
+                record['id'] = query_id
+                record['fingerprint'] = fingerprint.fingerprint(text.decode())
+                record['text_offset'] = add_data(text)
+                record['text_length'] = len(text)
+                for field in _STRUCTURE_FIELDS:
+                    record[field] = intern(query.pop(field, {}))
+                record['extra'] = intern(query)
+                records_file.write(record.tobytes())
+                query_count += 1
+
+        records_offset = _HEADER.size
+        structures_offset = records_offset + query_count * QUERY_RECORD.itemsize
+        data_offset = structures_offset + len(structure_records) * _STRUCTURE_RECORD.itemsize
+        with open(output_path, 'wb') as output_file:
+            output_file.write(_HEADER.pack(MAGIC, VERSION, 0, query_count, len(structure_records), records_offset,
+                                           structures_offset, data_offset))
+            records_file.seek(0)
+            shutil.copyfileobj(records_file, output_file)
+            output_file.write(numpy.array(structure_records, dtype=_STRUCTURE_RECORD).tobytes())
+            data_file.seek(0)
+            shutil.copyfileobj(data_file, output_file)
+    return query_count
+
+
+class CompiledWorkload(Sequence):
+    """Read only sequence of the query dictionaries of a compiled workload"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as workload_file:
+            self._mmap = mmap.mmap(workload_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, query_count, structure_count, records_offset, structures_offset, self._data_offset = \
+            _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a compiled workload (version {VERSION})")
+        self.records = numpy.frombuffer(self._mmap, dtype=QUERY_RECORD, count=query_count, offset=records_offset)
+        self._structure_records = numpy.frombuffer(self._mmap, dtype=_STRUCTURE_RECORD, count=structure_count,
+                                                   offset=structures_offset)
+        self._structures = {}       # structure number -> decoded structure
+
+    @property
+    def fingerprints(self):
+        """
+        :return: array of the template fingerprints of the queries
+        """
+        return self.records['fingerprint']
+
+    def _data(self, offset, length):
+        start = self._data_offset + int(offset)
+        return self._mmap[start:start + int(length)].decode()
+
+    def _structure(self, number):
+        number = int(number)
+        if number not in self._structures:
+            offset, length = self._structure_records[number]
+            self._structures[number] = json.loads(self._data(offset, length))
+        return self._structures[number]
+
+    def _query(self, position):
+        record = self.records[position]
+        query = {'id': int(record['id']), 'query_string': self._data(record['text_offset'], record['text_length'])}
+        for field in _STRUCTURE_FIELDS:
+            query[field] = self._structure(record[field])
+        query.update(self._structure(record['extra']))
+        return query
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._query(position) for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('query index out of range')
+        return self._query(index)
+
+    def close(self):
+        # the arrays are views of the mapping, they are dropped first
+        self.records = self._structure_records = None
+        self._mmap.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('workload', help='JSON lines workload')
+    parser.add_argument('output', nargs='?', help=f'compiled workload, defaults to the workload with the '
+                                                  f'{COMPILED_WORKLOAD_SUFFIX} suffix')
+    args = parser.parse_args()
+    output = args.output or os.path.splitext(args.workload)[0] + COMPILED_WORKLOAD_SUFFIX
+    query_count = compile_workload(args.workload, output)
+    print(f"Compiled {query_count} queries to {output}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""
+Workload streams: the queries of each round are read from a PostgreSQL server log as it is written, instead of a
+slice of the workload file (workload_stream in exp.conf), so the tuner can follow a live workload.
+
+The log is the csvlog (log_destination = 'csvlog') or, from PostgreSQL 15, the jsonlog of the server with
+log_min_duration_statement = 0 or log_statement = 'all' (one of the two, or every statement is read twice). The
+parameters of the statements executed through the extended protocol are taken from the DETAIL of their records. Only
+SELECT statements of the configured database are read, and the statements of the tuner's own connections (their
+application_name) are left out.
+
+A reader thread tails the log, follows its rotation (the file is replaced or truncated) and puts the parsed queries in
+a bounded buffer. When the buffer is full the reader stops reading the log until the rounds catch up (back-pressure),
+so the memory does not depend on the length of the log. Every statement gets its own id, counted from the start of
+the log, so each one runs its own text; set share_query_templates to store the literal variants of a template as one
+query. The statements of a template (shared/fingerprint.py) are parsed once by shared/sql_parser.py, only the template
+structures are kept. A round batch ends after stream_batch_size statements or stream_batch_seconds of log time,
+whichever comes first; a batch also ends when no statement arrives for stream_batch_seconds.
+"""
+import csv
+import datetime
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+import constants
+from shared import fingerprint, sql_parser
+
+CSV_LOG = 'csvlog'
+JSON_LOG = 'jsonlog'
+LOG_FORMATS = (CSV_LOG, JSON_LOG)
+
+# fields of the csvlog records
+_CSV_LOG_TIME = 0
+_CSV_DATABASE = 2
+_CSV_MESSAGE = 13
+_CSV_DETAIL = 14
+_CSV_APPLICATION = 22
+
+_STATEMENT_MESSAGE = re.compile(r"^(?:duration: [\d.]+ ms\s+)?(?:statement|execute [^:]*): (.*)$", re.DOTALL)
+_PARAMETER_VALUE = re.compile(r"\$(\d+) = (NULL|'(?:[^']|'')*')")
+_PARAMETER = re.compile(r"\$(\d+)(?!\d)")
+_QUERY = re.compile(r"^\s*(?:select|with)\b", re.IGNORECASE)
+_END = object()
+
+
+def get_statement(message, detail=None):
+    """
+    :param message: message of a log record
+    :param detail: detail of the log record, holds the parameters of an execute message
+    :return: SQL text of the statement the record logs with its parameters in place, None for other records
+    """
+    match = _STATEMENT_MESSAGE.match(message or '')
+    if match is None:
+        return None
+    statement = match.group(1).strip()
+    if detail and detail.startswith('parameters:'):
+        values = dict(_PARAMETER_VALUE.findall(detail))
+        statement = _PARAMETER.sub(lambda parameter: values.get(parameter.group(1), parameter.group(0)), statement)
+    return statement
+
+
+def _get_log_time(value):
+    # '2024-01-31 12:00:00.123 UTC', the time zone is the same for the whole log
+    return datetime.datetime.strptime(value[:23], '%Y-%m-%d %H:%M:%S.%f') if value else None
+
+
+class _LogLines:
+    """Lines of a log file that is still written, the offset after the last line read is kept in offset"""
+
+    def __init__(self, path, offset, follow, stop, poll_seconds=0.5):
+        self.path = path
+        self.offset = offset
+        self.follow = follow
+        self.stop = stop
+        self.poll_seconds = poll_seconds
+
+    def __iter__(self):
+        log_file = None
+        inode = None
+        partial = b''
+        try:
+            while not self.stop.is_set():
+                if log_file is None:
+                    if not os.path.exists(self.path):
+                        if not self.follow:
+                            return
+                        self.stop.wait(self.poll_seconds)
+                        continue
+                    log_file = open(self.path, 'rb')
+                    inode = os.fstat(log_file.fileno()).st_ino
+                    if os.fstat(log_file.fileno()).st_size < self.offset:
+                        self.offset = 0
+                    log_file.seek(self.offset)
+                line = log_file.readline()
+                if line.endswith(b'\n'):
+                    line, partial = partial + line, b''
+                    self.offset = log_file.tell()
+                    yield line.decode(errors='replace')
+                    continue
+                partial += line
+                if not self.follow:
+                    if partial:
+                        self.offset = log_file.tell()
+                        yield partial.decode(errors='replace')
+                    return
+                # end of the file for now, reopened when the log was rotated or truncated
+                stat = os.stat(self.path) if os.path.exists(self.path) else None
+                if stat is not None and (stat.st_ino != inode or stat.st_size < log_file.tell()):
+                    log_file.close()
+                    log_file, partial = None, b''
+                    self.offset = 0
+                else:
+                    self.stop.wait(self.poll_seconds)
+        finally:
+            if log_file is not None:
+                log_file.close()
+
+
+class WorkloadStream:
+
+    def __init__(self, path, log_format=CSV_LOG, table_columns=None, batch_size=100, batch_seconds=0.0,
+                 buffer_size=10000, follow=True, database=None, exclude_application=None, state=None):
+        """
+        :param path: server log file
+        :param log_format: csvlog or jsonlog
+        :param table_columns: optional dictionary of table name -> column names, see sql_parser.QueryParser
+        :param batch_size: statements per round, 0 for no limit
+        :param batch_seconds: seconds of log time per round, 0 for no limit
+        :param buffer_size: parsed queries buffered ahead of the rounds
+        :param follow: wait for the server to write more statements at the end of the log, the stream ends at the
+            end of the log otherwise
+        :param database: database the statements are read for, None for all
+        :param exclude_application: application_name whose statements are left out
+        :param state: result of get_state of a previous stream, to continue after its last batch
+        """
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"Unknown log format {log_format}, expected one of {LOG_FORMATS}")
+        if batch_size <= 0 and batch_seconds <= 0:
+            raise ValueError("A round batch needs a statement count or a time window")
+        self.path = path
+        self.log_format = log_format
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.follow = follow
+        self.database = database
+        self.exclude_application = exclude_application
+        self.parser = sql_parser.QueryParser(table_columns)
+        self.template_structures = {}   # template fingerprint -> query structures of sql_parser
+        self.position = state['position'] if state else 0      # log offset after the last query of a batch
+        self.statement_count = state['statement_count'] if state else 0     # id of the last query of a batch
+        self._read_count = self.statement_count
+        self.stalled_seconds = 0.0      # time the reader waited for the rounds to free the buffer
+        self.ended = False
+        self._pending = None            # first query of the next batch
+        self._buffer = queue.Queue(maxsize=buffer_size)
+        self._stop = threading.Event()
+        self._reader = threading.Thread(target=self._read, name='workload-stream', daemon=True)
+        self._reader.start()
+
+    @classmethod
+    def from_configs(cls, configs, table_columns=None, state=None):
+        """
+        :param configs: shared.configs_v2 module
+        :param table_columns: optional dictionary of table name -> column names
+        :param state: result of get_state of a previous stream
+        :return: WorkloadStream, None when workload_stream is not set
+        """
+        if not configs.workload_stream:
+            return None
+        db_config = constants.read_db_config()
+        db_type = db_config.get('SYSTEM', 'db_type', fallback='MSSQL')
+        log_path = configs.stream_log_file
+        if not os.path.isabs(log_path):
+            log_path = os.path.join(constants.ROOT_DIR, log_path)
+        return cls(log_path, configs.workload_stream, table_columns, configs.stream_batch_size,
+                   configs.stream_batch_seconds, configs.stream_buffer_size, configs.stream_follow,
+                   db_config.get(db_type, 'database', fallback=None),
+                   db_config.get(db_type, 'application_name', fallback=constants.APPLICATION_NAME), state)
+
+    def _records(self, lines):
+        """
+        :return: generator of (log time, database, application, message, detail) of the log records
+        """
+        if self.log_format == CSV_LOG:
+            for record in csv.reader(lines):
+                if len(record) > _CSV_APPLICATION:
+                    yield (record[_CSV_LOG_TIME], record[_CSV_DATABASE], record[_CSV_APPLICATION],
+                           record[_CSV_MESSAGE], record[_CSV_DETAIL])
+        else:
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logging.warning(f"Skipped a malformed record of {self.path}")
+                    continue
+                yield (record.get('timestamp'), record.get('dbname'), record.get('application_name'),
+                       record.get('message'), record.get('detail'))
+
+    def _read(self):
+        lines = _LogLines(self.path, self.position, self.follow, self._stop)
+        try:
+            for log_time, database, application, message, detail in self._records(lines):
+                if self.database and database and database != self.database:
+                    continue
+                if self.exclude_application and application == self.exclude_application:
+                    continue
+                statement = get_statement(message, detail)
+                if statement is None or not _QUERY.match(statement):
+                    continue
+                template = fingerprint.fingerprint(statement)
+                if template not in self.template_structures:
+                    self.template_structures[template] = self.parser.analyse(statement)
+                self._read_count += 1
+                query = sql_parser.get_workload_entry(self._read_count, statement, self.template_structures[template])
+                if not self._put((lines.offset, _get_log_time(log_time), query)):
+                    return
+        except Exception:
+            logging.exception(f"Stopped reading the workload stream {self.path}")
+        self._put(_END)
+
+    def _put(self, item):
+        """
+        :return: False when the stream was closed while the buffer was full
+        """
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                self._buffer.put(item, timeout=0.5)
+                self.stalled_seconds += time.perf_counter() - start
+                return True
+            except queue.Full:
+                logging.debug("Workload stream buffer full, waiting for the rounds")
+        return False
+
+    def _take(self, timeout):
+        if self._pending is not None:
+            item, self._pending = self._pending, None
+            return item
+        try:
+            item = self._buffer.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if item is _END:
+            self.ended = True
+            return None
+        return item
+
+    def next_batch(self):
+        """
+        :return: query dictionaries of the next round, empty when the stream ended
+        """
+        batch = []
+        window_end = None
+        # a live log may pause, the end of a log that is not followed is waited for
+        wait = self.batch_seconds if self.follow and self.batch_seconds > 0 else None
+        while not self.ended and (self.batch_size <= 0 or len(batch) < self.batch_size):
+            item = self._take(wait)
+            if item is None:
+                if batch or self.ended:
+                    break
+                continue
+            position, log_time, query = item
+            if self.batch_seconds > 0 and log_time is not None:
+                if window_end is None:
+                    window_end = log_time + datetime.timedelta(seconds=self.batch_seconds)
+                elif log_time >= window_end:
+                    self._pending = item
+                    break
+            self.position = position
+            self.statement_count = query['id']
+            batch.append(query)
+        logging.info(f"Workload stream batch of {len(batch)} queries, {len(self.template_structures)} templates seen, "
+                     f"{self._buffer.qsize()} queries buffered, reader waited {self.stalled_seconds:.1f}s")
+        return batch
+
+    def get_state(self):
+        """
+        :return: picklable state to continue the stream after the last batch
+        """
+        return {'position': self.position, 'statement_count': self.statement_count}
+
+    def close(self):
+        self._stop.set()
+        self._reader.join()
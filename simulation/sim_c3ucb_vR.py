@@ -1,7 +1,7 @@
-import datetime
 import logging
 import operator
 import pprint
+import time
 from importlib import reload
 
 import numpy
@@ -9,18 +9,30 @@ from pandas import DataFrame
 
 import bandits.bandit_c3ucb_v2 as bandits
 import bandits.bandit_helper_v2 as bandit_helper
+import bandits.query_admission as query_admission
+import bandits.round_prefetch as round_prefetch
 import constants as constants
+import database.pg_stat_feedback as pg_stat_feedback
+import database.reward_helper as reward_helper
 import database.sql_connection as sql_connection
 import database.sql_helper as sql_helper
+import shared.checkpoint as checkpoint
 import shared.configs_v2 as configs
 import shared.helper as helper
+import shared.profiling as profiling
+import shared.timing as timing
 from bandits.experiment_report import ExpReport
 from bandits.oracle_v2 import OracleV7 as Oracle
-from bandits.query_v5 import Query
+from bandits.query_store import QueryStore
+from bandits.round_sampling import RoundSampler
+from database import sql_trace
+from shared.workload_stream import WorkloadStream
 
 
 # Simulation built on vQ to collect the super arm performance
 
+CHECKPOINT_FILE = 'c3ucb_checkpoint.pickle'
+
 
 class BaseSimulator:
     def __init__(self):
@@ -30,16 +42,40 @@ class BaseSimulator:
             filemode='w', format='%(asctime)s - %(levelname)s - %(message)s')
         logging.getLogger().setLevel(logging.INFO)
 
-        # Get the query List
-        self.queries = helper.get_queries_v2()
+        # Get the query List, a workload stream reads the queries of each round from the server log instead
+        self.queries = [] if configs.workload_stream else helper.get_queries_v2()
         self.connection = sql_connection.get_sql_connection()
-        self.query_obj_store = {}
+        self.query_obj_store = QueryStore.from_configs(
+            configs, helper.get_experiment_folder_path(configs.experiment_id), 'c3ucb')
         reload(bandit_helper)
+        sql_helper.reload_helper()
+
+    def reconcile_indexes(self, bandit_arms):
+        """
+        Brings the materialised bandit indexes in line with the index configuration of a checkpoint
+
+        :param bandit_arms: dictionary of index name -> bandit arm, the configuration to restore
+        """
+        materialised_indexes = sql_helper.get_bandit_index_names(self.connection, constants.SCHEMA_NAME)
+        for index_name, table_name in materialised_indexes.items():
+            if index_name not in bandit_arms:
+                sql_helper.drop_index(self.connection, constants.SCHEMA_NAME, table_name, index_name)
+        missing_arms = {index_name: bandit_arm for index_name, bandit_arm in bandit_arms.items()
+                        if index_name not in materialised_indexes}
+        sql_helper.bulk_create_indexes(self.connection, constants.SCHEMA_NAME, missing_arms)
+        logging.info(f"Reconciled indexes with the checkpoint: kept {len(bandit_arms) - len(missing_arms)}, "
+                     f"created {len(missing_arms)}, dropped {len(set(materialised_indexes) - set(bandit_arms))}")
 
 
 class Simulator(BaseSimulator):
 
-    def run(self):
+    def run(self, results_sink=None, rep=0):
+        """
+        :param results_sink: optional shared.results_sink.ResultsSink, the measures of each round are appended to it as
+            soon as the round ends
+        :param rep: repetition number, a checkpoint only resumes the repetition that wrote it
+        :return: list of [round, measure, value] rows, total time
+        """
         pp = pprint.PrettyPrinter()
         reload(configs)
         results = []
@@ -57,8 +93,18 @@ class Simulator(BaseSimulator):
         context_size = number_of_columns * (
                     1 + constants.CONTEXT_UNIQUENESS + constants.CONTEXT_INCLUDES) + constants.STATIC_CONTEXT_SIZE
 
+        checkpoint_path = helper.get_experiment_folder_path(configs.experiment_id) + CHECKPOINT_FILE
+        state = checkpoint.load_checkpoint(checkpoint_path) if configs.resume else None
+        if state is not None and state.get('rep', 0) != rep:
+            logging.info(f"The checkpoint is of repetition {state.get('rep', 0)}, repetition {rep} starts afresh")
+            state = None
+
         # Create oracle and the bandit
-        configs.max_memory -= int(sql_helper.get_current_pds_size(self.connection))
+        if state is None:
+            configs.max_memory -= int(sql_helper.get_current_pds_size(self.connection))
+        else:
+            # the database size now includes the indexes of the checkpoint
+            configs.max_memory = state['max_memory']
         oracle = Oracle(configs.max_memory)
         c3ucb_bandit = bandits.C3UCB(context_size, configs.input_alpha, configs.input_lambda, oracle)
 
@@ -70,52 +116,90 @@ class Simulator(BaseSimulator):
         queries_end = configs.queries_end_list[next_workload_shift]
         query_obj_additions = []
         total_time = 0.0
-
-        for t in range((configs.rounds + configs.hyp_rounds)):
+        first_round = 0
+        if state is not None:
+            logging.info(f"Resuming from the checkpoint of round {state['round']}")
+            first_round = state['round'] + 1
+            c3ucb_bandit.v = state['v']
+            c3ucb_bandit.b = state['b']
+            c3ucb_bandit.hyper_alpha = state['hyper_alpha']
+            bandit_helper.bandit_arm_store.clear()
+            bandit_helper.bandit_arm_store.update(state['bandit_arm_store'])
+            self.query_obj_store = state['query_obj_store']
+            sql_helper.table_scan_times.clear()
+            sql_helper.table_scan_times.update(state['table_scan_times'])
+            results = state['results']
+            super_arm_scores = state['super_arm_scores']
+            super_arm_counts = state['super_arm_counts']
+            best_super_arm = state['best_super_arm']
+            arm_selection_count = state['arm_selection_count']
+            chosen_arms_last_round = state['chosen_arms_last_round']
+            next_workload_shift = state['next_workload_shift']
+            queries_start = state['queries_start']
+            queries_end = state['queries_end']
+            query_obj_additions = state['query_obj_additions']
+            total_time = state['total_time']
+            self.reconcile_indexes(chosen_arms_last_round)
+            if results_sink is not None:
+                results_sink.append(results)
+        phase_timer = timing.PhaseTimer()
+        timing.set_active_timer(phase_timer)
+        profiler = profiling.RoundProfiler.from_configs(
+            configs, helper.get_experiment_folder_path(configs.experiment_id), 'c3ucb')
+        workload_stream = WorkloadStream.from_configs(configs, all_columns,
+                                                      state.get('workload_stream') if state is not None else None)
+        prefetcher = None
+        if configs.prefetch_next_round:
+            if workload_stream is not None:
+                logging.warning("Round prefetch is disabled for a workload stream, the next round is not known")
+            elif sql_trace.is_recording():
+                logging.warning("Round prefetch is disabled while a trace is recorded")
+            else:
+                prefetcher = round_prefetch.RoundPrefetcher()
+        round_sampler = RoundSampler.from_configs(configs)
+        if round_sampler is not None and state is not None and state.get('round_sampler') is not None:
+            round_sampler = state['round_sampler']
+        passive_feedback = pg_stat_feedback.PgStatFeedback.from_configs(configs)
+        if passive_feedback is not None and state is not None and state.get('passive_feedback') is not None:
+            passive_feedback = state['passive_feedback']
+
+        for t in range(first_round, configs.rounds + configs.hyp_rounds):
+            if workload_stream is not None:
+                # the wait for the statements of the round is not part of the round
+                queries_current_batch = workload_stream.next_batch()
+                if not queries_current_batch:
+                    logging.info(f"The workload stream ended before round {t}")
+                    sql_helper.bulk_drop_index(self.connection, constants.SCHEMA_NAME, chosen_arms_last_round)
+                    break
             logging.info(f"round: {t}")
-            start_time_round = datetime.datetime.now()
+            profiler.start_round(t)
+            start_time_round = time.perf_counter()
+            phase_timer.reset()
             # At the start of the round we will read the applicable set for the current round. This is a workaround
             # used to demo the dynamic query flow. We read the queries from the start and move the window each round
 
-            # check if workload shift is required
-            if t - configs.hyp_rounds == configs.workload_shifts[next_workload_shift]:
-                queries_start = configs.queries_start_list[next_workload_shift]
-                queries_end = configs.queries_end_list[next_workload_shift]
-                if len(configs.workload_shifts) > next_workload_shift + 1:
-                    next_workload_shift += 1
-
-            # New set of queries in this batch, required for query execution
-            queries_current_batch = self.queries[queries_start:queries_end]
-
-            # Adding new queries to the query store
-            query_obj_list_current = []
-            for n in range(len(queries_current_batch)):
-                query = queries_current_batch[n]
-                query_id = query['id']
-                if query_id in self.query_obj_store:
-                    query_obj_in_store = self.query_obj_store[query_id]
-                    query_obj_in_store.frequency += 1
-                    query_obj_in_store.last_seen = t
-                    query_obj_in_store.query_string = query['query_string']
-                    if query_obj_in_store.first_seen == -1:
-                        query_obj_in_store.first_seen = t
-                else:
-                    query = Query(self.connection, query_id, query['query_string'], query['predicates'],
-                                  query['payload'], t)
-                    query.context = bandit_helper.get_query_context_v1(query, all_columns, number_of_columns)
-                    self.query_obj_store[query_id] = query
-                query_obj_list_current.append(self.query_obj_store[query_id])
-
-            # This list contains all past queries, we don't include new queries seen for the first time.
-            query_obj_list_past = []
-            query_obj_list_new = []
-            for key, obj in self.query_obj_store.items():
-                if t - obj.last_seen <= constants.QUERY_MEMORY and 0 <= obj.first_seen < t:
-                    query_obj_list_past.append(obj)
-                elif t - obj.last_seen > constants.QUERY_MEMORY:
-                    obj.first_seen = -1
-                elif obj.first_seen == t:
-                    query_obj_list_new.append(obj)
+            if workload_stream is None:
+                # check if workload shift is required
+                if t - configs.hyp_rounds == configs.workload_shifts[next_workload_shift]:
+                    queries_start = configs.queries_start_list[next_workload_shift]
+                    queries_end = configs.queries_end_list[next_workload_shift]
+                    if len(configs.workload_shifts) > next_workload_shift + 1:
+                        next_workload_shift += 1
+
+                # New set of queries in this batch, required for query execution
+                queries_current_batch = self.queries[queries_start:queries_end]
+
+            with timing.phase(constants.MEASURE_PHASE_PREFETCH_WAIT):
+                prefetched_selectivities = prefetcher.take() if prefetcher is not None else None
+
+            with timing.phase(constants.MEASURE_PHASE_QUERY_STORE):
+                # Adding new queries to the query store
+                query_obj_list_current = query_admission.admit_queries(self.connection, self.query_obj_store,
+                                                                        queries_current_batch, t, all_columns,
+                                                                        number_of_columns, prefetched_selectivities)
+
+                # This list contains all past queries, we don't include new queries seen for the first time.
+                query_obj_list_past, query_obj_list_new = self.query_obj_store.classify(t)
 
             # We don't want to reset in the first round, if there is new additions or removals we identify a
             # workload change
@@ -126,41 +210,42 @@ class Simulator(BaseSimulator):
             # this rounds new will be the additions for the next round
             query_obj_additions = query_obj_list_new
 
-            # Get the predicates for queries and Generate index arms for each query
-            index_arms = {}
-            for i in range(len(query_obj_list_past)):
-                bandit_arms_tmp = bandit_helper.gen_arms_from_predicates_v2(self.connection, query_obj_list_past[i])
-                for key, index_arm in bandit_arms_tmp.items():
-                    if key not in index_arms:
-                        index_arm.query_ids = set()
-                        index_arm.query_ids_backup = set()
-                        index_arm.clustered_index_time = 0
-                        index_arms[key] = index_arm
-                    index_arm.clustered_index_time += max(
-                        query_obj_list_past[i].table_scan_times[index_arm.table_name]) if \
-                        query_obj_list_past[i].table_scan_times[index_arm.table_name] else 0
-                    index_arms[key].query_ids.add(index_arm.query_id)
-                    index_arms[key].query_ids_backup.add(index_arm.query_id)
-
-            # set the index arms at the bandit
-            if t == configs.hyp_rounds and configs.hyp_rounds != 0:
+            with timing.phase(constants.MEASURE_PHASE_ARM_GENERATION):
+                # Get the predicates for queries and Generate index arms for each query
                 index_arms = {}
-            index_arm_list = list(index_arms.values())
-            logging.info(f"Generated {len(index_arm_list)} arms")
-            c3ucb_bandit.set_arms(index_arm_list)
-
-            # creating the context, here we pass all the columns in the database
-            context_vectors_v1 = bandit_helper.get_name_encode_context_vectors_v2(index_arms, all_columns,
-                                                                                  number_of_columns,
-                                                                                  constants.CONTEXT_UNIQUENESS,
-                                                                                  constants.CONTEXT_INCLUDES)
-            context_vectors_v2 = bandit_helper.get_derived_value_context_vectors_v3(self.connection, index_arms, query_obj_list_past,
-                                                                                        chosen_arms_last_round, not constants.CONTEXT_INCLUDES)
-            context_vectors = []
-            for i in range(len(context_vectors_v1)):
-                context_vectors.append(
-                    numpy.array(list(context_vectors_v2[i]) + list(context_vectors_v1[i]),
-                                ndmin=2))
+                for i in range(len(query_obj_list_past)):
+                    bandit_arms_tmp = bandit_helper.gen_arms_from_predicates_v2(self.connection, query_obj_list_past[i])
+                    for key, index_arm in bandit_arms_tmp.items():
+                        if key not in index_arms:
+                            index_arm.query_ids = set()
+                            index_arm.query_ids_backup = set()
+                            index_arm.clustered_index_time = 0
+                            index_arms[key] = index_arm
+                        index_arm.clustered_index_time += \
+                            query_obj_list_past[i].table_scan_times.max(index_arm.table_name) or 0
+                        index_arms[key].query_ids.add(index_arm.query_id)
+                        index_arms[key].query_ids_backup.add(index_arm.query_id)
+
+                # set the index arms at the bandit
+                if t == configs.hyp_rounds and configs.hyp_rounds != 0:
+                    index_arms = {}
+                index_arm_list = list(index_arms.values())
+                logging.info(f"Generated {len(index_arm_list)} arms")
+                c3ucb_bandit.set_arms(index_arm_list)
+
+            with timing.phase(constants.MEASURE_PHASE_CONTEXT):
+                # creating the context, here we pass all the columns in the database
+                context_vectors_v1 = bandit_helper.get_name_encode_context_vectors_v2(index_arms, all_columns,
+                                                                                      number_of_columns,
+                                                                                      constants.CONTEXT_UNIQUENESS,
+                                                                                      constants.CONTEXT_INCLUDES)
+                context_vectors_v2 = bandit_helper.get_derived_value_context_vectors_v3(self.connection, index_arms, query_obj_list_past,
+                                                                                            chosen_arms_last_round, not constants.CONTEXT_INCLUDES)
+                context_vectors = []
+                for i in range(len(context_vectors_v1)):
+                    context_vectors.append(
+                        numpy.array(list(context_vectors_v2[i]) + list(context_vectors_v1[i]),
+                                    ndmin=2))
             # getting the super arm from the bandit
             chosen_arm_ids = c3ucb_bandit.select_arm_v2(context_vectors, t)
             if t >= configs.hyp_rounds and t - configs.hyp_rounds > constants.STOP_EXPLORATION_ROUND:
@@ -202,18 +287,40 @@ class Simulator(BaseSimulator):
             for key in key_deletions:
                 deleted_arms[key] = chosen_arms_last_round[key]
 
-            start_time_create_query = datetime.datetime.now()
+            # the next round is prepared while the queries of this round execute
+            if prefetcher is not None and t + 1 < configs.rounds + configs.hyp_rounds:
+                next_queries_start, next_queries_end = queries_start, queries_end
+                if t + 1 - configs.hyp_rounds == configs.workload_shifts[next_workload_shift]:
+                    next_queries_start = configs.queries_start_list[next_workload_shift]
+                    next_queries_end = configs.queries_end_list[next_workload_shift]
+                prefetcher.submit(self.query_obj_store, self.queries[next_queries_start:next_queries_end],
+                                  query_obj_list_current)
+
+            start_time_create_query = time.perf_counter()
             if t < configs.hyp_rounds:
                 time_taken, creation_cost_dict, arm_rewards = sql_helper.hyp_create_query_drop_v2(self.connection, constants.SCHEMA_NAME,
                                                                                                   chosen_arms, added_arms, deleted_arms,
                                                                                                   query_obj_list_current)
+            elif passive_feedback is not None:
+                time_taken, creation_cost_dict, arm_rewards = passive_feedback.create_query_drop(self.connection,
+                                                                                                 constants.SCHEMA_NAME,
+                                                                                                 chosen_arms,
+                                                                                                 added_arms,
+                                                                                                 deleted_arms,
+                                                                                                 query_obj_list_current)
+            elif round_sampler is not None:
+                time_taken, creation_cost_dict, arm_rewards = round_sampler.create_query_drop(self.connection,
+                                                                                              constants.SCHEMA_NAME,
+                                                                                              chosen_arms, added_arms,
+                                                                                              deleted_arms,
+                                                                                              query_obj_list_current)
             else:
                 time_taken, creation_cost_dict, arm_rewards = sql_helper.create_query_drop_v3(self.connection,
                                                                                               constants.SCHEMA_NAME,
                                                                                               chosen_arms, added_arms,
                                                                                               deleted_arms,
                                                                                               query_obj_list_current)
-            end_time_create_query = datetime.datetime.now()
+            end_time_create_query = time.perf_counter()
             creation_cost = sum(creation_cost_dict.values())
             if t == configs.hyp_rounds and configs.hyp_rounds != 0:
                 # logging arm usage counts
@@ -221,7 +328,8 @@ class Simulator(BaseSimulator):
                     sorted(arm_selection_count.items(), key=operator.itemgetter(1), reverse=True)))
                 arm_selection_count = {}
 
-            c3ucb_bandit.update_v4(chosen_arm_ids, arm_rewards)
+            with timing.phase(constants.MEASURE_PHASE_BANDIT_UPDATE):
+                c3ucb_bandit.update_v5(chosen_arm_ids, reward_helper.get_reward_array(arm_rewards, index_arm_list))
             super_arm_id = frozenset(chosen_arm_ids)
             if t >= configs.hyp_rounds:
                 if super_arm_id in super_arm_scores:
@@ -239,14 +347,15 @@ class Simulator(BaseSimulator):
             if t == (configs.rounds + configs.hyp_rounds - 1):
                 sql_helper.bulk_drop_index(self.connection, constants.SCHEMA_NAME, chosen_arms)
 
-            end_time_round = datetime.datetime.now()
+            end_time_round = time.perf_counter()
             current_config_size = float(sql_helper.get_current_pds_size(self.connection))
             logging.info("Size taken by the config: " + str(current_config_size) + "MB")
             # Adding information to the results array
+            round_results_start = len(results)
             if t >= configs.hyp_rounds:
                 actual_round_number = t - configs.hyp_rounds
-                recommendation_time = (end_time_round - start_time_round).total_seconds() - (
-                            end_time_create_query - start_time_create_query).total_seconds()
+                recommendation_time = (end_time_round - start_time_round) - (
+                            end_time_create_query - start_time_create_query)
                 total_round_time = creation_cost + time_taken + recommendation_time
                 results.append([actual_round_number, constants.MEASURE_BATCH_TIME, total_round_time])
                 results.append([actual_round_number, constants.MEASURE_INDEX_CREATION_COST, creation_cost])
@@ -254,17 +363,55 @@ class Simulator(BaseSimulator):
                 results.append(
                     [actual_round_number, constants.MEASURE_INDEX_RECOMMENDATION_COST, recommendation_time])
                 results.append([actual_round_number, constants.MEASURE_MEMORY_COST, current_config_size])
+                if round_sampler is not None:
+                    results.append([actual_round_number, constants.MEASURE_SAMPLED_QUERIES,
+                                    round_sampler.sampled_queries])
+                    results.append([actual_round_number, constants.MEASURE_SAMPLED_EXECUTION_COST,
+                                    round_sampler.executed_time])
+                    results.append([actual_round_number, constants.MEASURE_QUERY_EXECUTION_COST_INTERVAL,
+                                    round_sampler.execution_cost_interval])
+                if passive_feedback is not None:
+                    results.append([actual_round_number, constants.MEASURE_OBSERVED_CALLS,
+                                    passive_feedback.observed_calls])
+                results.extend(phase_timer.get_results(actual_round_number, constants.PHASE_MEASURES))
             else:
-                total_round_time = (end_time_round - start_time_round).total_seconds() - (
-                        end_time_create_query - start_time_create_query).total_seconds()
+                total_round_time = (end_time_round - start_time_round) - (
+                        end_time_create_query - start_time_create_query)
                 results.append([t, constants.MEASURE_HYP_BATCH_TIME, total_round_time])
             total_time += total_round_time
+            if results_sink is not None:
+                results_sink.append(results[round_results_start:])
 
             if t >= configs.hyp_rounds:
                 best_super_arm = min(super_arm_scores, key=super_arm_scores.get)
 
             print(f"current total {t}: ", total_time)
-
+            profiler.end_round(t)
+
+            if configs.checkpoint_interval and (t + 1) % configs.checkpoint_interval == 0 and \
+                    t < configs.rounds + configs.hyp_rounds - 1:
+                checkpoint.save_checkpoint(checkpoint_path, {
+                    'rep': rep, 'round': t, 'v': c3ucb_bandit.v, 'b': c3ucb_bandit.b, 'hyper_alpha': c3ucb_bandit.hyper_alpha,
+                    'max_memory': configs.max_memory, 'bandit_arm_store': bandit_helper.bandit_arm_store,
+                    'query_obj_store': self.query_obj_store, 'table_scan_times': sql_helper.table_scan_times,
+                    'results': results, 'super_arm_scores': super_arm_scores, 'super_arm_counts': super_arm_counts,
+                    'best_super_arm': best_super_arm, 'arm_selection_count': arm_selection_count,
+                    'chosen_arms_last_round': chosen_arms_last_round, 'next_workload_shift': next_workload_shift,
+                    'queries_start': queries_start, 'queries_end': queries_end,
+                    'query_obj_additions': query_obj_additions, 'total_time': total_time,
+                    'round_sampler': round_sampler, 'passive_feedback': passive_feedback,
+                    'workload_stream': workload_stream.get_state() if workload_stream is not None else None})
+                self.query_obj_store.checkpoint_saved()
+
+        profiler.close()
+        if prefetcher is not None:
+            prefetcher.close()
+        if workload_stream is not None:
+            workload_stream.close()
+        timing.set_active_timer(None)
+        # the run is complete, a later resume starts a new run
+        checkpoint.remove_checkpoint(checkpoint_path)
+        self.query_obj_store.close()
         logging.info("Time taken by bandit for " + str(configs.rounds) + " rounds: " + str(total_time))
         logging.info("\n\nIndex Usage Counts:\n" + pp.pformat(
             sorted(arm_selection_count.items(), key=operator.itemgetter(1), reverse=True)))
@@ -10,14 +10,16 @@ from pandas import DataFrame
 
 import bandits.rl_ddqn_pytorch as bandits  # Use PyTorch version
 import bandits.bandit_helper_v2 as bandit_helper
+import bandits.query_admission as query_admission
 import constants as constants
 import database.sql_connection as sql_connection
 import database.sql_helper as sql_helper
 import shared.configs_v2 as configs
 import shared.helper as helper
+import shared.profiling as profiling
 from bandits.experiment_report import ExpReport
 from bandits.oracle_v2 import OracleV7 as Oracle
-from bandits.query_v5 import Query
+from bandits.query_store import QueryStore
 
 
 # Simulation built on vO to work on dynamic workloads
@@ -34,14 +36,21 @@ class BaseSimulator:
         # Get the query List
         self.queries = helper.get_queries_v2()
         self.connection = sql_connection.get_sql_connection()
-        self.query_obj_store = {}
+        self.query_obj_store = QueryStore.from_configs(
+            configs, helper.get_experiment_folder_path(configs.experiment_id), 'ddqn')
         self.bandit_arms_store = {}
         reload(bandit_helper)
+        sql_helper.reload_helper()
 
 
 class Simulator(BaseSimulator):
 
-    def run(self):
+    def run(self, results_sink=None):
+        """
+        :param results_sink: optional shared.results_sink.ResultsSink, the measures of each round are appended to it as
+            soon as the round ends
+        :return: list of [round, measure, value] rows, total time
+        """
         pp = pprint.PrettyPrinter()
         reload(configs)
         # start_time_workload = datetime.datetime.now()
@@ -75,9 +84,12 @@ class Simulator(BaseSimulator):
         setup_time_end = datetime.datetime.now()
         setup_time = (setup_time_end - setup_time_start).total_seconds()
         total_time = 0.0
+        profiler = profiling.RoundProfiler.from_configs(
+            configs, helper.get_experiment_folder_path(configs.experiment_id), 'ddqn')
 
         for t in range((configs.rounds + configs.hyp_rounds)):
             logging.info(f"round: {t}")
+            profiler.start_round(t)
             start_time_round = datetime.datetime.now()
             # At the start of the round we will read the applicable set for the current round. This is a workaround
             # used to demo the dynamic query flow. We read the queries from the start and move the window each round
@@ -93,34 +105,12 @@ class Simulator(BaseSimulator):
             queries_current_batch = self.queries[queries_start:queries_end]
 
             # Adding new queries to the query store
-            query_obj_list_current = []
-            for n in range(len(queries_current_batch)):
-                query = queries_current_batch[n]
-                query_id = query['id']
-                if query_id in self.query_obj_store:
-                    query_obj_in_store = self.query_obj_store[query_id]
-                    query_obj_in_store.frequency += 1
-                    query_obj_in_store.last_seen = t
-                    query_obj_in_store.query_string = query['query_string']
-                    if query_obj_in_store.first_seen == -1:
-                        query_obj_in_store.first_seen = t
-                else:
-                    query = Query(self.connection, query_id, query['query_string'], query['predicates'],
-                                  query['payload'], t)
-                    query.context = bandit_helper.get_query_context_v1(query, all_columns, number_of_columns)
-                    self.query_obj_store[query_id] = query
-                query_obj_list_current.append(self.query_obj_store[query_id])
+            query_obj_list_current = query_admission.admit_queries(self.connection, self.query_obj_store,
+                                                                    queries_current_batch, t, all_columns,
+                                                                    number_of_columns)
 
             # This list contains all past queries, we don't include new queries seen for the first time.
-            query_obj_list_past = []
-            query_obj_list_new = []
-            for key, obj in self.query_obj_store.items():
-                if t - obj.last_seen <= constants.QUERY_MEMORY and 0 <= obj.first_seen < t:
-                    query_obj_list_past.append(obj)
-                elif t - obj.last_seen > constants.QUERY_MEMORY:
-                    obj.first_seen = -1
-                elif obj.first_seen == t:
-                    query_obj_list_new.append(obj)
+            query_obj_list_past, query_obj_list_new = self.query_obj_store.classify(t)
 
             # We don't want to reset in the first round, if there is new additions or removals we identify a
             # workload change
@@ -248,6 +238,7 @@ class Simulator(BaseSimulator):
 
             end_time_round = datetime.datetime.now()
             # Adding information to the results array
+            round_results_start = len(results)
             if t >= configs.hyp_rounds:
                 actual_round_number = t - configs.hyp_rounds
                 recommendation_time = (end_time_round - start_time_round).total_seconds() - (
@@ -263,7 +254,12 @@ class Simulator(BaseSimulator):
                 total_round_time = (end_time_round - start_time_round).total_seconds()
                 results.append([t, constants.MEASURE_HYP_BATCH_TIME, total_round_time])
             total_time += total_round_time
+            if results_sink is not None:
+                results_sink.append(results[round_results_start:])
+            profiler.end_round(t)
 
+        profiler.close()
+        self.query_obj_store.close()
         # end_time_workload = datetime.datetime.now()
         # logging arm usage counts and time spent
         # total_time = (end_time_workload - start_time_workload).total_seconds()
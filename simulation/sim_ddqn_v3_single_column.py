@@ -17,6 +17,7 @@ import shared.configs_v2 as configs
 import shared.helper as helper
 from bandits.experiment_report import ExpReport
 from bandits.oracle_v2 import OracleV6 as Oracle
+from bandits.query_store import QueryStore
 from bandits.query_v4 import Query
 
 
@@ -34,7 +35,8 @@ class BaseSimulator:
         # Get the query List
         self.queries = helper.get_queries_v2()
         self.connection = sql_connection.get_sql_connection()
-        self.query_obj_store = {}
+        self.query_obj_store = QueryStore.from_configs(
+            configs, helper.get_experiment_folder_path(configs.experiment_id), 'ddqn_single_column')
         self.bandit_arms_store = {}
 
 
@@ -90,30 +92,16 @@ class Simulator(BaseSimulator):
             for n in range(len(queries_current_batch)):
                 query = queries_current_batch[n]
                 query_id = query['id']
-                if query_id in self.query_obj_store:
-                    query_obj_in_store = self.query_obj_store[query_id]
-                    query_obj_in_store.frequency += 1
-                    query_obj_in_store.last_seen = t
-                    query_obj_in_store.query_string = query['query_string']
-                    if query_obj_in_store.first_seen == -1:
-                        query_obj_in_store.first_seen = t
-                else:
-                    query = Query(self.connection, query_id, query['query_string'], query['predicates'],
-                                  query['payload'], t)
-                    query.context = bandit_helper.get_query_context_v1(query, columns, number_of_columns)
-                    self.query_obj_store[query_id] = query
-                query_obj_list_current.append(self.query_obj_store[query_id])
+                query_obj = self.query_obj_store.see(query_id, query['query_string'], t)
+                if query_obj is None:
+                    query_obj = Query(self.connection, query_id, query['query_string'], query['predicates'],
+                                      query['payload'], t)
+                    query_obj.context = bandit_helper.get_query_context_v1(query_obj, columns, number_of_columns)
+                    self.query_obj_store.add(query_obj)
+                query_obj_list_current.append(query_obj)
 
             # This list contains all past queries, we don't include new queries seen for the first time.
-            query_obj_list_past = []
-            query_obj_list_new = []
-            for key, obj in self.query_obj_store.items():
-                if t - obj.last_seen <= constants.QUERY_MEMORY and 0 <= obj.first_seen < t:
-                    query_obj_list_past.append(obj)
-                elif t - obj.last_seen > constants.QUERY_MEMORY:
-                    obj.first_seen = -1
-                elif obj.first_seen == t:
-                    query_obj_list_new.append(obj)
+            query_obj_list_past, query_obj_list_new = self.query_obj_store.classify(t)
 
             # We don't want to reset in the first round, if there is new additions or removals we identify a
             # workload change
@@ -253,6 +241,7 @@ class Simulator(BaseSimulator):
                 results.append([t, constants.MEASURE_HYP_BATCH_TIME, total_round_time])
             total_time += total_round_time
 
+        self.query_obj_store.close()
         # end_time_workload = datetime.datetime.now()
         # logging arm usage counts and time spent
         # total_time = (end_time_workload - start_time_workload).total_seconds()
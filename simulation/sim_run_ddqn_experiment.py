@@ -85,25 +85,21 @@ for i in range(len(exp_id_list)):
             print("\n[DDQN] Starting Deep Reinforcement Learning Index Selection...")
             from simulation.sim_ddqn_v3 import Simulator as DDQNSimulator
             
+            component_id = constants.COMPONENT_DDQN + exp_id_list[i]
             exp_report_ddqn = ExpReport(
                 configs.experiment_id, 
-                constants.COMPONENT_DDQN + exp_id_list[i],
+                component_id,
                 configs.reps, 
-                configs.rounds
+                configs.rounds,
+                helper.get_results_folder_path(configs.experiment_id, component_id)
             )
             
             for r in range(configs.reps):
                 print(f"  -> DDQN Repetition {r+1}/{configs.reps}")
                 simulator = DDQNSimulator()
-                results, total_workload_time = simulator.run()
-                
-                temp = DataFrame(results, 
-                               columns=[constants.DF_COL_BATCH, 
-                                       constants.DF_COL_MEASURE_NAME,
-                                       constants.DF_COL_MEASURE_VALUE])
-                temp = add_total_time_row(temp, total_workload_time)
-                temp[constants.DF_COL_REP] = r
-                exp_report_ddqn.add_data_list(temp)
+                with exp_report_ddqn.open_sink(r) as sink:
+                    results, total_workload_time = simulator.run(results_sink=sink)
+                    sink.append([[-1, constants.MEASURE_TOTAL_WORKLOAD_TIME, total_workload_time]])
                 
                 print(f"  -> DDQN Rep {r+1} completed. Total time: {total_workload_time:.2f}s")
             
@@ -79,17 +79,21 @@ for i in range(len(exp_id_list)):
                 Simulators[mab_version] = (getattr(__import__(mab_version, fromlist=['Simulator']), 'Simulator'))
             for version, Simulator in Simulators.items():
                 version_number = version.split("_v", 1)[1]
-                exp_report_mab = ExpReport(configs.experiment_id,
-                                           constants.COMPONENT_MAB + version_number + exp_id_list[i], configs.reps,
-                                           configs.rounds)
+                component_id = constants.COMPONENT_MAB + version_number + exp_id_list[i]
+                # a resumed run keeps the results of the repetitions that ended and continues the one of the checkpoint
+                exp_report_mab = ExpReport(configs.experiment_id, component_id, configs.reps, configs.rounds,
+                                           helper.get_results_folder_path(configs.experiment_id, component_id,
+                                                                          keep=configs.resume))
+                completed_reps = exp_report_mab.get_completed_reps() if configs.resume else set()
                 for r in range(configs.reps):
+                    if r in completed_reps:
+                        logging.info(f"Repetition {r} of {component_id} already completed, skipped")
+                        continue
                     simulator = Simulator()
-                    results, total_workload_time = simulator.run()
-                    temp = DataFrame(results, columns=[constants.DF_COL_BATCH, constants.DF_COL_MEASURE_NAME,
-                                                       constants.DF_COL_MEASURE_VALUE])
-                    temp = add_total_time_row(temp, total_workload_time)
-                    temp[constants.DF_COL_REP] = r
-                    exp_report_mab.add_data_list(temp)
+                    # every round reaches the disk as soon as it ends
+                    with exp_report_mab.open_sink(r) as sink:
+                        results, total_workload_time = simulator.run(results_sink=sink, rep=r)
+                        sink.append([[-1, constants.MEASURE_TOTAL_WORKLOAD_TIME, total_workload_time]])
                 exp_report_list.append(exp_report_mab)
 
         # Running No Index
@@ -175,16 +179,14 @@ for i in range(len(exp_id_list)):
         # Running DDQN
         if DDQN:
             from simulation.sim_ddqn_v3 import Simulator as DDQNSimulator
-            exp_report_mab = ExpReport(configs.experiment_id, constants.COMPONENT_MAB + exp_id_list[i],
-                                       configs.reps, configs.rounds)
+            component_id = constants.COMPONENT_MAB + exp_id_list[i]
+            exp_report_mab = ExpReport(configs.experiment_id, component_id, configs.reps, configs.rounds,
+                                       helper.get_results_folder_path(configs.experiment_id, component_id))
             for r in range(configs.reps):
                 simulator = DDQNSimulator()
-                results, total_workload_time = simulator.run()
-                temp = DataFrame(results, columns=[constants.DF_COL_BATCH, constants.DF_COL_MEASURE_NAME,
-                                                   constants.DF_COL_MEASURE_VALUE])
-                temp = add_total_time_row(temp, total_workload_time)
-                temp[constants.DF_COL_REP] = r
-                exp_report_mab.add_data_list(temp)
+                with exp_report_mab.open_sink(r) as sink:
+                    results, total_workload_time = simulator.run(results_sink=sink)
+                    sink.append([[-1, constants.MEASURE_TOTAL_WORKLOAD_TIME, total_workload_time]])
             exp_report_list.append(exp_report_mab)
 
         # Save results
@@ -0,0 +1,183 @@
+"""
+Hyperparameter sweep for the bandit simulators.
+
+A sweep is a section of exp.conf that names the experiment to tune and the values to try. Each trial builds its
+settings in memory (environment overrides read by shared/configs_v2.py and constants.read_db_config) and runs in its
+own process, so several trials run in parallel. Run the trials on db_type = REPLAY (see database/sql_helper_replay.py),
+or give each worker its own database copy with 'databases'. All trials are written to one results table.
+
+    [sweep_job_mab]
+    experiment = job_benchmark_mab
+    search = grid                  # grid or random
+    samples = 20                   # number of random trials
+    seed = 0
+    workers = 4
+    parameters = {"input_alpha": [0.5, 1, 2], "input_lambda": [0.25, 0.5], "ALPHA_REDUCTION_RATE": [1.02, 1.05]}
+    databases = [{"POSTGRESQL": {"database": "imdbload_1"}}, {"POSTGRESQL": {"database": "imdbload_2"}}]
+
+Upper case parameters set the constant of that name, the others override the experiment settings. Without
+'databases' the trials run one at a time, unless the backend keeps its state in the trial's process (REPLAY or
+SYNTHETIC).
+"""
+import configparser
+import importlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from pandas import DataFrame
+
+import constants
+
+# Define the sweep that we need to run
+SWEEP_ID = "sweep_job_mab"
+
+DF_COL_TRIAL = "Trial"
+DF_COL_VERSION = "Version"
+# backends whose state lives in the trial's process, trials on them do not need a database each
+PROCESS_LOCAL = {'REPLAY', 'SYNTHETIC'}
+
+
+def read_sweep(sweep_id):
+    """
+    :param sweep_id: name of the sweep section in exp.conf
+    :return: experiment id, list of trial parameter dictionaries, number of workers, database overrides
+    """
+    exp_config = configparser.ConfigParser(inline_comment_prefixes=('#',))
+    exp_config.read(constants.EXPERIMENT_CONFIG)
+    sweep_config = exp_config[sweep_id]
+    parameters = json.loads(sweep_config['parameters'])
+    names = list(parameters.keys())
+    if sweep_config.get('search', 'grid') == 'random':
+        rng = random.Random(sweep_config.getint('seed', 0))
+        trials = [{name: rng.choice(parameters[name]) for name in names}
+                  for _ in range(sweep_config.getint('samples'))]
+    else:
+        trials = [dict(zip(names, values)) for values in itertools.product(*(parameters[name] for name in names))]
+    databases = json.loads(sweep_config.get('databases', '[]'))
+    workers = sweep_config.getint('workers', len(databases) or 1)
+    return sweep_config['experiment'], trials, workers, databases
+
+
+def run_trial(sweep_id, experiment_id, trial_id, params, database_queue):
+    """
+    Runs all the MAB versions of the experiment with the given parameters. Meant to run in a fresh process, the
+    settings are applied before the simulators are imported.
+
+    :param sweep_id: name of the sweep
+    :param experiment_id: experiment that is tuned
+    :param trial_id: trial number
+    :param params: parameter values of this trial
+    :param database_queue: queue of db.conf overrides, one per database copy (None to use db.conf as is)
+    :return: results of the trial as a DataFrame
+    """
+    database = database_queue.get() if database_queue is not None else None
+    try:
+        os.environ[constants.ENV_EXPERIMENT_ID] = experiment_id
+        os.environ[constants.ENV_EXPERIMENT_OVERRIDES] = json.dumps(
+            {name: value for name, value in params.items() if not name.isupper()})
+        if database:
+            os.environ[constants.ENV_DB_CONFIG_OVERRIDES] = json.dumps(database)
+        importlib.reload(constants)
+        for name, value in params.items():
+            if name.isupper():
+                if not hasattr(constants, name):
+                    raise AttributeError(f"Unknown constant in sweep parameters: {name}")
+                setattr(constants, name, value)
+
+        import shared.configs_v2 as configs
+        import shared.helper as helper
+        logging.basicConfig(
+            filename=helper.get_experiment_folder_path(sweep_id) + 'trial_' + str(trial_id) + '.log',
+            filemode='w', format='%(asctime)s - %(levelname)s - %(message)s')
+        logging.getLogger().setLevel(constants.LOGGING_LEVEL)
+        logging.info("Trial %s parameters: %s", trial_id, params)
+
+        trial_results = []
+        for mab_version in configs.mab_versions:
+            Simulator = getattr(importlib.import_module(mab_version), 'Simulator')
+            for r in range(configs.reps):
+                simulator = Simulator()
+                results, total_workload_time = simulator.run()
+                temp = DataFrame(results, columns=[constants.DF_COL_BATCH, constants.DF_COL_MEASURE_NAME,
+                                                   constants.DF_COL_MEASURE_VALUE])
+                temp.loc[len(temp)] = [-1, constants.MEASURE_TOTAL_WORKLOAD_TIME, total_workload_time]
+                temp[constants.DF_COL_REP] = r
+                temp[DF_COL_VERSION] = mab_version
+                trial_results.append(temp)
+        trial_results = pd.concat(trial_results, ignore_index=True)
+        trial_results[DF_COL_TRIAL] = trial_id
+        for name, value in params.items():
+            trial_results[name] = value if not isinstance(value, (list, dict)) else json.dumps(value)
+        return trial_results
+    finally:
+        if database is not None:
+            database_queue.put(database)
+
+
+def run_sweep(sweep_id):
+    """
+    Runs all the trials of the sweep and writes sweep_results.csv (all measurements) and sweep_summary.csv (total
+    workload time per trial, best first) to the sweep folder
+
+    :param sweep_id: name of the sweep section in exp.conf
+    :return: summary DataFrame
+    """
+    import shared.helper as helper
+    experiment_id, trials, workers, databases = read_sweep(sweep_id)
+    sweep_folder_path = helper.get_experiment_folder_path(sweep_id)
+    logging.basicConfig(filename=sweep_folder_path + sweep_id + '.log', filemode='w',
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger().setLevel(constants.LOGGING_LEVEL)
+    if databases:
+        workers = min(workers, len(databases))
+    elif workers > 1 and constants.read_db_config().get('SYSTEM', 'db_type').strip().upper() not in PROCESS_LOCAL:
+        # trials sharing one database would measure each other's queries and indexes
+        logging.warning("No databases given for %s workers on a shared database, running the trials one at a time",
+                        workers)
+        workers = 1
+    print(f"Running {len(trials)} trials of {experiment_id} on {workers} workers")
+
+    # Every trial gets a fresh interpreter: module level state (configs, helper caches) must not leak across trials
+    mp_context = multiprocessing.get_context('spawn')
+    sweep_results = []
+    with mp_context.Manager() as manager:
+        database_queue = None
+        if databases:
+            database_queue = manager.Queue()
+            for database in databases:
+                database_queue.put(database)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, max_tasks_per_child=1) as executor:
+            futures = {executor.submit(run_trial, sweep_id, experiment_id, trial_id, params, database_queue): trial_id
+                       for trial_id, params in enumerate(trials)}
+            for future in as_completed(futures):
+                trial_id = futures[future]
+                try:
+                    sweep_results.append(future.result())
+                    print(f"Trial {trial_id} finished: {trials[trial_id]}")
+                except Exception:
+                    logging.exception("Trial %s failed: %s", trial_id, trials[trial_id])
+                    print(f"Trial {trial_id} failed: {trials[trial_id]}")
+
+    if not sweep_results:
+        return None
+    sweep_results = pd.concat(sweep_results, ignore_index=True).sort_values([DF_COL_TRIAL, constants.DF_COL_REP])
+    sweep_results.to_csv(sweep_folder_path + 'sweep_results.csv', index=False)
+
+    param_names = list(trials[0].keys())
+    total_times = sweep_results[sweep_results[constants.DF_COL_MEASURE_NAME] == constants.MEASURE_TOTAL_WORKLOAD_TIME]
+    summary = total_times.groupby([DF_COL_TRIAL, DF_COL_VERSION] + param_names)[constants.DF_COL_MEASURE_VALUE] \
+        .agg(['mean', 'std', 'count']).reset_index().sort_values('mean')
+    summary.to_csv(sweep_folder_path + 'sweep_summary.csv', index=False)
+    return summary
+
+
+if __name__ == '__main__':
+    sweep_summary = run_sweep(SWEEP_ID)
+    if sweep_summary is not None:
+        print(sweep_summary.head(10).to_string(index=False))
@@ -0,0 +1,64 @@
+"""
+Tests for the showplan parser, against the stored plans in resources/showplans
+"""
+import os
+
+from test.support.import_helper import import_fresh_module
+
+import constants
+import database.query_plan as query_plan_module
+from database.query_plan import QueryPlan
+
+SHOWPLAN_FOLDER = os.path.join(constants.ROOT_DIR, 'resources', 'showplans')
+
+
+def read_showplan(file_name):
+    with open(os.path.join(SHOWPLAN_FOLDER, file_name)) as f:
+        return f.read()
+
+
+def test_actual_plan_usage():
+    query_plan = QueryPlan(read_showplan('seek_and_scan.xml'))
+    assert query_plan.estimated_rows == '1520.4'
+    assert query_plan.est_statement_sub_tree_cost == '12.5'
+    assert query_plan.elapsed_time == 1.25
+    assert query_plan.cpu_time == '840'
+    assert query_plan.total_physical_sub_tree_cost == 10.0
+    assert query_plan.non_clustered_index_usage == [('IX_LINEITEM_l_shipdate', 0.23, 168.0, 2.5, 1490, 1520.4)]
+    assert query_plan.clustered_index_usage == [('ORDERS', 0.4, 504.0, 7.5, 1490, 1.0)]
+
+
+def test_estimated_plan_usage():
+    query_plan = QueryPlan(read_showplan('estimated_hash_join.xml'))
+    assert query_plan.estimated_rows == '30000'
+    assert query_plan.elapsed_time == 0
+    assert query_plan.non_clustered_index_usage == [
+        ('IXN_CUSTOMER_c_mktsegment_c_na', 0.0, 0.0, 6.0, 150000.0, 30000.0),
+        ('IXN_CUSTOMER_c_mktsegment_c_na', 0.0, 0.0, 0.5, 0, 25.0)]
+    assert query_plan.clustered_index_usage == [('ORDERS', 0.0, 0.0, 24.0, 0, 1500000.0)]
+
+
+def test_deep_plan_counters_roll_up():
+    # A chain of clustered seeks, each counter is visible to every operator above it
+    depth = 2000
+    rel_op = ('<RelOp PhysicalOp="Clustered Index Seek" EstimateRows="1" EstimatedTotalSubtreeCost="1">'
+              '<RunTimeInformation><RunTimeCountersPerThread Thread="0" ActualRowsRead="2" ActualElapsedms="{0}" />'
+              '</RunTimeInformation><IndexScan><Object Table="[T{0}]" Index="[PK_T{0}]" /></IndexScan>')
+    xml_string = ('<ShowPlanXML xmlns="http://schemas.microsoft.com/sqlserver/2004/07/showplan"><StmtSimple '
+                  'StatementSubTreeCost="{0}" StatementEstRows="1"><QueryPlan>'.format(depth) +
+                  ''.join(rel_op.format(i) for i in range(depth)) + '</RelOp>' * depth +
+                  '</QueryPlan></StmtSimple></ShowPlanXML>')
+    query_plan = QueryPlan(xml_string)
+    assert len(query_plan.clustered_index_usage) == depth
+    assert query_plan.clustered_index_usage[0] == ('T0', (depth - 1) / 1000, 0.0, 1.0, 2 * depth, 1.0)
+    assert query_plan.clustered_index_usage[-1] == ('T{}'.format(depth - 1), (depth - 1) / 1000, 0.0, 1.0, 2, 1.0)
+
+
+def test_pure_python_element_tree(monkeypatch):
+    # Element.clear() of the pure Python ElementTree empties the attributes of the cleared elements in place
+    monkeypatch.setattr(query_plan_module, 'ET',
+                        import_fresh_module('xml.etree.ElementTree', blocked=['_elementtree']))
+    query_plan = QueryPlan(read_showplan('seek_and_scan.xml'))
+    assert query_plan.total_physical_sub_tree_cost == 10.0
+    assert query_plan.non_clustered_index_usage == [('IX_LINEITEM_l_shipdate', 0.23, 168.0, 2.5, 1490, 1520.4)]
+    assert query_plan.clustered_index_usage == [('ORDERS', 0.4, 504.0, 7.5, 1490, 1.0)]
@@ -0,0 +1,78 @@
+"""
+Tests for the query store of the simulators, against classifying the whole store every round
+"""
+import random
+
+from bandits.query_store import QueryStore
+
+
+class StoredQuery:
+    """Fields of bandits.query_v5.Query the store reads"""
+
+    def __init__(self, query_id, query_string, t):
+        self.id = query_id
+        self.query_string = query_string
+        self.frequency = 1
+        self.first_seen = t
+        self.last_seen = t
+
+
+def run_rounds(query_store, rounds, seed=0):
+    """
+    :return: classification of every round by the store and by a scan of all the queries seen so far
+    """
+    rng = random.Random(seed)
+    reference = {}      # query id -> [first seen, last seen], in the order the queries were added
+    classified = []
+    expected = []
+    for t in range(rounds):
+        for query_id in rng.sample(range(40), 8):
+            if query_store.see(query_id, f"q{query_id}", t) is None:
+                query_store.add(StoredQuery(query_id, f"q{query_id}", t))
+            seen = reference.setdefault(query_id, [t, t])
+            if seen[0] == -1:
+                seen[0] = t
+            seen[1] = t
+        for seen in reference.values():
+            if t - seen[1] > query_store.query_memory:
+                seen[0] = -1
+        past, new = query_store.classify(t)
+        classified.append(([query.id for query in past], [query.id for query in new]))
+        expected.append(([query_id for query_id, seen in reference.items() if 0 <= seen[0] < t],
+                         [query_id for query_id, seen in reference.items() if seen[0] == t]))
+    return classified, expected
+
+
+def test_classify_matches_full_scan():
+    classified, expected = run_rounds(QueryStore(query_memory=3), 60)
+    assert classified == expected
+
+
+def test_evicted_queries_are_loaded_back(tmp_path):
+    query_store = QueryStore(query_memory=3, spill_path=str(tmp_path / 'store'))
+    classified, expected = run_rounds(query_store, 60)
+    assert classified == expected
+    assert len(query_store) == 40
+    # one spill entry per evicted query, overwritten when it is evicted again
+    assert len(query_store._spill) == len(query_store._spill_keys)
+    query_store.close()
+
+
+def test_checkpoint_keeps_referenced_spill_entries(tmp_path):
+    query_store = QueryStore(query_memory=0, spill_path=str(tmp_path / 'store'))
+    query_store.add(StoredQuery(1, 'q1', 0))
+    query_store.classify(0)
+    query_store.classify(2)
+    spill_key = query_store._spilled[1]
+    query_store.checkpoint_saved()
+    # seen again and evicted again after the checkpoint: the entry of the checkpoint is kept
+    query_store.see(1, 'q1', 3)
+    query_store.classify(3)
+    query_store.classify(5)
+    assert query_store._spilled[1] != spill_key
+    assert set(query_store._spill) == {spill_key, query_store._spilled[1]}
+    # until the next checkpoint
+    query_store.checkpoint_saved()
+    assert set(query_store._spill) == {query_store._spilled[1]}
+    query_store.close()
+    assert not list(tmp_path.iterdir())
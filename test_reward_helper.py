@@ -0,0 +1,103 @@
+"""
+Tests for the reward attribution of a round, against the per-query loop it replaced
+"""
+import random
+from collections import defaultdict
+
+import pytest
+
+import constants
+from database import reward_helper, scan_history
+
+TABLES = ['title', 'movie_info', 'cast_info']
+
+
+class BanditArm:
+
+    def __init__(self, index_name, table_name):
+        self.index_name = index_name
+        self.table_name = table_name
+
+
+class ExecutedQuery:
+
+    def __init__(self, query_id, histories):
+        self.id = query_id
+        self.table_scan_times = histories()
+        self.index_scan_times = histories()
+
+
+def per_query_rewards(query, non_clustered_index_usage, clustered_index_usage, bandit_arm_list, table_scan_times,
+                      arm_rewards):
+    """The attribution of one query before RoundRewards, on lists of scan times"""
+    current = constants.COST_TYPE_CURRENT_EXECUTION
+    current_clustered_index_scans = {}
+    for index_scan in clustered_index_usage:
+        table_name = index_scan[0]
+        current_clustered_index_scans[table_name] = index_scan[current]
+        if len(query.table_scan_times[table_name]) < constants.TABLE_SCAN_TIME_LENGTH:
+            query.table_scan_times[table_name].append(index_scan[current])
+        if len(table_scan_times[table_name]) < constants.TABLE_SCAN_TIME_LENGTH:
+            table_scan_times[table_name].append(index_scan[current])
+    used = [index_use for index_use in non_clustered_index_usage if index_use[0] in bandit_arm_list]
+    table_counts = defaultdict(int)
+    for index_use in used:
+        table_counts[bandit_arm_list[index_use[0]].table_name] += 1
+    for index_use in used:
+        table_name = bandit_arm_list[index_use[0]].table_name
+        if len(query.table_scan_times[table_name]) < constants.TABLE_SCAN_TIME_LENGTH:
+            query.index_scan_times[table_name].append(index_use[current])
+        if query.table_scan_times[table_name]:
+            reward = (max(query.table_scan_times[table_name]) - index_use[current]) / table_counts[table_name]
+        elif table_scan_times[table_name]:
+            reward = (max(table_scan_times[table_name]) - index_use[current]) / table_counts[table_name]
+        else:
+            reward = 0
+        if table_name in current_clustered_index_scans:
+            reward -= current_clustered_index_scans[table_name] / table_counts[table_name]
+        arm_rewards.setdefault(index_use[0], [0, 0])[0] += reward
+
+
+def get_rounds(seed, rounds=5, queries=30):
+    """
+    :return: bandit arms and, per round, the (query number, index usage, table scan usage) of its executions
+    """
+    rng = random.Random(seed)
+    bandit_arm_list = {f"ix_{table}_{n}": BanditArm(f"ix_{table}_{n}", table) for table in TABLES for n in range(3)}
+    index_names = list(bandit_arm_list) + ['pk_title']
+    executions = []
+    for _ in range(rounds):
+        executions.append([])
+        for _ in range(queries):
+            usage = [(index_name, rng.uniform(0.01, 1), 0, 0)
+                     for index_name in rng.sample(index_names, rng.randint(0, 3))]
+            scans = [(table, rng.uniform(0.5, 5), 0, 0) for table in rng.sample(TABLES, rng.randint(0, 2))]
+            executions[-1].append((rng.randrange(10), usage, scans))
+    return bandit_arm_list, executions
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_round_rewards_match_per_query_loop(seed):
+    bandit_arm_list, executions = get_rounds(seed)
+    queries = [ExecutedQuery(n, scan_history.ScanHistory) for n in range(10)]
+    table_scan_times = scan_history.ScanHistory()
+    expected_queries = [ExecutedQuery(n, lambda: defaultdict(list)) for n in range(10)]
+    expected_table_scan_times = defaultdict(list)
+    for round_executions in executions:
+        round_rewards = reward_helper.RoundRewards(bandit_arm_list, table_scan_times)
+        arm_rewards = {}
+        expected_rewards = {}
+        for query_number, usage, scans in round_executions:
+            round_rewards.add_query(queries[query_number], usage, scans)
+            per_query_rewards(expected_queries[query_number], usage, scans, bandit_arm_list,
+                              expected_table_scan_times, expected_rewards)
+        round_rewards.add_to(arm_rewards)
+        assert arm_rewards.keys() == expected_rewards.keys()
+        for index_name, (gain, creation_cost) in expected_rewards.items():
+            assert arm_rewards[index_name] == [pytest.approx(gain), creation_cost]
+    for table_name, times in expected_table_scan_times.items():
+        assert table_scan_times[table_name].values().tolist() == times
+    for query, expected_query in zip(queries, expected_queries):
+        for table_name, times in expected_query.index_scan_times.items():
+            assert query.index_scan_times[table_name].values().tolist() == times
+
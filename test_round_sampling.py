@@ -0,0 +1,86 @@
+"""
+Tests for the sampled round estimates, on queries with known execution times and gains
+"""
+import random
+from types import SimpleNamespace
+
+import numpy
+import pytest
+
+import bandits.round_sampling as round_sampling
+from bandits.round_sampling import RoundSampler
+
+DRAWS = 2000
+
+
+class SampledQuery:
+
+    def __init__(self, query_id, tables, cost, gain):
+        self.id = query_id
+        self.predicates = {table: ['id'] for table in tables}
+        self.payload = {}
+        self.cost = cost
+        self.gain = gain
+
+
+def create_query_drop_v3(connection, schema_name, bandit_arm_list, arm_list_to_add, arm_list_to_delete, queries):
+    arm_rewards = {}
+    for query in queries:
+        arm_rewards.setdefault('ix_title_id', [0, 0])[0] += query.gain
+    return sum(query.cost for query in queries), {}, arm_rewards
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    monkeypatch.setattr(round_sampling, 'sql_helper', SimpleNamespace(create_query_drop_v3=create_query_drop_v3))
+    rng = random.Random(0)
+    strata = [['title'], ['title', 'movie_info'], ['cast_info']]
+    return [SampledQuery(n, strata[n % 3], rng.lognormvariate(0, 1), rng.uniform(0, 2)) for n in range(60)]
+
+
+def test_estimates_are_unbiased_and_covered(queries):
+    round_sampler = RoundSampler(seed=0)
+    round_sampler.template_costs = {query.id: query.cost for query in queries}
+    total_cost = sum(query.cost for query in queries)
+    total_gain = sum(query.gain for query in queries)
+    costs = numpy.zeros(DRAWS)
+    gains = numpy.zeros(DRAWS)
+    cost_covered = 0
+    gain_covered = 0
+    sampled = 0
+    for draw in range(DRAWS):
+        round_sampler.fraction = 0.2
+        costs[draw], _, arm_rewards = round_sampler.create_query_drop(None, 'public', {}, {}, {}, queries)
+        gains[draw] = arm_rewards['ix_title_id'][0]
+        cost_covered += abs(costs[draw] - total_cost) <= round_sampler.execution_cost_interval
+        gain_covered += abs(gains[draw] - total_gain) <= round_sampler.reward_intervals['ix_title_id']
+        sampled += round_sampler.sampled_queries
+    # the mean of the estimates is within three standard errors of the full round
+    assert abs(costs.mean() - total_cost) < 3 * costs.std() / numpy.sqrt(DRAWS)
+    assert abs(gains.mean() - total_gain) < 3 * gains.std() / numpy.sqrt(DRAWS)
+    # the 95% intervals cover the full round in about 95% of the draws
+    assert cost_covered / DRAWS > 0.9
+    assert gain_covered / DRAWS > 0.9
+    assert sampled / DRAWS < 0.5 * len(queries)
+
+
+def test_unknown_templates_are_always_executed(queries):
+    round_sampler = RoundSampler(seed=0)
+    round_sampler.template_costs = {query.id: query.cost for query in queries[:30]}
+    round_sampler.fraction = 0.2
+    probabilities = round_sampler.get_inclusion_probabilities(queries)
+    assert (probabilities[30:] == 1).all()
+    assert (probabilities[:30] < 1).any()
+    # every stratum is sampled
+    for stratum in range(3):
+        assert probabilities[stratum:30:3].sum() >= 1 - 1e-9
+
+
+def test_precise_estimates_lower_the_fraction(queries):
+    round_sampler = RoundSampler(target_error=0.5, min_fraction=0.1, seed=0)
+    round_sampler.template_costs = {query.id: query.cost for query in queries}
+    execute_cost, _, _ = round_sampler.create_query_drop(None, 'public', {}, {}, {}, queries)
+    # every query runs in the first round (fraction 1), the estimate is the full cost
+    assert execute_cost == pytest.approx(sum(query.cost for query in queries))
+    assert round_sampler.execution_cost_interval == 0
+    assert round_sampler.min_fraction <= round_sampler.fraction < 1
@@ -0,0 +1,58 @@
+"""
+Tests for the scan time histories, against a list of every value appended
+"""
+import pickle
+import random
+
+from database.scan_history import INITIAL_CAPACITY, ScanHistory, TableScanHistory
+
+
+def test_ring_buffer_keeps_the_last_values():
+    rng = random.Random(0)
+    history = TableScanHistory(capacity=20)
+    appended = []
+    for _ in range(75):
+        value = rng.uniform(0, 10)
+        history.append(value)
+        appended.append(value)
+        assert history.values().tolist() == appended[-20:]
+        assert len(history) == min(len(appended), 20)
+    # the running statistics cover the overwritten values too
+    assert history.count == 75
+    assert history.mean() == sum(appended) / 75
+    assert history.maximum == max(appended)
+    assert history.recent(5).tolist() == appended[-5:]
+    assert history.recent_max(5) == max(appended[-5:])
+    assert list(history) == appended[-20:]
+
+
+def test_buffer_grows_up_to_the_capacity():
+    history = TableScanHistory(capacity=3 * INITIAL_CAPACITY)
+    for value in range(5 * INITIAL_CAPACITY):
+        history.append(value)
+    assert len(history._values) == 3 * INITIAL_CAPACITY
+    assert history.values().tolist() == list(range(2 * INITIAL_CAPACITY, 5 * INITIAL_CAPACITY))
+
+
+def test_lookups_do_not_create_histories():
+    scan_times = ScanHistory()
+    assert scan_times.size('title') == 0
+    assert scan_times.max('title') is None
+    assert scan_times.mean('title') is None
+    assert 'title' not in scan_times
+    scan_times['title'].append(2.0)
+    scan_times['title'].append(1.0)
+    assert scan_times.size('title') == 2
+    assert scan_times.max('title') == 2.0
+    assert scan_times.mean('title') == 1.5
+
+
+def test_pickled_with_checkpoints():
+    scan_times = ScanHistory()
+    for value in range(30):
+        scan_times['title'].append(value)
+    restored = pickle.loads(pickle.dumps(scan_times, protocol=pickle.HIGHEST_PROTOCOL))
+    assert restored['title'].values().tolist() == scan_times['title'].values().tolist()
+    assert restored.max('title') == 29
+    restored['movie_info'].append(1.0)
+    assert restored.size('movie_info') == 1
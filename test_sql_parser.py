@@ -0,0 +1,100 @@
+"""
+Tests for the SQL parser that derives the workload structures, and for the JOB workload it generated
+"""
+import json
+import os
+
+import constants
+from shared.sql_parser import QueryParser, get_workload_entry, split_statements
+
+JOB_WORKLOAD = os.path.join(constants.ROOT_DIR, 'resources', 'workloads', 'job_all_queries.json')
+
+
+def test_aliases():
+    structures = QueryParser().analyse(
+        "SELECT t.title AS movie, mi.info info FROM title AS t, movie_info mi "
+        "WHERE t.id = mi.movie_id AND t.production_year > 2000 ORDER BY movie")
+    assert structures['filters'] == {'title': ['production_year']}
+    assert structures['joins'] == {'title': ['id'], 'movie_info': ['movie_id']}
+    assert structures['predicates'] == {'title': ['production_year', 'id'], 'movie_info': ['movie_id']}
+    assert structures['payload'] == {'title': ['title'], 'movie_info': ['info']}
+    # the select alias is not a column
+    assert structures['order_by'] == {}
+
+
+def test_correlated_subquery():
+    structures = QueryParser().analyse(
+        "SELECT o.o_orderkey FROM orders o WHERE EXISTS (SELECT * FROM lineitem l "
+        "WHERE l.l_orderkey = o.o_orderkey AND l.l_commitdate < l.l_receiptdate)")
+    assert structures['filters'] == {'lineitem': ['l_commitdate', 'l_receiptdate']}
+    assert structures['joins'] == {'lineitem': ['l_orderkey'], 'orders': ['o_orderkey']}
+    assert structures['payload'] == {'orders': ['o_orderkey']}
+
+
+def test_cte():
+    structures = QueryParser().analyse(
+        "WITH recent AS (SELECT m.movie_id, m.info FROM movie_info m WHERE m.info_type_id = 3) "
+        "SELECT t.title FROM title t JOIN recent r ON r.movie_id = t.id WHERE t.kind_id = 1")
+    assert structures['filters'] == {'title': ['kind_id'], 'movie_info': ['info_type_id']}
+    # the columns of the CTE are not table columns
+    assert structures['joins'] == {'title': ['id']}
+    assert structures['payload'] == {'title': ['title'], 'movie_info': ['movie_id', 'info']}
+
+
+def test_union_branches():
+    structures = QueryParser().analyse(
+        "SELECT c.name FROM company_name c WHERE c.country_code = '[us]' "
+        "UNION ALL SELECT k.keyword FROM keyword k WHERE k.phonetic_code = 'A'")
+    assert structures['predicates'] == {'company_name': ['country_code'], 'keyword': ['phonetic_code']}
+    assert structures['payload'] == {'company_name': ['name'], 'keyword': ['keyword']}
+
+
+def test_between_and():
+    structures = QueryParser().analyse(
+        "SELECT l.l_extendedprice FROM lineitem l "
+        "WHERE l.l_shipdate BETWEEN '1994-01-01' AND '1995-01-01' AND l.l_discount > 0.05")
+    assert structures['filters'] == {'lineitem': ['l_shipdate', 'l_discount']}
+    assert structures['joins'] == {}
+
+
+def test_casts():
+    structures = QueryParser().analyse(
+        "SELECT CAST(t.production_year AS varchar) FROM title t "
+        "WHERE t.note::text LIKE '%x%' AND t.episode_nr > CAST('5' AS integer)")
+    assert structures['filters'] == {'title': ['note', 'episode_nr']}
+    assert structures['payload'] == {'title': ['production_year']}
+
+
+def test_unqualified_columns_with_schema():
+    query_parser = QueryParser({'title': ['id', 'title', 'kind_id'], 'kind_type': ['id', 'kind']})
+    structures = query_parser.analyse(
+        "SELECT title FROM title t, kind_type kt WHERE kind_id = kt.id AND kind = 'movie'")
+    assert structures['filters'] == {'kind_type': ['kind']}
+    assert structures['joins'] == {'title': ['kind_id'], 'kind_type': ['id']}
+    assert structures['payload'] == {'title': ['title']}
+
+
+def test_using_join():
+    query = "SELECT a.x FROM a JOIN b ON a.bid = b.id LEFT JOIN c USING (cid) WHERE a.y = 1"
+    # without a schema the left column is the nearest reference's
+    assert QueryParser().analyse(query)['joins'] == {'c': ['cid'], 'b': ['cid', 'id'], 'a': ['bid']}
+    # with a schema the nearest reference that has the column
+    structures = QueryParser({'a': ['bid', 'cid', 'x', 'y'], 'b': ['id'], 'c': ['cid']}).analyse(query)
+    assert structures['joins'] == {'c': ['cid'], 'a': ['cid', 'bid'], 'b': ['id']}
+
+
+def test_split_statements():
+    assert split_statements("SELECT 'a;b' FROM t; SELECT 2;\n") == ["SELECT 'a;b' FROM t", "SELECT 2"]
+
+
+def test_job_workload_entry():
+    with open(JOB_WORKLOAD) as f:
+        entry = json.loads(f.readline())
+    assert entry['id'] == 1
+    assert entry['predicates'] == {
+        'cast_info': ['note', 'movie_id', 'person_role_id', 'role_id'], 'company_name': ['country_code', 'id'],
+        'role_type': ['role', 'id'], 'title': ['production_year', 'id'],
+        'movie_companies': ['movie_id', 'company_id', 'company_type_id'], 'char_name': ['id'], 'company_type': ['id']}
+    assert entry['payload'] == {'char_name': ['name'], 'title': ['title']}
+    # the committed workload is what the parser derives
+    assert get_workload_entry(entry['id'], entry['query_string'], QueryParser().analyse(entry['query_string'])) == entry
@@ -0,0 +1,86 @@
+"""
+Tests for the workload stream read from a PostgreSQL csvlog, through the admission of its queries
+"""
+import csv
+from types import SimpleNamespace
+
+import pytest
+
+import database.sql_helper as sql_helper
+from bandits.query_admission import admit_queries
+from bandits.query_store import QueryStore
+from database import scan_history
+from shared.workload_stream import WorkloadStream
+
+STATEMENTS = ["SELECT t.title FROM title t WHERE t.production_year > 2000",
+              "SELECT t.title FROM title t WHERE t.production_year > 2010",
+              "SELECT t.title FROM title t WHERE t.production_year > 2000"]
+ALL_COLUMNS = {'title': ['id', 'title', 'production_year']}
+
+
+def write_csvlog(path, statements):
+    with open(path, 'w', newline='') as log_file:
+        writer = csv.writer(log_file)
+        for n, statement in enumerate(statements):
+            record = [''] * 26
+            record[0] = f"2024-01-31 12:00:{n:02d}.000 UTC"
+            record[2] = 'imdbload'
+            record[13] = f"duration: 1.250 ms  statement: {statement}"
+            record[22] = 'psql'
+            writer.writerow(record)
+            # the tuner's own statements are left out
+            record[22] = 'dba_bandit'
+            writer.writerow(record)
+
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    # admission plans the new queries through the sql helper
+    monkeypatch.setattr(sql_helper, '_helper_module', SimpleNamespace(
+        CONCURRENT_PLANNING=False, get_selectivity_v3=lambda connection, query, predicates: {'title': 0.5},
+        get_table_scan_times_structure=scan_history.ScanHistory))
+    write_csvlog(tmp_path / 'postgresql.csv', STATEMENTS)
+    workload_stream = WorkloadStream(str(tmp_path / 'postgresql.csv'), follow=False, database='imdbload',
+                                     exclude_application='dba_bandit')
+    try:
+        return workload_stream.next_batch(), workload_stream.get_state()
+    finally:
+        workload_stream.close()
+
+
+def test_every_statement_runs_its_own_text(batch):
+    queries, state = batch
+    assert [query['id'] for query in queries] == [1, 2, 3]
+    assert [query['query_string'] for query in queries] == STATEMENTS
+    assert state['statement_count'] == 3
+    query_objects = admit_queries(None, QueryStore(), queries, 0, ALL_COLUMNS, 3)
+    assert [query_object.query_string for query_object in query_objects] == STATEMENTS
+    assert query_objects[0].predicates == {'title': ['production_year']}
+
+
+def test_shared_templates_keep_the_variant_text(batch):
+    queries, _ = batch
+    query_store = QueryStore(share_templates=True)
+    query_objects = admit_queries(None, query_store, queries, 0, ALL_COLUMNS, 3)
+    assert [query_object.query_string for query_object in query_objects] == STATEMENTS
+    assert [query_object.id for query_object in query_objects] == [1, 2, 3]
+    assert len(query_store) == 1
+
+
+def test_resumed_stream_continues_the_ids(tmp_path, batch):
+    _, state = batch
+    with open(tmp_path / 'postgresql.csv', 'a', newline='') as log_file:
+        record = [''] * 26
+        record[0] = "2024-01-31 12:01:00.000 UTC"
+        record[2] = 'imdbload'
+        record[13] = "statement: SELECT t.id FROM title t WHERE t.id = 7"
+        record[22] = 'psql'
+        csv.writer(log_file).writerow(record)
+    workload_stream = WorkloadStream(str(tmp_path / 'postgresql.csv'), follow=False, database='imdbload',
+                                     exclude_application='dba_bandit', state=state)
+    try:
+        queries = workload_stream.next_batch()
+    finally:
+        workload_stream.close()
+    assert [(query['id'], query['query_string']) for query in queries] == \
+        [(4, "SELECT t.id FROM title t WHERE t.id = 7")]